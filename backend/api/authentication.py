@@ -0,0 +1,91 @@
+import copy
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+TOKEN_CACHE_KEY = 'auth_token:{}'
+
+
+class TokenLRUCache:
+    """Кэш токенов в памяти процесса: ограничен по размеру и хранит
+    записи не дольше AUTH_TOKEN_LOCAL_TIMEOUT секунд, поэтому
+    изменения из других процессов доходят до него быстро."""
+
+    def __init__(self):
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            token, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return token
+
+    def set(self, key, token):
+        with self._lock:
+            self._data[key] = (
+                token, time.monotonic() + settings.AUTH_TOKEN_LOCAL_TIMEOUT)
+            self._data.move_to_end(key)
+            while len(self._data) > settings.AUTH_TOKEN_LOCAL_SIZE:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+local_tokens = TokenLRUCache()
+
+
+def invalidate_token(key):
+    """Сбросить токен из кэшей после фиксации транзакции: раньше
+    другой запрос мог бы снова закэшировать старое состояние."""
+    def invalidate():
+        local_tokens.delete(key)
+        cache.delete(TOKEN_CACHE_KEY.format(key))
+
+    transaction.on_commit(invalidate)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Аутентификация по токену с кэшированием пары токен-пользователь.
+
+    Сначала токен ищется в памяти процесса, затем в общем кэше и только
+    потом в базе. Кэш сбрасывается при удалении токена (выход из
+    системы) и при сохранении пользователя (смена пароля,
+    деактивация).
+    """
+
+    def authenticate_credentials(self, key):
+        token = local_tokens.get(key)
+        if token is None:
+            cache_key = TOKEN_CACHE_KEY.format(key)
+            token = cache.get(cache_key)
+            if token is None:
+                token = super().authenticate_credentials(key)[1]
+                cache.set(cache_key, token,
+                          timeout=settings.AUTH_TOKEN_CACHE_TIMEOUT)
+            local_tokens.set(key, token)
+
+        if not token.user.is_active:
+            raise AuthenticationFailed(_('User inactive or deleted.'))
+        # Каждый запрос получает свою копию пользователя, чтобы
+        # изменения его атрибутов не переходили в кэш.
+        return copy.copy(token.user), token
@@ -1,4 +1,18 @@
+# filters
+INGREDIENT_SEARCH_LIMIT = 20
+
+# signals
+# Поля пользователя, изменение которых сбрасывает кэш его токенов.
+TOKEN_INVALIDATING_FIELDS = frozenset(('password', 'is_active'))
+
 # views
+BATCH_RECIPES_LIMIT = 100
+INGREDIENT_SET_LIMIT = 50
+RECIPE_STATUS_ADDED = 'added'
+RECIPE_STATUS_REMOVED = 'removed'
+RECIPE_STATUS_ALREADY_ADDED = 'already_added'
+RECIPE_STATUS_NOT_ADDED = 'not_added'
+RECIPE_STATUS_NOT_FOUND = 'not_found'
 RECIPE_ADDED_TO_FAVORITES = 'Рецепт добавлен в избранное.'
 RECIPE_ALREADY_IN_FAVORITES = 'Рецепт уже в избранном.'
 RECIPE_REMOVED_FROM_FAVORITES = 'Рецепт удален из избранного.'
@@ -17,12 +31,15 @@ METHOD_NOT_ALLOWED_ERROR = 'Метод не разрешен для данног
 USER_UNAUTHORIZED_ERROR = 'Пользователь не авторизован.'
 INCORRECT_CURRENT_PASSWORD_ERROR = 'Текущий пароль неверен.'
 PASSWORD_CHANGE_SUCCESS = 'Пароль успешно изменен.'
+INVALID_FILE_FORMAT_ERROR = ('Неподдерживаемый формат файла. '
+                             'Допустимые значения: txt, csv, json.')
 
 # serializers
 MISSING_TAG_MESSAGE = 'Пожалуйста, добавьте хотя бы один тег.'
 MISSING_INGREDIENT_MESSAGE = 'Пожалуйста, добавьте хотя бы один ингредиент.'
 DUPLICATE_INGREDIENT_MESSAGE = ('Рецепт не может иметь '
                                 'повторяющиеся ингредиенты.')
+UNKNOWN_INGREDIENTS_MESSAGE = 'Ингредиенты не найдены: {ids}.'
 DUPLICATE_TAGS_MESSAGE = 'Теги должны быть уникальными.'
 INVALID_AMOUNT_MESSAGE = 'Количество ингредиента должно быть больше нуля.'
 INVALID_COOKING_TIME_MESSAGE = 'Время приготовления должно быть больше нуля.'
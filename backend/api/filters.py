@@ -1,18 +1,60 @@
+from django.db import connection
+from django.db.models import Case, IntegerField, Value, When
 from django_filters.rest_framework import (BooleanFilter, CharFilter,
-                                           FilterSet,
-                                           ModelMultipleChoiceFilter,
+                                           FilterSet, MultipleChoiceFilter,
                                            NumberFilter)
 
-from recipes.models import Ingredient, Recipe, ShoppingCart, Tag
+from api.constants import INGREDIENT_SEARCH_LIMIT
+from recipes.models import Ingredient, Recipe, RecipeTag, ShoppingCart
+from recipes.registry import tag_registry
+from recipes.search import ingredient_index, normalize_name, search_recipes
+
+
+def get_tag_choices():
+    return tag_registry.slug_choices()
 
 
 class IngredientFilter(FilterSet):
-    name = CharFilter(lookup_expr='icontains')
+    name = CharFilter(method='filter_by_name')
 
     class Meta:
         model = Ingredient
         fields = ('name',)
 
+    def filter_by_name(self, queryset, name, value):
+        """Автодополнение: сначала совпадения по началу названия,
+        затем по вхождению, не более INGREDIENT_SEARCH_LIMIT строк."""
+        query = normalize_name(value)
+        if not query:
+            return queryset
+        if connection.vendor == 'postgresql':
+            ids = self.search_database(queryset, query)
+        else:
+            ids = ingredient_index.search(query, INGREDIENT_SEARCH_LIMIT)
+        return queryset.filter(pk__in=ids).order_by(Case(
+            *(When(pk=pk, then=Value(position))
+              for position, pk in enumerate(ids)),
+            default=Value(len(ids)),
+            output_field=IntegerField(),
+        ))
+
+    @staticmethod
+    def search_database(queryset, query):
+        """id по индексам PostgreSQL: начала названий читаются по
+        индексу varchar_pattern_ops с LIMIT, и только если их меньше
+        лимита, остаток добирается по триграммному индексу. Совпадения
+        не сортируются все целиком перед LIMIT."""
+        ids = list(queryset.filter(
+            search_name__startswith=query
+        ).order_by('search_name').values_list(
+            'pk', flat=True)[:INGREDIENT_SEARCH_LIMIT])
+        if len(ids) < INGREDIENT_SEARCH_LIMIT:
+            ids += queryset.filter(search_name__contains=query).exclude(
+                search_name__startswith=query
+            ).order_by('search_name').values_list(
+                'pk', flat=True)[:INGREDIENT_SEARCH_LIMIT - len(ids)]
+        return ids
+
 
 class RecipeFilter(FilterSet):
     is_favorited = BooleanFilter(
@@ -24,21 +66,40 @@ class RecipeFilter(FilterSet):
         method='filter_by_shopping_cart',
         label='Список покупок'
     )
-    tags = ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all(),
+    tags = MultipleChoiceFilter(
+        method='filter_by_tags',
+        choices=get_tag_choices,
         label='Теги'
     )
     author = NumberFilter(
         field_name='author',
         label='Автор'
     )
+    search = CharFilter(
+        method='filter_by_search',
+        label='Поиск по названию и описанию'
+    )
 
     class Meta:
         model = Recipe
         fields = ('is_favorited', 'is_in_shopping_cart',
-                  'tags', 'author',)
+                  'tags', 'author', 'search',)
+
+    def filter_by_search(self, queryset, name, value):
+        if not value.strip():
+            return queryset
+        return search_recipes(queryset, value)
+
+    def filter_by_tags(self, queryset, name, value):
+        if not value:
+            return queryset
+        # Тег мог быть удален после проверки параметра по списку тегов.
+        tags = [tag_registry.get_by_slug(slug) for slug in value]
+        tag_ids = [tag.pk for tag in tags if tag is not None]
+        if not tag_ids:
+            return queryset.none()
+        return queryset.filter(id__in=RecipeTag.objects.filter(
+            tag_id__in=tag_ids).values('recipe_id'))
 
     def filter_by_favorited(self, queryset, name, value):
         user = self.request.user
@@ -0,0 +1,413 @@
+import json
+import math
+import platform
+import shutil
+import tempfile
+import time
+import tracemalloc
+from itertools import combinations
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, Exists, OuterRef
+from django.test import Client
+from django.test.utils import (CaptureQueriesContext, override_settings,
+                               setup_test_environment,
+                               teardown_test_environment)
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from api.filters import RecipeFilter
+from recipes.catalog import bump_catalog_version
+from recipes.models import Favorite, Ingredient, Recipe, Tag
+from recipes.search import WORD_RE
+from users.models import User
+
+# Изображение 1x1 в формате GIF.
+IMAGE = ('data:image/gif;base64,'
+         'R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7')
+INGREDIENT_QUERIES = ('со', 'мол', 'картоф', 'ё')
+# Префикс ключей кэша на время замера: ответы, построенные по данным,
+# которые затем откатываются, не должны остаться в общем кэше.
+CACHE_KEY_PREFIX = 'benchmark'
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values, rank):
+    """Процентиль методом ближайшего ранга."""
+    ordered = sorted(values)
+    index = max(math.ceil(rank / 100 * len(ordered)) - 1, 0)
+    return ordered[index]
+
+
+def run_on_commit_callbacks(start):
+    """Выполнить колбэки on_commit, добавленные после позиции start.
+
+    Замер идет в транзакции, которая откатывается, поэтому колбэки
+    выполняются сразу, как после фиксации: иначе раскладка ленты, сброс
+    кэшей и уменьшенные копии изображений не попали бы в замер.
+    Колбэки, добавленные самими колбэками, тоже выполняются.
+    """
+    while len(connection.run_on_commit) > start:
+        callbacks = connection.run_on_commit[start:]
+        start = len(connection.run_on_commit)
+        for _, func, *_ in callbacks:
+            func()
+
+
+class Scenario:
+    """Один измеряемый запрос к API.
+
+    reset вызывается перед каждым запросом вне замера, например чтобы
+    сбросить кэш ответа. Для сценариев с non_empty пустая выдача
+    считается ошибкой: замер пустой страницы ничего не говорит о
+    стоимости запроса.
+    """
+
+    def __init__(self, name, method, url, data=None, client=None,
+                 reset=None, non_empty=False):
+        self.name = name
+        self.method = method
+        self.url = url
+        self.data = data
+        self.client = client
+        self.reset = reset
+        self.non_empty = non_empty
+
+    def prepare(self):
+        if self.reset is not None:
+            self.reset()
+
+    def __call__(self):
+        start = len(connection.run_on_commit)
+        if self.data is None:
+            response = getattr(self.client, self.method)(self.url)
+        else:
+            response = getattr(self.client, self.method)(
+                self.url, json.dumps(self.data()),
+                content_type='application/json')
+        if response.streaming:
+            b''.join(response.streaming_content)
+        if response.status_code >= 400:
+            raise CommandError(
+                f'{self.name}: {self.method.upper()} {self.url} -> '
+                f'{response.status_code} {response.content[:500]!r}')
+        run_on_commit_callbacks(start)
+        return response
+
+    def check(self, response):
+        if not self.non_empty:
+            return
+        data = json.loads(response.content)
+        if isinstance(data, dict):
+            data = data['results']
+        if not data:
+            raise CommandError(
+                f'{self.name}: {self.method.upper()} {self.url} вернул '
+                'пустую выдачу, подберите другие данные или --user.')
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный бенчмарк основных эндпоинтов API на текущей '
+            'базе данных: задержки p50/p95/p99, число SQL-запросов и '
+            'пиковая память. Результат сравнивается с эталоном.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument(
+            '--only', default='',
+            help='Запускать только сценарии, содержащие подстроку')
+        parser.add_argument(
+            '--output', default='benchmark.json',
+            help='Куда записать результаты в формате JSON')
+        parser.add_argument(
+            '--baseline', default=None,
+            help='Файл с эталонными результатами для сравнения')
+        parser.add_argument(
+            '--save-baseline', action='store_true',
+            help='Записать результаты в файл --baseline вместо сравнения')
+        parser.add_argument(
+            '--latency-tolerance', type=float, default=0.25,
+            help='Допустимый относительный рост задержки')
+        parser.add_argument(
+            '--latency-slack', type=float, default=1.0,
+            help='Абсолютный запас по задержке, мс')
+        parser.add_argument(
+            '--memory-tolerance', type=float, default=0.25,
+            help='Допустимый относительный рост пиковой памяти')
+        parser.add_argument(
+            '--query-tolerance', type=int, default=0,
+            help='Допустимый рост числа SQL-запросов')
+        parser.add_argument(
+            '--user', default=None,
+            help='Email пользователя, от имени которого идут запросы')
+
+    def get_user(self, email):
+        """Пользователь, от имени которого идут запросы: по умолчанию
+        самый активный из тех, у кого есть рецепт и в избранном, и в
+        списке покупок."""
+        if email:
+            user = User.objects.filter(email=email).first()
+            if user is None:
+                raise CommandError(f'Пользователь {email} не найден.')
+            return user
+        user = User.objects.filter(Exists(Favorite.objects.filter(
+            user=OuterRef('pk'),
+            recipe__shoppingcarts__user=OuterRef('pk'),
+        ))).annotate(
+            activity=Count('shoppingcarts', distinct=True)
+            + Count('subscriptions', distinct=True)
+        ).order_by('-activity', 'pk').first()
+        if user is None:
+            raise CommandError(
+                'Нет пользователя с рецептом в избранном и в списке '
+                'покупок, сначала выполните generate_data.')
+        return user
+
+    def get_filter_values(self, user):
+        """Значения фильтров по рецепту из избранного и списка покупок
+        пользователя: любая их комбинация дает непустую выдачу."""
+        recipe = Recipe.objects.filter(
+            favorites__user=user, shoppingcarts__user=user
+        ).order_by('-favorites_count', 'pk').first()
+        if recipe is None:
+            raise CommandError(
+                f'У пользователя {user.email} нет рецепта и в избранном, '
+                'и в списке покупок.')
+        slugs = list(recipe.tags.order_by('pk').values_list(
+            'slug', flat=True))
+        return {
+            'tags': '&'.join(f'tags={slug}' for slug in slugs),
+            'author': f'author={recipe.author_id}',
+            'is_favorited': 'is_favorited=1',
+            'is_in_shopping_cart': 'is_in_shopping_cart=1',
+            'search': f'search={WORD_RE.findall(recipe.name)[0]}',
+        }
+
+    def get_scenarios(self, user):
+        token, _ = Token.objects.get_or_create(user=user)
+        client = Client(HTTP_AUTHORIZATION=f'Token {token.key}')
+        anonymous = Client()
+
+        recipe = Recipe.objects.order_by('-favorites_count', 'pk').first()
+        author = User.objects.order_by('-recipes_count', 'pk').first()
+        tags = list(Tag.objects.order_by('pk').values_list('pk', 'slug'))
+        ingredients = list(
+            Ingredient.objects.order_by('pk').values_list('pk', flat=True))
+        if recipe is None or not tags or len(ingredients) < 10:
+            raise CommandError(
+                'Недостаточно данных, сначала выполните generate_data.')
+
+        filter_values = self.get_filter_values(user)
+        missing = set(RecipeFilter.base_filters) - set(filter_values)
+        if missing:
+            raise CommandError(
+                'Нет значений для фильтров: ' + ', '.join(sorted(missing)))
+
+        scenarios = [
+            Scenario('recipes-list (anonymous)', 'get', '/api/recipes/',
+                     client=anonymous, non_empty=True),
+            Scenario('recipes-list (anonymous, uncached)', 'get',
+                     '/api/recipes/', client=anonymous,
+                     reset=lambda: bump_catalog_version('recipe_list'),
+                     non_empty=True),
+            Scenario('recipes-list (uncached count)', 'get',
+                     '/api/recipes/', client=client,
+                     reset=lambda: bump_catalog_version('recipes'),
+                     non_empty=True),
+        ]
+        names = sorted(RecipeFilter.base_filters)
+        for size in range(len(names) + 1):
+            for combination in combinations(names, size):
+                query = '&'.join(filter_values[name] for name in combination)
+                scenarios.append(Scenario(
+                    f'recipes-list [{"+".join(combination) or "all"}]',
+                    'get', f'/api/recipes/?{query}', client=client,
+                    non_empty=True))
+        scenarios += [
+            Scenario('recipes-list (cursor)', 'get',
+                     '/api/recipes/?cursor=', client=client, non_empty=True),
+            Scenario('recipes-feed', 'get', '/api/recipes/feed/',
+                     client=client, non_empty=True),
+            Scenario('recipes-detail', 'get',
+                     f'/api/recipes/{recipe.pk}/', client=client),
+            Scenario('recipes-detail (anonymous, uncached)', 'get',
+                     f'/api/recipes/{recipe.pk}/', client=anonymous,
+                     reset=lambda: bump_catalog_version(
+                         f'recipe:{recipe.pk}')),
+        ]
+        scenarios += [
+            Scenario(f'ingredients-search [{query}]', 'get',
+                     f'/api/ingredients/?name={query}', client=anonymous,
+                     non_empty=True)
+            for query in INGREDIENT_QUERIES
+        ]
+        scenarios.append(Scenario(
+            'users-subscriptions', 'get',
+            '/api/users/subscriptions/?recipes_limit=3', client=client,
+            non_empty=True))
+        scenarios += [
+            Scenario(f'download-shopping-cart [{file_format}]', 'get',
+                     '/api/recipes/download_shopping_cart/'
+                     f'?file_format={file_format}', client=client)
+            for file_format in ('txt', 'csv', 'json')
+        ]
+
+        def payload(offset):
+            def build():
+                return {
+                    'name': f'Бенчмарк {time.perf_counter_ns()}',
+                    'text': 'Рецепт для замера производительности.',
+                    'cooking_time': 30,
+                    'image': IMAGE,
+                    'tags': [pk for pk, _ in tags[:2]],
+                    'ingredients': [
+                        {'id': pk, 'amount': 100}
+                        for pk in ingredients[offset:offset + 8]
+                    ],
+                }
+            return build
+
+        author_token, _ = Token.objects.get_or_create(user=author)
+        author_client = Client(HTTP_AUTHORIZATION=f'Token {author_token.key}')
+        own_recipe = author.recipes.order_by('pk').first()
+        scenarios += [
+            Scenario('recipes-create', 'post', '/api/recipes/',
+                     payload(0), client=author_client),
+            Scenario('recipes-update', 'patch',
+                     f'/api/recipes/{own_recipe.pk}/', payload(2),
+                     client=author_client),
+        ]
+        return scenarios
+
+    def measure(self, scenario, iterations, warmup):
+        scenario.prepare()
+        scenario.check(scenario())
+        for _ in range(warmup):
+            scenario.prepare()
+            scenario()
+        timings = []
+        queries = 0
+        for _ in range(iterations):
+            scenario.prepare()
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                scenario()
+                timings.append((time.perf_counter() - started) * 1000)
+            queries = max(queries, len(context))
+        # Память замеряется отдельным прогоном: трассировка tracemalloc
+        # заметно замедляет выполнение и исказила бы задержки.
+        scenario.prepare()
+        tracemalloc.start()
+        try:
+            scenario()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        result = {
+            f'p{rank}_ms': round(percentile(timings, rank), 3)
+            for rank in PERCENTILES
+        }
+        result['queries'] = queries
+        result['peak_memory_kb'] = round(peak / 1024, 1)
+        return result
+
+    def compare(self, results, baseline, options):
+        regressions = []
+        for name, result in results.items():
+            expected = baseline.get(name)
+            if expected is None:
+                continue
+            for rank in PERCENTILES:
+                key = f'p{rank}_ms'
+                limit = (expected[key] * (1 + options['latency_tolerance'])
+                         + options['latency_slack'])
+                if result[key] > limit:
+                    regressions.append(
+                        f'{name}: {key} {result[key]} > {limit:.3f} '
+                        f'(эталон {expected[key]})')
+            limit = expected['queries'] + options['query_tolerance']
+            if result['queries'] > limit:
+                regressions.append(
+                    f'{name}: queries {result["queries"]} > {limit} '
+                    f'(эталон {expected["queries"]})')
+            limit = (expected['peak_memory_kb']
+                     * (1 + options['memory_tolerance']))
+            if result['peak_memory_kb'] > limit:
+                regressions.append(
+                    f'{name}: peak_memory_kb {result["peak_memory_kb"]} > '
+                    f'{limit:.1f} (эталон {expected["peak_memory_kb"]})')
+        return regressions
+
+    def handle(self, *args, **options):
+        if options['save_baseline'] and not options['baseline']:
+            raise CommandError('Для --save-baseline укажите --baseline.')
+        baseline = None
+        if options['baseline'] and not options['save_baseline']:
+            path = Path(options['baseline'])
+            if not path.exists():
+                raise CommandError(f'Файл {path} не найден.')
+            baseline = json.loads(path.read_text())['results']
+
+        media_root = tempfile.mkdtemp()
+        setup_test_environment()
+        results = {}
+        try:
+            # Изменения данных откатываются, загруженные файлы
+            # складываются во временный каталог. Фоновые задачи
+            # выполняются в текущем потоке: в другом соединении данные
+            # транзакции замера не видны.
+            caches = {
+                alias: {**config, 'KEY_PREFIX': (
+                    CACHE_KEY_PREFIX + config.get('KEY_PREFIX', ''))}
+                for alias, config in settings.CACHES.items()
+            }
+            with override_settings(
+                    MEDIA_ROOT=media_root, CACHES=caches,
+                    BACKGROUND_TASKS_SYNC=True), transaction.atomic():
+                scenarios = self.get_scenarios(
+                    self.get_user(options['user']))
+                for scenario in scenarios:
+                    if options['only'] not in scenario.name:
+                        continue
+                    results[scenario.name] = self.measure(
+                        scenario, options['iterations'], options['warmup'])
+                    self.stdout.write(
+                        f'{scenario.name}: ' + ', '.join(
+                            f'{key}={value}' for key, value
+                            in results[scenario.name].items()))
+                transaction.set_rollback(True)
+        finally:
+            teardown_test_environment()
+            shutil.rmtree(media_root, ignore_errors=True)
+
+        report = json.dumps({
+            'meta': {
+                'created_at': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'iterations': options['iterations'],
+            },
+            'results': results,
+        }, ensure_ascii=False, indent=2)
+        Path(options['output']).write_text(report)
+        if options['save_baseline']:
+            Path(options['baseline']).write_text(report)
+            self.stdout.write(self.style.SUCCESS(
+                f'Эталон сохранен в {options["baseline"]}.'))
+            return
+        if baseline is None:
+            self.stdout.write(self.style.SUCCESS(
+                f'Результаты записаны в {options["output"]}.'))
+            return
+
+        regressions = self.compare(results, baseline, options)
+        if regressions:
+            raise CommandError(
+                'Обнаружены регрессии производительности:\n'
+                + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS(
+            'Регрессий относительно эталона не обнаружено.'))
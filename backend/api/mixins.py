@@ -0,0 +1,156 @@
+import gzip
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from rest_framework.renderers import JSONRenderer
+
+from recipes.catalog import get_catalog_version
+
+CATALOG_PAYLOAD_KEY = 'catalog_payload:{}:{}'
+ANONYMOUS_RESPONSE_KEY = 'anonymous_response:{}'
+
+
+def accepts_gzip(accept_encoding):
+    """Разрешает ли заголовок Accept-Encoding ответ в gzip: кодировка
+    gzip или * указана без q=0, причем явное gzip важнее *."""
+    weights = {}
+    for item in accept_encoding.split(','):
+        coding, *params = item.strip().lower().split(';')
+        weight = 1.0
+        for param in params:
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[coding.strip()] = weight
+    return weights.get('gzip', weights.get('*', 0)) > 0
+
+
+class CatalogCacheMixin:
+    """Отдача списка справочника из заранее подготовленного JSON.
+
+    Тело ответа и его gzip-вариант хранятся в кэше под ключом текущей
+    версии справочника не дольше CATALOG_CACHE_TIMEOUT. Запросы с
+    If-None-Match, совпадающим с ETag, получают 304 без обращения к
+    базе данных. Списки с параметрами запроса (например, поиск)
+    формируются как обычно.
+    """
+
+    catalog_name = None
+
+    def build_catalog_payload(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        serializer = self.get_serializer(queryset, many=True)
+        body = JSONRenderer().render(serializer.data)
+        digest = hashlib.sha1(body).hexdigest()
+        return {
+            'identity': (body, f'"{digest}"'),
+            'gzip': (gzip.compress(body, mtime=0), f'"{digest}-gzip"'),
+        }
+
+    def get_catalog_payload(self):
+        key = CATALOG_PAYLOAD_KEY.format(
+            self.catalog_name, get_catalog_version(self.catalog_name))
+        payload = cache.get(key)
+        if payload is None:
+            payload = self.build_catalog_payload()
+            cache.set(key, payload, settings.CATALOG_CACHE_TIMEOUT)
+        return payload
+
+    def list(self, request, *args, **kwargs):
+        if (request.query_params
+                or request.accepted_renderer.format != 'json'):
+            return super().list(request, *args, **kwargs)
+
+        payload = self.get_catalog_payload()
+        encoding = ('gzip' if accepts_gzip(
+            request.META.get('HTTP_ACCEPT_ENCODING', '')) else 'identity')
+        body, etag = payload[encoding]
+
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH', '')
+        etags = {tag.strip().replace('W/', '', 1)
+                 for tag in if_none_match.split(',')}
+        if '*' in etags or etags & {etag for _, etag in payload.values()}:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(body, content_type='application/json')
+            if encoding == 'gzip':
+                response['Content-Encoding'] = 'gzip'
+        response['ETag'] = etag
+        response['Vary'] = 'Accept, Accept-Encoding'
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+
+class AnonymousCacheMixin:
+    """Кэширование готовых ответов списка и детальной страницы рецепта
+    для анонимных пользователей.
+
+    Для анонимов is_favorited и is_in_shopping_cart всегда ложны,
+    поэтому ответ зависит только от адреса и данных рецептов. Ключ
+    списка включает нормализованные параметры запроса и версию списка
+    рецептов, ключ детальной страницы - версию самого рецепта; в оба
+    ключа входят версии тегов и ингредиентов. Версии читаются до
+    обращения к базе и меняются сигналами после фиксации изменений,
+    поэтому попадание в кэш не выполняет SQL-запросов и сериализации.
+    """
+
+    catalog_names = ('tags', 'ingredients')
+
+    def is_response_cacheable(self, request):
+        return (not request.user.is_authenticated
+                and request.accepted_renderer.format == 'json')
+
+    def get_response_cache_key(self, request, versions):
+        versions += [get_catalog_version(name)
+                     for name in self.catalog_names]
+        params = sorted(
+            (key, sorted(values))
+            for key, values in request.query_params.lists())
+        # Ссылки пагинации абсолютные, поэтому в ключ входит хост.
+        url = request.build_absolute_uri(request.path)
+        raw_key = f'{url}:{versions}:{params}'
+        return ANONYMOUS_RESPONSE_KEY.format(
+            hashlib.md5(raw_key.encode()).hexdigest())
+
+    @staticmethod
+    def render_response(response):
+        return JSONRenderer().render(response.data)
+
+    @staticmethod
+    def cached_response(body):
+        return HttpResponse(body, content_type='application/json')
+
+    def list(self, request, *args, **kwargs):
+        if not self.is_response_cacheable(request):
+            return super().list(request, *args, **kwargs)
+        key = self.get_response_cache_key(
+            request, [get_catalog_version('recipe_list')])
+        body = cache.get(key)
+        if body is None:
+            body = self.render_response(
+                super().list(request, *args, **kwargs))
+            cache.set(key, body, settings.ANONYMOUS_RESPONSE_CACHE_TIMEOUT)
+        return self.cached_response(body)
+
+    def retrieve(self, request, *args, **kwargs):
+        if not self.is_response_cacheable(request):
+            return super().retrieve(request, *args, **kwargs)
+        # Версия хранится под каноническим id: /recipes/01/ и
+        # /recipes/1/ - один и тот же рецепт.
+        try:
+            pk = int(self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+        except ValueError:
+            return super().retrieve(request, *args, **kwargs)
+        key = self.get_response_cache_key(
+            request, [get_catalog_version(f'recipe:{pk}')])
+        body = cache.get(key)
+        if body is None:
+            body = self.render_response(
+                super().retrieve(request, *args, **kwargs))
+            cache.set(key, body, settings.ANONYMOUS_RESPONSE_CACHE_TIMEOUT)
+        return self.cached_response(body)
@@ -1,6 +1,237 @@
-from rest_framework.pagination import PageNumberPagination
+import hashlib
 
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connection
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (Cursor, CursorPagination,
+                                       PageNumberPagination)
 
-class CustomPagination(PageNumberPagination):
+from recipes.catalog import get_catalog_version
+from recipes.feed import after_position, get_feed_keys
+
+COUNT_CACHE_KEY = 'pagination_count:{}'
+
+
+class CachedCountPagination(PageNumberPagination):
+    """Постраничная пагинация с кэшированием общего числа объектов.
+
+    Число объектов кэшируется на PAGINATION_COUNT_CACHE_TIMEOUT секунд
+    по нормализованному набору фильтров. Ключ включает версию рецептов,
+    которая меняется при их создании и удалении, а для авторизованных
+    пользователей еще и версию их избранного, списка покупок и подписок.
+    Для выборок без условий на PostgreSQL при большом размере таблицы
+    используется оценка планировщика, а в ответе выставляется
+    count_estimated.
+    """
+
+    count_ignored_params = ('page', 'limit', 'cursor')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.view = view
+        self.count_estimated = False
+        return super().paginate_queryset(queryset, request, view)
+
+    def django_paginator_class(self, object_list, per_page):
+        paginator = Paginator(object_list, per_page)
+        paginator.count = self.get_count(object_list)
+        return paginator
+
+    def get_count_cache_key(self):
+        user = self.request.user
+        versions = [get_catalog_version('recipes')]
+        if user.is_authenticated:
+            versions.append(get_catalog_version(f'user_lists:{user.pk}'))
+        params = sorted(
+            (key, sorted(values))
+            for key, values in self.request.query_params.lists()
+            if key not in self.count_ignored_params
+        )
+        raw_key = f'{self.request.path}:{user.pk}:{versions}:{params}'
+        return COUNT_CACHE_KEY.format(
+            hashlib.md5(raw_key.encode()).hexdigest())
+
+    def get_estimated_count(self, queryset):
+        """Оценка числа строк таблицы по статистике PostgreSQL."""
+        query = queryset.query
+        if (connection.vendor != 'postgresql' or query.where
+                or query.distinct or query.group_by is not None):
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class '
+                'WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+        if row is None or row[0] < settings.PAGINATION_ESTIMATE_THRESHOLD:
+            return None
+        return row[0]
+
+    def get_count(self, queryset):
+        key = self.get_count_cache_key()
+        cached = cache.get(key)
+        if cached is not None:
+            count, self.count_estimated = cached
+            return count
+
+        count = self.get_estimated_count(queryset)
+        self.count_estimated = count is not None
+        if count is None:
+            count = queryset.count()
+        cache.set(key, (count, self.count_estimated),
+                  settings.PAGINATION_COUNT_CACHE_TIMEOUT)
+        return count
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response.data['count_estimated'] = self.count_estimated
+        return response
+
+    def get_paginated_response_schema(self, schema):
+        schema = super().get_paginated_response_schema(schema)
+        schema['properties']['count_estimated'] = {
+            'type': 'boolean',
+            'example': False,
+        }
+        return schema
+
+
+class CustomPagination(CachedCountPagination):
     page_size = 6
     page_size_query_param = 'limit'
+
+
+class RankedListPagination(PageNumberPagination):
+    """Постраничная выдача заранее упорядоченного списка в памяти:
+    его длина известна, поэтому COUNT(*) не нужен."""
+    page_size = 6
+    page_size_query_param = 'limit'
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Выдача рецептов по курсору (date_created, id).
+
+    Позиция курсора - ключ последнего рецепта страницы, следующая
+    страница выбирается условием after_position по обоим столбцам
+    индекса, без OFFSET: глубина страницы не влияет на стоимость
+    запроса, а рецепты с одинаковой датой не пропускаются.
+    """
+
+    page_size = 6
+    page_size_query_param = 'limit'
+    ordering = ('-date_created', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            reverse, position = False, None
+        else:
+            reverse, position = (self.cursor.reverse,
+                                 self.parse_position(self.cursor.position))
+        page = self.get_page(queryset, self.page_size + 1, position, reverse)
+        has_more = len(page) > self.page_size
+        page = page[:self.page_size]
+        if reverse:
+            page.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.keys = [key for key, _ in page]
+        return [recipe for _, recipe in page if recipe is not None]
+
+    def get_page(self, queryset, limit, position, reverse):
+        """Не более limit пар (ключ, рецепт) после position в порядке
+        выдачи."""
+        if position is not None:
+            queryset = queryset.filter(
+                after_position(position, 'date_created', 'id', reverse))
+        prefix = '' if reverse else '-'
+        return [
+            ((recipe.date_created, recipe.pk), recipe)
+            for recipe in queryset.order_by(
+                f'{prefix}date_created', f'{prefix}id')[:limit]
+        ]
+
+    def parse_position(self, position):
+        if position is None:
+            # Пустой параметр cursor - первая страница.
+            return None
+        date_created, _, pk = position.rpartition(' ')
+        date_created = parse_datetime(date_created)
+        if date_created is None or not pk.isdigit():
+            raise NotFound(self.invalid_cursor_message)
+        return date_created, int(pk)
+
+    def get_link(self, key, reverse):
+        date_created, pk = key
+        return self.encode_cursor(Cursor(
+            offset=0, reverse=reverse,
+            position=f'{date_created.isoformat()} {pk}'))
+
+    def get_next_link(self):
+        if not self.has_next or not self.keys:
+            return None
+        return self.get_link(self.keys[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.keys:
+            return None
+        return self.get_link(self.keys[0], reverse=True)
+
+
+class FeedCursorPagination(RecipeCursorPagination):
+    """Выдача ленты по тому же курсору (date_created, id рецепта).
+
+    Ключи страницы берутся из get_feed_keys, без сортировки рецептов по
+    подзапросу ленты, затем рецепты читаются по первичному ключу.
+    """
+
+    def get_page(self, queryset, limit, position, reverse):
+        keys = get_feed_keys(
+            self.request.user, queryset, limit, position, reverse)
+        recipes = queryset.in_bulk([pk for _, pk in keys])
+        return [(key, recipes.get(key[1])) for key in keys]
+
+
+class RecipePagination(CustomPagination):
+    """Постраничная пагинация с опциональным режимом курсора.
+
+    Если в запросе есть параметр cursor (в том числе пустой), выдача
+    строится по ключу (-date_created, -id) без OFFSET и COUNT(*), а в
+    ответе возвращаются непрозрачные ссылки next и previous. Без него
+    сохраняется привычный формат с page и limit.
+    """
+
+    cursor_query_param = 'cursor'
+
+    def __init__(self):
+        self.cursor_paginator = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param in request.query_params:
+            self.cursor_paginator = RecipeCursorPagination()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        parameters.append({
+            'name': self.cursor_query_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Курсор для постраничной выдачи без OFFSET.',
+            'schema': {'type': 'string'},
+        })
+        return parameters
@@ -11,10 +11,3 @@ class IsAuthorOrAdminOrReadOnly(permissions.BasePermission):
         return (request.method in permissions.SAFE_METHODS
                 or obj.author == request.user
                 or request.user.is_staff)
-
-
-class IsRecipeOwnerOrAuthenticated(permissions.BasePermission):
-    def has_object_permission(self, request, view, obj):
-        if request.user.is_authenticated:
-            return True
-        return obj.author == request.user
@@ -1,19 +1,25 @@
 from django.core.validators import MinValueValidator
-from django.shortcuts import get_object_or_404
+from django.db import transaction
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework.exceptions import ValidationError
 from rest_framework.relations import PrimaryKeyRelatedField
-from rest_framework.serializers import (CharField, IntegerField,
-                                        ModelSerializer, ReadOnlyField,
-                                        SerializerMethodField)
+from rest_framework.serializers import (CharField, Field, IntegerField,
+                                        ListField, ModelSerializer,
+                                        Serializer, SerializerMethodField)
 
-from api.constants import (DUPLICATE_INGREDIENT_MESSAGE,
-                           DUPLICATE_TAGS_MESSAGE, INVALID_AMOUNT_MESSAGE,
+from api.constants import (BATCH_RECIPES_LIMIT, DUPLICATE_INGREDIENT_MESSAGE,
+                           DUPLICATE_TAGS_MESSAGE, INGREDIENT_SET_LIMIT,
+                           INVALID_AMOUNT_MESSAGE,
                            INVALID_COOKING_TIME_MESSAGE,
-                           MISSING_INGREDIENT_MESSAGE, MISSING_TAG_MESSAGE,
-                           INVALID_NAME_MESSAGE)
-from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingCart, Tag)
+                           INVALID_NAME_MESSAGE, MISSING_INGREDIENT_MESSAGE,
+                           MISSING_TAG_MESSAGE, UNKNOWN_INGREDIENTS_MESSAGE)
+from api.utils import get_recipes_limit
+from recipes.constants import IMAGE_VARIANT_FORMATS
+from recipes.images import is_actual
+from recipes.models import (Favorite, Ingredient, IngredientIndex, Recipe,
+                            RecipeIngredient, RecipeTag, ShoppingCart,
+                            ShoppingListItem, Tag)
+from recipes.registry import ingredient_registry, tag_registry
 from users.models import Subscription, User
 
 
@@ -37,6 +43,8 @@ class CustomUserSerializer(ModelSerializer):
                   'last_name', 'is_subscribed')
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return Subscription.objects.filter(
@@ -44,17 +52,41 @@ class CustomUserSerializer(ModelSerializer):
         return False
 
 
+class ImageVariantsField(Field):
+    """Ссылки на уменьшенные копии изображения рецепта вида
+    {формат: {ширина: url}}; пока копии не построены - пустой объект."""
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        if not is_actual(recipe):
+            return {}
+        request = self.context.get('request')
+        urls = {}
+        for extension in IMAGE_VARIANT_FORMATS:
+            for width, name in recipe.image_variants.get(
+                    extension, {}).items():
+                url = recipe.image.storage.url(name)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                urls.setdefault(extension, {})[width] = url
+        return urls
+
+
 class RecipeMinifiedSerializer(ModelSerializer):
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time',)
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time',)
 
 
 class SubscriptionSerializer(ModelSerializer):
     is_subscribed = SerializerMethodField()
     recipes = SerializerMethodField()
-    recipes_count = SerializerMethodField()
 
     class Meta:
         model = User
@@ -64,6 +96,8 @@ class SubscriptionSerializer(ModelSerializer):
                             'is_subscribed', 'recipes', 'recipes_count')
 
     def get_is_subscribed(self, obj):
+        if 'is_subscribed' in self.context:
+            return self.context['is_subscribed']
         request = self.context.get('request')
         user = request.user
         if user.is_anonymous:
@@ -72,17 +106,33 @@ class SubscriptionSerializer(ModelSerializer):
 
     def get_recipes(self, obj):
         request = self.context.get('request')
-        recipes_limit = request.query_params.get('recipes_limit')
-        recipes = obj.recipes.all()
-
-        if recipes_limit:
-            recipes = recipes[:int(recipes_limit)]
+        if hasattr(obj, 'limited_recipes'):
+            recipes = obj.limited_recipes
+        else:
+            recipes = obj.recipes.all()
+            recipes_limit = get_recipes_limit(request)
+            if recipes_limit is not None:
+                recipes = recipes[:recipes_limit]
 
         return RecipeMinifiedSerializer(
             recipes, many=True, context={'request': request}).data
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
+
+class RecipeIdsSerializer(Serializer):
+    recipes = ListField(
+        child=IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BATCH_RECIPES_LIMIT,
+    )
+
+
+class IngredientSetSerializer(Serializer):
+    ingredients = ListField(
+        child=IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=INGREDIENT_SET_LIMIT,
+    )
+    max_missing = IntegerField(min_value=0, required=False)
 
 
 class IngredientSerializer(ModelSerializer):
@@ -101,10 +151,8 @@ class TagSerializer(ModelSerializer):
 
 class RecipeIngredientSerializer(ModelSerializer):
     id = IntegerField()
-    name = ReadOnlyField(
-        source='ingredient.name')
-    measurement_unit = ReadOnlyField(
-        source='ingredient.measurement_unit')
+    name = SerializerMethodField()
+    measurement_unit = SerializerMethodField()
     amount = IntegerField(
         validators=[MinValueValidator(
             1, message=INVALID_AMOUNT_MESSAGE)],
@@ -115,41 +163,87 @@ class RecipeIngredientSerializer(ModelSerializer):
         fields = (
             'id', 'name', 'measurement_unit', 'amount',)
 
+    def get_name(self, obj):
+        return ingredient_registry.get(obj.ingredient_id).name
+
+    def get_measurement_unit(self, obj):
+        return ingredient_registry.get(obj.ingredient_id).measurement_unit
+
+
+class TagRegistryField(PrimaryKeyRelatedField):
+    """Поле тега, проверяющее id по справочнику в памяти."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            tag = tag_registry.get(int(data))
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if tag is None:
+            self.fail('does_not_exist', pk_value=data)
+        return tag
+
 
 class RecipeSerializer(ModelSerializer):
-    tags = TagSerializer(many=True)
+    tags = SerializerMethodField()
     author = CustomUserSerializer(read_only=True)
     is_favorited = SerializerMethodField()
     ingredients = SerializerMethodField()
     is_in_shopping_cart = SerializerMethodField()
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients', 'is_favorited',
-                  'is_in_shopping_cart', 'name', 'image',
+                  'is_in_shopping_cart', 'name', 'image', 'image_variants',
                   'text', 'cooking_time',)
 
+    def to_representation(self, instance):
+        if hasattr(instance, 'author_is_subscribed'):
+            instance.author.is_subscribed = instance.author_is_subscribed
+        return super().to_representation(instance)
+
+    def get_tags(self, obj):
+        tags = [tag_registry.get(recipe_tag.tag_id)
+                for recipe_tag in obj.recipetag_set.all()]
+        return TagSerializer(tags, many=True).data
+
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context.get('request').user
         return not user.is_anonymous and Favorite.objects.filter(
             user=user, recipe=obj).exists()
 
     def get_ingredients(self, obj):
-        ingredients = RecipeIngredient.objects.filter(recipe=obj)
+        ingredients = obj.recipeingredient_set.all()
         serializer = RecipeIngredientSerializer(ingredients, many=True)
 
         return serializer.data
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context.get('request').user
         return not user.is_anonymous and ShoppingCart.objects.filter(
             user=user, recipe=obj).exists()
 
 
+class RecipeCoverageSerializer(RecipeSerializer):
+    """Рецепт с числом имеющихся и недостающих ингредиентов."""
+    matched_count = IntegerField(read_only=True)
+    missing_count = IntegerField(read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + (
+            'matched_count', 'missing_count',)
+
+
 class CreateUpdateRecipeSerializer(ModelSerializer):
     name = CharField()
     ingredients = RecipeIngredientSerializer(many=True)
-    tags = PrimaryKeyRelatedField(queryset=Tag.objects.all(), many=True)
+    tags = TagRegistryField(queryset=Tag.objects.all(), many=True)
     author = CustomUserSerializer(read_only=True)
     image = Base64ImageField()
     cooking_time = IntegerField(
@@ -187,37 +281,90 @@ class CreateUpdateRecipeSerializer(ModelSerializer):
                 raise ValidationError(DUPLICATE_INGREDIENT_MESSAGE)
             ingredients_set.add(ingredient_id)
 
-        return value
+        # Ингредиенты проверяются по справочнику в памяти; в базу
+        # идет один запрос только за id, которых в справочнике нет.
+        missing = ingredients_set - set(
+            ingredient_registry.in_bulk(ingredients_set))
+        if missing:
+            raise ValidationError(UNKNOWN_INGREDIENTS_MESSAGE.format(
+                ids=', '.join(map(str, sorted(missing)))))
 
-    def create_ingredients(self, recipe, ingredients_data):
-        ingredients = []
-        for ingredient_data in ingredients_data:
-            ingredient_id = ingredient_data['id']
-            amount = ingredient_data['amount']
-            ingredient_obj = get_object_or_404(Ingredient, pk=ingredient_id)
-            ingredients.append(RecipeIngredient(
-                recipe=recipe, ingredient=ingredient_obj, amount=amount))
-        RecipeIngredient.objects.bulk_create(ingredients)
+        return value
 
+    def set_tags(self, recipe, tags, created=False):
+        """Добавить недостающие и удалить лишние теги рецепта."""
+        new_ids = {tag.pk for tag in tags}
+        old_ids = set() if created else {
+            recipe_tag.tag_id for recipe_tag in recipe.recipetag_set.all()}
+        if old_ids - new_ids:
+            RecipeTag.objects.filter(
+                recipe=recipe, tag_id__in=old_ids - new_ids).delete()
+        RecipeTag.objects.bulk_create(
+            RecipeTag(recipe=recipe, tag_id=tag_id)
+            for tag_id in sorted(new_ids - old_ids))
+
+    def set_ingredients(self, recipe, ingredients_data, created=False):
+        """Привести ингредиенты рецепта к переданным, изменяя только
+        отличающиеся строки. Текущие строки берутся из prefetch_related
+        представления, если они уже загружены. Возвращает старые и новые
+        количества по ингредиентам."""
+        new_amounts = {
+            ingredient_data['id']: ingredient_data['amount']
+            for ingredient_data in ingredients_data
+        }
+        existing = {} if created else {
+            row.ingredient_id: row
+            for row in recipe.recipeingredient_set.all()
+        }
+        old_amounts = {ingredient_id: row.amount
+                       for ingredient_id, row in existing.items()}
+        to_update = []
+        for ingredient_id, row in existing.items():
+            amount = new_amounts.get(ingredient_id)
+            if amount is not None and amount != row.amount:
+                row.amount = amount
+                to_update.append(row)
+        to_delete = [row.pk for ingredient_id, row in existing.items()
+                     if ingredient_id not in new_amounts]
+
+        if to_delete:
+            RecipeIngredient.objects.filter(pk__in=to_delete).delete()
+        if to_update:
+            RecipeIngredient.objects.bulk_update(to_update, ('amount',))
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount)
+            for ingredient_id, amount in new_amounts.items()
+            if ingredient_id not in existing)
+        return old_amounts, new_amounts
+
+    @transaction.atomic
     def create(self, validated_data):
         author = self.context['request'].user
         tags = validated_data.pop('tags')
         ingredients_data = validated_data.pop('ingredients')
 
         recipe = Recipe.objects.create(author=author, **validated_data)
-        recipe.tags.set(tags)
-        self.create_ingredients(recipe, ingredients_data)
+        self.set_tags(recipe, tags, created=True)
+        _, new_amounts = self.set_ingredients(
+            recipe, ingredients_data, created=True)
+        IngredientIndex.objects.update_recipe(recipe.pk, (), new_amounts)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         tags = validated_data.pop('tags', None)
         if tags is not None:
-            instance.tags.set(tags)
+            self.set_tags(instance, tags)
 
         ingredients_data = validated_data.pop('ingredients', None)
         if ingredients_data is not None:
-            instance.ingredients.clear()
-            self.create_ingredients(instance, ingredients_data)
+            old_amounts, new_amounts = self.set_ingredients(
+                instance, ingredients_data)
+            ShoppingListItem.objects.update_recipe(
+                instance, old_amounts, new_amounts)
+            IngredientIndex.objects.update_recipe(
+                instance.pk, old_amounts, new_amounts)
 
         return super().update(instance, validated_data)
 
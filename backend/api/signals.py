@@ -0,0 +1,26 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api.authentication import invalidate_token
+from api.constants import TOKEN_INVALIDATING_FIELDS
+from users.models import User
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, created, update_fields,
+                           **kwargs):
+    """Смена пароля и деактивация должны сразу дойти до
+    аутентификации. Сохранения только других полей, например
+    счетчиков, кэш токенов не трогают."""
+    if created or (update_fields is not None
+                   and TOKEN_INVALIDATING_FIELDS.isdisjoint(update_fields)):
+        return
+    for key in Token.objects.filter(user=instance).values_list(
+            'key', flat=True):
+        invalidate_token(key)
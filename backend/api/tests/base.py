@@ -0,0 +1,140 @@
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.authentication import CachedTokenAuthentication, local_tokens
+from recipes.counters import recount
+from recipes.feed import rebuild_feeds
+from recipes.models import (Ingredient, IngredientIndex, Recipe,
+                            RecipeIngredient, RecipeTag, ShoppingListItem,
+                            Tag)
+from recipes.registry import ingredient_registry, tag_registry
+from recipes.search import ingredient_index
+from users.models import User
+
+LOCAL_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+# Изображение 1x1 в формате GIF.
+IMAGE = ('data:image/gif;base64,'
+         'R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7')
+
+
+class APITestCase(TestCase):
+    """Общая основа тестов API: справочники, авторы с рецептами,
+    читатель и клиенты. Размер данных задается атрибутами класса,
+    связи читателя с рецептами добавляются в create_relations."""
+
+    tags_count = 3
+    ingredients_count = 20
+    authors_count = 2
+    recipes_per_author = 2
+    ingredients_per_recipe = 5
+
+    @classmethod
+    def setUpClass(cls):
+        # Загруженные файлы складываются во временный каталог, фоновые
+        # задачи выполняются сразу, вместо memcached - кэш в памяти.
+        media_root = tempfile.mkdtemp()
+        settings = override_settings(
+            MEDIA_ROOT=media_root, BACKGROUND_TASKS_SYNC=True,
+            CACHES=LOCAL_CACHES)
+        settings.enable()
+        cls.addClassCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        cls.addClassCleanup(settings.disable)
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tags = [
+            Tag.objects.create(
+                name=f'Тег {i}', color=f'#00000{i}', slug=f'tag-{i}')
+            for i in range(cls.tags_count)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {i}', measurement_unit='г')
+            for i in range(cls.ingredients_count)
+        ]
+        cls.reader = User.objects.create_user(
+            email='reader@foodgram.ru', username='reader',
+            first_name='Читатель', last_name='Читатель', password='pass')
+        cls.authors = [
+            User.objects.create(
+                email=f'author{i}@foodgram.ru', username=f'author{i}',
+                first_name='Автор', last_name=str(i))
+            for i in range(cls.authors_count)
+        ]
+        cls.recipes = [
+            Recipe.objects.create(
+                author=author, name=f'Рецепт {author.pk}-{i}',
+                text='Описание', cooking_time=10)
+            for author in cls.authors
+            for i in range(cls.recipes_per_author)
+        ]
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient=cls.ingredients[
+                    (recipe.pk + i) % cls.ingredients_count],
+                amount=i + 1)
+            for recipe in cls.recipes
+            for i in range(cls.ingredients_per_recipe)
+        )
+        RecipeTag.objects.bulk_create(
+            RecipeTag(recipe=recipe, tag=tag)
+            for recipe in cls.recipes
+            for tag in cls.tags[:2]
+        )
+        cls.create_relations()
+        # Связи создаются через bulk_create, поэтому производные данные
+        # пересобираются так же, как после generate_data.
+        ShoppingListItem.objects.rebuild()
+        recount()
+        rebuild_feeds()
+        IngredientIndex.objects.rebuild()
+
+    @classmethod
+    def create_relations(cls):
+        """Избранное, списки покупок и подписки читателя."""
+
+    def setUp(self):
+        cache.clear()
+        local_tokens.clear()
+        ingredient_index.invalidate()
+        for registry in (tag_registry, ingredient_registry):
+            registry.invalidate()
+        self.anonymous_client = APIClient()
+        self.client = self.get_client(self.reader)
+
+    @staticmethod
+    def get_client(user):
+        token, _ = Token.objects.get_or_create(user=user)
+        # Токен сразу попадает в кэш аутентификации, как у пользователя,
+        # который уже делал запросы.
+        CachedTokenAuthentication().authenticate_credentials(token.key)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
+
+    def recipe_payload(self, ingredients_count=None):
+        if ingredients_count is None:
+            ingredients_count = self.ingredients_per_recipe
+        return {
+            'name': 'Новый рецепт',
+            'text': 'Описание',
+            'cooking_time': 15,
+            'image': IMAGE,
+            'tags': [tag.pk for tag in self.tags],
+            'ingredients': [
+                {'id': ingredient.pk, 'amount': 10}
+                for ingredient in self.ingredients[:ingredients_count]
+            ],
+        }
@@ -0,0 +1,51 @@
+from django.core.cache import cache
+from rest_framework.authtoken.models import Token
+
+from api.authentication import TOKEN_CACHE_KEY, local_tokens
+from api.tests.base import APITestCase
+from users.models import User
+
+
+class TokenCacheTestCase(APITestCase):
+    """Кэш токенов аутентификации."""
+
+    url = '/api/users/me/'
+
+    def test_logout(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/auth/token/logout/')
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_set_password(self):
+        key = Token.objects.get(user=self.reader).key
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/users/set_password/', {
+                'current_password': 'pass', 'new_password': 'new-pass-1'},
+                format='json')
+        self.assertIsNone(local_tokens.get(key))
+        self.assertIsNone(cache.get(TOKEN_CACHE_KEY.format(key)))
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        user = User.objects.get(pk=self.reader.pk)
+        self.assertTrue(user.check_password('new-pass-1'))
+        self.assertEqual(user.recipes_count, self.reader.recipes_count)
+
+    def test_deactivation(self):
+        user = User.objects.get(pk=self.reader.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            user.is_active = False
+            user.save()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_other_fields(self):
+        """Сохранение других полей пользователя не сбрасывает кэш."""
+        key = Token.objects.get(user=self.reader).key
+        user = User.objects.get(pk=self.reader.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save(update_fields=('recipes_count',))
+        self.assertIsNotNone(local_tokens.get(key))
+        with self.captureOnCommitCallbacks(execute=True):
+            user.is_active = False
+            user.save(update_fields=('is_active',))
+        self.assertIsNone(local_tokens.get(key))
+        self.assertEqual(self.client.get(self.url).status_code, 401)
@@ -0,0 +1,154 @@
+from unittest import mock
+
+from django.core.cache import cache
+
+from api.tests.base import APITestCase
+from recipes.models import (IngredientIndex, IngredientIndexChange,
+                            RecipeIngredient)
+from recipes.search import rank_by_index, rank_by_ingredients
+
+
+class ByIngredientsTestCase(APITestCase):
+    """Подбор рецептов по имеющимся ингредиентам."""
+
+    authors_count = 5
+
+    def get_index(self):
+        """Индекс с учетом журнала: {ingredient_id: {recipe_id: count}}."""
+        IngredientIndex.objects.compact()
+        index = {}
+        for segment in IngredientIndex.objects.order_by('shard'):
+            index.setdefault(segment.ingredient_id, {}).update(
+                zip(*segment.get_entries()))
+        return index
+
+    def test_index_matches_rebuild(self):
+        """Индекс после правок через API совпадает с пересобранным."""
+        author_client = self.get_client(self.authors[0])
+        author_client.patch(f'/api/recipes/{self.recipes[0].pk}/',
+                            self.recipe_payload(3), format='json')
+        author_client.post('/api/recipes/', self.recipe_payload(),
+                           format='json')
+        author_client.delete(f'/api/recipes/{self.recipes[1].pk}/')
+        self.assertTrue(IngredientIndexChange.objects.exists())
+        ranking = rank_by_ingredients(
+            {ingredient.pk for ingredient in self.ingredients})
+        index = self.get_index()
+        self.assertFalse(IngredientIndexChange.objects.exists())
+        self.assertEqual(ranking, rank_by_ingredients(
+            {ingredient.pk for ingredient in self.ingredients}))
+        IngredientIndex.objects.rebuild()
+        self.assertEqual(index, self.get_index())
+
+    def test_ranking(self):
+        """Рецепты упорядочены по числу недостающих ингредиентов."""
+        recipe = self.recipes[0]
+        have = self.ingredients[:3]
+        self.get_client(self.authors[0]).patch(
+            f'/api/recipes/{recipe.pk}/', self.recipe_payload(3),
+            format='json')
+        query = '&'.join(f'ingredients={item.pk}' for item in have)
+        url = f'/api/recipes/by_ingredients/?{query}&limit=50'
+        results = self.client.get(url).json()['results']
+        self.assertEqual(results[0]['id'], recipe.pk)
+        self.assertEqual(
+            (results[0]['matched_count'], results[0]['missing_count']),
+            (3, 0))
+        ingredient_ids = {item.pk for item in have}
+        for item in results:
+            recipe_ingredients = set(RecipeIngredient.objects.filter(
+                recipe_id=item['id']).values_list('ingredient_id', flat=True))
+            self.assertEqual(
+                item['matched_count'] + item['missing_count'],
+                len(recipe_ingredients))
+            self.assertEqual(item['matched_count'],
+                             len(ingredient_ids & recipe_ingredients))
+        keys = [(item['missing_count'], -item['matched_count'])
+                for item in results]
+        self.assertEqual(keys, sorted(keys))
+
+        response = self.client.get(f'{url}&max_missing=2')
+        self.assertTrue(all(item['missing_count'] <= 2
+                            for item in response.json()['results']))
+
+    def test_shards(self):
+        """Индекс из нескольких сегментов совпадает с пересобранным."""
+        with mock.patch('recipes.models.INGREDIENT_INDEX_SHARD_SIZE', 2):
+            IngredientIndex.objects.rebuild()
+            self.assertGreater(
+                IngredientIndex.objects.count(),
+                IngredientIndex.objects.values('ingredient').distinct(
+                ).count())
+            ranking = rank_by_ingredients(
+                {ingredient.pk for ingredient in self.ingredients})
+            self.get_client(self.authors[0]).patch(
+                f'/api/recipes/{self.recipes[0].pk}/',
+                self.recipe_payload(3), format='json')
+            index = self.get_index()
+            IngredientIndex.objects.rebuild()
+            self.assertEqual(index, self.get_index())
+        self.assertNotEqual(ranking, rank_by_ingredients(
+            {ingredient.pk for ingredient in self.ingredients}))
+
+    def test_limit(self):
+        """Возвращаются только limit лучших рецептов."""
+        ingredient_ids = {ingredient.pk for ingredient in self.ingredients}
+        ranking = rank_by_ingredients(ingredient_ids)
+        self.assertEqual(len(ranking), len(self.recipes))
+        self.assertEqual(rank_by_ingredients(ingredient_ids, limit=3),
+                         ranking[:3])
+
+    def test_postings_cap(self):
+        """Для частого ингредиента читаются только новые сегменты."""
+        ingredient_id = RecipeIngredient.objects.values_list(
+            'ingredient_id', flat=True).order_by('ingredient_id').first()
+        recipe_ids = set(RecipeIngredient.objects.filter(
+            ingredient_id=ingredient_id).values_list('recipe_id', flat=True))
+        with mock.patch('recipes.models.INGREDIENT_INDEX_SHARD_SIZE', 1):
+            IngredientIndex.objects.rebuild()
+        ranking = rank_by_index([ingredient_id], None, 50, max_postings=1)
+        self.assertEqual([recipe_id for recipe_id, _, _ in ranking],
+                         [max(recipe_ids)])
+        self.assertEqual(
+            {recipe_id for recipe_id, _, _ in rank_by_index(
+                [ingredient_id], None, 50, max_postings=len(recipe_ids))},
+            recipe_ids)
+
+    def test_cache(self):
+        """Результат кэшируется до изменения индекса."""
+        ingredient_ids = {ingredient.pk for ingredient in self.ingredients}
+        ranking = rank_by_ingredients(ingredient_ids)
+        with self.assertNumQueries(0):
+            self.assertEqual(rank_by_ingredients(ingredient_ids), ranking)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.get_client(self.authors[0]).patch(
+                f'/api/recipes/{self.recipes[0].pk}/',
+                self.recipe_payload(3), format='json')
+        self.assertNotEqual(rank_by_ingredients(ingredient_ids), ranking)
+
+    def test_compaction_on_read(self):
+        """Разросшийся журнал сливается с сегментами после чтения."""
+        self.get_client(self.authors[0]).patch(
+            f'/api/recipes/{self.recipes[0].pk}/', self.recipe_payload(3),
+            format='json')
+        query = '&'.join(
+            f'ingredients={item.pk}' for item in self.ingredients)
+        with mock.patch('recipes.search.INGREDIENT_INDEX_MAX_CHANGES', 0):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.get(
+                    f'/api/recipes/by_ingredients/?{query}')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(IngredientIndexChange.objects.exists())
+        cache.clear()
+        with self.assertNumQueries(3):
+            self.assertEqual(
+                response.json()['count'],
+                len(rank_by_ingredients(
+                    {ingredient.pk for ingredient in self.ingredients})))
+
+    def test_validation(self):
+        url = '/api/recipes/by_ingredients/'
+        self.assertEqual(self.anonymous_client.get(url).status_code, 400)
+        self.assertEqual(self.anonymous_client.get(
+            f'{url}?ingredients={self.ingredients[0].pk}&max_missing=-1'
+        ).status_code, 400)
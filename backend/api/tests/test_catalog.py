@@ -0,0 +1,38 @@
+from api.mixins import accepts_gzip
+from api.tests.base import APITestCase
+from recipes.models import Tag
+
+
+class CatalogCacheTestCase(APITestCase):
+    """Отдача справочников из кэша с ETag и сжатием."""
+
+    def test_accept_encoding(self):
+        for header, expected in (
+                ('gzip', True), ('deflate, gzip;q=0.5', True),
+                ('GZIP', True), ('*', True), ('', False),
+                ('gzip;q=0', False), ('gzip; q=0.0, *', False),
+                ('*;q=0', False), ('br, *;q=0.1', True),
+                ('x-gzip', False)):
+            with self.subTest(header=header):
+                self.assertIs(accepts_gzip(header), expected)
+
+    def test_encoding_and_etag(self):
+        plain = self.anonymous_client.get('/api/tags/')
+        compressed = self.anonymous_client.get(
+            '/api/tags/', HTTP_ACCEPT_ENCODING='gzip')
+        refused = self.anonymous_client.get(
+            '/api/tags/', HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertNotIn('Content-Encoding', refused)
+        self.assertEqual(refused.content, plain.content)
+        self.assertEqual(self.anonymous_client.get(
+            '/api/tags/', HTTP_IF_NONE_MATCH=plain['ETag']).status_code, 304)
+
+    def test_changes_are_visible(self):
+        etag = self.anonymous_client.get('/api/tags/')['ETag']
+        Tag.objects.create(name='Новый тег', color='#123456', slug='new')
+        response = self.anonymous_client.get(
+            '/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('new', [tag['slug'] for tag in response.json()])
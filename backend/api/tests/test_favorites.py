@@ -0,0 +1,139 @@
+from django.db import connection
+from django.utils import timezone
+
+from api.tests.base import APITestCase
+from recipes.counters import recount
+from recipes.models import Favorite, Recipe, ShoppingCart, ShoppingListItem
+
+
+class UserRecipeActionsTestCase(APITestCase):
+    """Избранное и список покупок: одиночные и пакетные действия."""
+
+    authors_count = 15
+
+    def assert_consistent(self):
+        self.assertEqual(ShoppingListItem.objects.find_drift(), {})
+        counts = dict(Recipe.objects.values_list('pk', 'favorites_count'))
+        recount()
+        self.assertEqual(
+            dict(Recipe.objects.values_list('pk', 'favorites_count')),
+            counts)
+
+    def assert_repeat_and_missing(self, action):
+        """Повторное действие дает 400, несуществующий рецепт - 404."""
+        for method in ('post', 'delete'):
+            url = f'/api/recipes/{self.recipes[1].pk}/{action}/'
+            getattr(self.client, method)(url)
+            self.assertEqual(getattr(self.client, method)(url).status_code,
+                             400)
+            self.assertEqual(getattr(self.client, method)(
+                f'/api/recipes/0/{action}/').status_code, 404)
+
+    def test_favorite(self):
+        recipe = self.recipes[1]
+        url = f'/api/recipes/{recipe.pk}/favorite/'
+        self.client.post(url)
+        self.assertEqual(Recipe.objects.get(pk=recipe.pk).favorites_count, 1)
+        self.client.delete(url)
+        self.assertEqual(Recipe.objects.get(pk=recipe.pk).favorites_count, 0)
+        self.assert_repeat_and_missing('favorite')
+
+    def test_shopping_cart(self):
+        url = f'/api/recipes/{self.recipes[-1].pk}/shopping_cart/'
+        self.client.post(url)
+        self.assertTrue(ShoppingListItem.objects.filter(
+            user=self.reader).exists())
+        self.assert_consistent()
+        self.client.delete(url)
+        self.assertFalse(ShoppingListItem.objects.filter(
+            user=self.reader).exists())
+        self.assert_repeat_and_missing('shopping_cart')
+
+    def test_shopping_cart_existing_totals(self):
+        """Строка списка покупок, созданная параллельной транзакцией
+        между проверкой и вставкой, дополняется, а не дает ошибку."""
+        recipe = self.recipes[-1]
+        amounts = ShoppingListItem.objects.get_recipe_amounts([recipe])
+        ShoppingListItem.objects.bulk_create(
+            ShoppingListItem(user=self.reader, ingredient_id=ingredient_id,
+                             total_amount=amount)
+            for ingredient_id, amount in amounts.items())
+        response = self.client.post(
+            f'/api/recipes/{recipe.pk}/shopping_cart/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(dict(ShoppingListItem.objects.filter(
+            user=self.reader).values_list('ingredient_id', 'total_amount')),
+            {ingredient_id: 2 * amount
+             for ingredient_id, amount in amounts.items()})
+
+    def test_apply_changes(self):
+        """Прибавки создают и увеличивают строки, убавки уменьшают и
+        удаляют их, убавки несуществующих строк пропускаются."""
+        first, second, third = (item.pk for item in self.ingredients[:3])
+        user_id = self.reader.pk
+        ShoppingListItem.objects.create(
+            user=self.reader, ingredient_id=first, total_amount=5)
+        ShoppingListItem.objects.create(
+            user=self.reader, ingredient_id=second, total_amount=5)
+        with self.assertNumQueries(3):
+            ShoppingListItem.objects.apply_changes({
+                (user_id, first): 3, (user_id, second): -5,
+                (user_id, third): 2, (user_id, 10 ** 9): -1})
+        self.assertEqual(dict(ShoppingListItem.objects.filter(
+            user=self.reader).values_list('ingredient_id', 'total_amount')),
+            {first: 8, third: 2})
+
+    def test_batch_changes(self):
+        missing_id = 10 ** 9
+        recipe_ids = [recipe.pk for recipe in self.recipes] + [missing_id]
+        for action in ('favorite', 'shopping_cart'):
+            with self.subTest(action=action):
+                url = f'/api/recipes/{action}/'
+                for method in ('post', 'delete', 'post'):
+                    getattr(self.client, method)(
+                        url, {'recipes': recipe_ids}, format='json')
+                statuses = {
+                    item['id']: item['status']
+                    for item in self.client.delete(
+                        url, {'recipes': recipe_ids[:2] + [missing_id]},
+                        format='json').data['results']
+                }
+                self.assertEqual(statuses, {
+                    recipe_ids[0]: 'removed', recipe_ids[1]: 'removed',
+                    missing_id: 'not_found'})
+        self.assert_consistent()
+
+    def test_concurrent_batch_add(self):
+        """Рецепт, добавленный параллельным запросом между проверкой и
+        вставкой, не учитывается повторно."""
+        recipe_ids = [recipe.pk for recipe in self.recipes[:3]]
+        for model in (Favorite, ShoppingCart):
+            with self.subTest(model=model.__name__):
+                table = model._meta.db_table
+                added_at = connection.ops.adapt_datetimefield_value(
+                    timezone.now())
+                inserted = []
+
+                def concurrent_add(execute, sql, params, many, context):
+                    if not inserted and sql.startswith(
+                            f'INSERT INTO {table} '):
+                        inserted.append(recipe_ids[0])
+                        execute(
+                            f'INSERT INTO {table} '
+                            '(user_id, recipe_id, added_at) '
+                            'VALUES (%s, %s, %s)',
+                            [self.reader.pk, recipe_ids[0], added_at],
+                            False, context)
+                        model.objects.recipes_added(self.reader, inserted)
+                    return execute(sql, params, many, context)
+
+                with connection.execute_wrapper(concurrent_add):
+                    added, existing = model.objects.add_many(
+                        self.reader, recipe_ids)
+                self.assertEqual(added, set(recipe_ids[1:]))
+                self.assertEqual(existing, {recipe_ids[0]})
+        self.assertEqual(
+            dict(Recipe.objects.filter(pk__in=recipe_ids).values_list(
+                'pk', 'favorites_count')),
+            dict.fromkeys(recipe_ids, 1))
+        self.assertEqual(ShoppingListItem.objects.find_drift(), {})
@@ -0,0 +1,141 @@
+from django.db import models
+from django.test import override_settings
+
+from api.tests.base import APITestCase
+from recipes.models import FeedItem, Recipe
+from users.models import Subscription, User
+
+
+class FeedTestCase(APITestCase):
+    """Лента рецептов авторов из подписок."""
+
+    authors_count = 3
+
+    @classmethod
+    def create_relations(cls):
+        Subscription.objects.bulk_create(
+            Subscription(user=cls.reader, author=author)
+            for author in cls.authors
+        )
+
+    def get_feed(self):
+        return [item['id'] for item in
+                self.client.get('/api/recipes/feed/').data['results']]
+
+    def get_all_pages(self, url, link='next'):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(item['id'] for item in response.data['results'])
+            url = response.data[link]
+        return ids
+
+    def create_recipe(self, author):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.get_client(author).post(
+                '/api/recipes/', self.recipe_payload(),
+                format='json').data['id']
+
+    def test_fanout(self):
+        self.assertEqual(
+            FeedItem.objects.filter(user=self.reader).count(),
+            len(self.recipes))
+        recipe_id = self.create_recipe(self.authors[0])
+        self.assertEqual(self.get_feed()[0], recipe_id)
+
+    def test_subscribe_and_unsubscribe(self):
+        author = self.authors[0]
+        self.client.delete(f'/api/users/{author.pk}/subscribe/')
+        self.assertFalse(FeedItem.objects.filter(
+            user=self.reader, author=author).exists())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/users/{author.pk}/subscribe/')
+        self.assertEqual(
+            FeedItem.objects.filter(user=self.reader, author=author).count(),
+            self.recipes_per_author)
+
+    def test_popular_authors_on_read(self):
+        """Рецепты популярных авторов подмешиваются при чтении."""
+        author = self.authors[0]
+        with override_settings(FEED_FANOUT_LIMIT=0):
+            recipe_id = self.create_recipe(author)
+            FeedItem.objects.filter(author=author).delete()
+            self.assertEqual(self.get_feed()[0], recipe_id)
+
+    def test_date_created_denormalized(self):
+        self.assertFalse(FeedItem.objects.exclude(
+            date_created=models.F('recipe__date_created')).exists())
+
+    def test_cursor_pages(self):
+        """Курсор проходит ленту из записей и рецептов популярного
+        автора без пропусков и повторов, в обе стороны."""
+        for author in self.authors:
+            self.create_recipe(author)
+        expected = list(Recipe.objects.order_by(
+            '-date_created', '-id').values_list('pk', flat=True))
+        with override_settings(FEED_FANOUT_LIMIT=0):
+            FeedItem.objects.filter(author=self.authors[0]).delete()
+            pages = self.get_all_pages('/api/recipes/feed/?limit=2')
+            self.assertEqual(pages, expected)
+            response = self.client.get('/api/recipes/feed/?limit=2')
+            response = self.client.get(response.data['next'])
+            previous = self.client.get(response.data['previous'])
+            self.assertEqual(
+                [item['id'] for item in previous.data['results']],
+                expected[:2])
+            self.assertIsNone(previous.data['previous'])
+        self.assertEqual(
+            self.client.get('/api/recipes/feed/?cursor=bad').status_code,
+            404)
+
+    def test_filters(self):
+        tag = self.tags[-1]
+        recipe_id = self.create_recipe(self.authors[1])
+        Recipe.objects.get(pk=recipe_id).tags.set([tag])
+        response = self.client.get(f'/api/recipes/feed/?tags={tag.slug}')
+        self.assertEqual(
+            [item['id'] for item in response.data['results']], [recipe_id])
+
+    def test_author_no_longer_popular(self):
+        """Когда у автора становится FEED_FANOUT_LIMIT подписчиков, его
+        рецепты раскладываются по лентам."""
+        author = self.authors[0]
+        follower = User.objects.create(
+            email='follower@foodgram.ru', username='follower')
+        with override_settings(FEED_FANOUT_LIMIT=1):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.get_client(follower).post(
+                    f'/api/users/{author.pk}/subscribe/')
+            FeedItem.objects.filter(author=author).delete()
+            self.assertEqual(len(self.get_feed()), len(self.recipes))
+            with self.captureOnCommitCallbacks(execute=True):
+                self.get_client(follower).delete(
+                    f'/api/users/{author.pk}/subscribe/')
+            self.assertEqual(
+                FeedItem.objects.filter(
+                    user=self.reader, author=author).count(),
+                self.recipes_per_author)
+
+    def test_author_below_limit(self):
+        """Рецепты раскладываются и тогда, когда счетчик оказался ниже
+        порога, минуя равенство ему: например, после смены порога."""
+        author = self.authors[0]
+        followers = [
+            User.objects.create(email=f'follower{i}@foodgram.ru',
+                                username=f'follower{i}')
+            for i in range(2)
+        ]
+        for follower in followers:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.get_client(follower).post(
+                    f'/api/users/{author.pk}/subscribe/')
+        FeedItem.objects.filter(author=author).delete()
+        with override_settings(FEED_FANOUT_LIMIT=5):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.get_client(followers[0]).delete(
+                    f'/api/users/{author.pk}/subscribe/')
+        for user in (self.reader, followers[1]):
+            self.assertEqual(
+                FeedItem.objects.filter(user=user, author=author).count(),
+                self.recipes_per_author)
@@ -0,0 +1,21 @@
+from api.tests.base import APITestCase
+
+
+class RecipeImageTestCase(APITestCase):
+    """Хранение изображений рецептов и их уменьшенные копии."""
+
+    def test_variants(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.get_client(self.authors[0]).post(
+                '/api/recipes/', self.recipe_payload(), format='json')
+        self.assertEqual(response.data['image_variants'], {})
+        variants = self.client.get(
+            f'/api/recipes/{response.data["id"]}/').data['image_variants']
+        self.assertIn('320', variants['jpeg'])
+
+    def test_duplicates_share_file(self):
+        first = self.get_client(self.authors[0]).post(
+            '/api/recipes/', self.recipe_payload(), format='json')
+        second = self.get_client(self.authors[1]).post(
+            '/api/recipes/', self.recipe_payload(), format='json')
+        self.assertEqual(first.data['image'], second.data['image'])
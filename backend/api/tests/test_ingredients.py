@@ -0,0 +1,59 @@
+from api.constants import INGREDIENT_SEARCH_LIMIT
+from api.filters import IngredientFilter
+from api.tests.base import APITestCase
+from recipes.models import Ingredient
+from recipes.search import ingredient_index
+
+
+class IngredientSearchTestCase(APITestCase):
+    """Автодополнение названий ингредиентов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for name in ('Рисовая мука', 'Мускатный орех', 'Мука', 'Ёрш',
+                     'Сельдерей'):
+            Ingredient.objects.create(name=name, measurement_unit='г')
+
+    def search(self, query):
+        response = self.anonymous_client.get(
+            f'/api/ingredients/?name={query}')
+        self.assertEqual(response.status_code, 200)
+        return [item['name'] for item in response.json()]
+
+    def test_ranking(self):
+        """Сначала совпадения по началу названия, затем по вхождению."""
+        self.assertEqual(self.search('му'),
+                         ['Мука', 'Мускатный орех', 'Рисовая мука'])
+        self.assertEqual(self.search('МУКА'), ['Мука', 'Рисовая мука'])
+
+    def test_yo(self):
+        self.assertEqual(self.search('ерш'), ['Ёрш'])
+        self.assertEqual(self.search('ёрш'), ['Ёрш'])
+
+    def test_limit(self):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'Соль {i}', measurement_unit='г',
+                       search_name=f'соль {i}')
+            for i in range(INGREDIENT_SEARCH_LIMIT + 5))
+        Ingredient.objects.create(name='Морская соль', measurement_unit='г')
+        names = self.search('соль')
+        self.assertEqual(len(names), INGREDIENT_SEARCH_LIMIT)
+        self.assertTrue(all(name.startswith('Соль') for name in names))
+
+    def test_new_ingredient(self):
+        """Индекс автодополнения видит ингредиенты, добавленные после
+        первого запроса."""
+        self.assertEqual(self.search('щавель'), [])
+        Ingredient.objects.create(name='Щавель', measurement_unit='г')
+        self.assertEqual(self.search('щавель'), ['Щавель'])
+
+    def test_index_matches_database(self):
+        """Индекс в памяти и запросы к базе для PostgreSQL находят одно
+        и то же для запросов короче и длиннее n-граммы."""
+        for query in ('р', 'ук', 'мук', 'мука', 'ный ор', 'дей', 'ж'):
+            with self.subTest(query=query):
+                self.assertEqual(
+                    ingredient_index.search(query, INGREDIENT_SEARCH_LIMIT),
+                    IngredientFilter.search_database(
+                        Ingredient.objects.all(), query))
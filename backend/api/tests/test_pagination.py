@@ -0,0 +1,94 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.tests.base import APITestCase
+from recipes.models import Favorite, Recipe
+
+
+class RecipePaginationTestCase(APITestCase):
+    """Выдача списка рецептов по страницам и по курсору."""
+
+    authors_count = 3
+    recipes_per_author = 3
+
+    def get_ids(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.json()['results']]
+
+    def test_cursor_links(self):
+        """Ссылки next проходят весь список без пропусков и повторов,
+        previous возвращает на предыдущую страницу, фильтры
+        сохраняются."""
+        author = self.authors[1]
+        for query, expected in (
+                ('', Recipe.objects.all()),
+                (f'&author={author.pk}', Recipe.objects.filter(
+                    author=author))):
+            expected = list(expected.order_by(
+                '-date_created', '-id').values_list('pk', flat=True))
+            url = f'/api/recipes/?cursor=&limit=2{query}'
+            ids, pages = [], []
+            while url:
+                response = self.client.get(url)
+                pages.append(response)
+                ids.extend(self.get_ids(response))
+                url = response.json()['next']
+            self.assertEqual(ids, expected)
+            self.assertIsNone(pages[0].json()['previous'])
+            previous = self.client.get(pages[1].json()['previous'])
+            self.assertEqual(self.get_ids(previous), expected[:2])
+
+    def test_cursor_same_dates(self):
+        """Рецепты с одинаковой датой различаются по id: курсор не
+        пропускает их и не использует OFFSET."""
+        Recipe.objects.update(date_created=self.recipes[0].date_created)
+        expected = list(Recipe.objects.order_by('-id').values_list(
+            'pk', flat=True))
+        url, ids = '/api/recipes/?cursor=&limit=2', []
+        while url:
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url)
+            self.assertFalse(any(
+                'OFFSET' in query['sql']
+                for query in context.captured_queries))
+            ids.extend(self.get_ids(response))
+            url = response.json()['next']
+        self.assertEqual(ids, expected)
+        self.assertEqual(
+            self.client.get('/api/recipes/?cursor=bad').status_code, 404)
+
+    def test_page_format(self):
+        response = self.client.get('/api/recipes/?limit=4&page=2')
+        data = response.json()
+        self.assertEqual(data['count'], len(self.recipes))
+        self.assertFalse(data['count_estimated'])
+        self.assertEqual(len(data['results']), 4)
+
+    def test_cached_count(self):
+        """Число рецептов кэшируется и сбрасывается при создании
+        рецепта через API."""
+        url = '/api/recipes/?limit=1'
+        self.assertEqual(self.client.get(url).json()['count'],
+                         len(self.recipes))
+        # bulk_create не меняет версию рецептов: число берется из кэша.
+        Recipe.objects.bulk_create([Recipe(
+            author=self.authors[0], name='Без сигналов', text='Описание',
+            cooking_time=5)])
+        self.assertEqual(self.client.get(url).json()['count'],
+                         len(self.recipes))
+        self.get_client(self.authors[0]).post(
+            '/api/recipes/', self.recipe_payload(), format='json')
+        self.assertEqual(self.client.get(url).json()['count'],
+                         len(self.recipes) + 2)
+
+    def test_cached_count_per_user(self):
+        """Число рецептов в избранном сбрасывается при изменении
+        избранного пользователя и не смешивается между пользователями."""
+        url = '/api/recipes/?is_favorited=1&limit=1'
+        self.assertEqual(self.client.get(url).json()['count'], 0)
+        self.client.post(f'/api/recipes/{self.recipes[0].pk}/favorite/')
+        self.assertEqual(self.client.get(url).json()['count'], 1)
+        other_client = self.get_client(self.authors[0])
+        self.assertEqual(other_client.get(url).json()['count'], 0)
+        Favorite.objects.filter(user=self.reader).delete()
+        self.assertEqual(self.client.get(url).json()['count'], 0)
@@ -0,0 +1,245 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.tests.base import APITestCase
+from recipes.models import Favorite, ShoppingCart
+from recipes.registry import ingredient_registry, tag_registry
+from users.models import Subscription, User
+
+PAGE_SIZES = (1, 50)
+
+# Максимальное число SQL-запросов на один вызов эндпоинта.
+# Токен авторизованного пользователя берется из кэша аутентификации.
+QUERY_BUDGETS = {
+    'recipes-list (anonymous)': 4,
+    'recipes-list (authenticated)': 4,
+    'recipes-list (cursor)': 3,
+    'recipes-list (search)': 4,
+    'recipes-detail (anonymous)': 3,
+    'recipes-detail (authenticated)': 3,
+    'recipes-list (anonymous, cached)': 0,
+    'recipes-detail (anonymous, cached)': 0,
+    'recipes-create': 14,
+    'recipes-partial-update': 20,
+    'recipes-favorite (post)': 4,
+    'recipes-favorite (delete)': 4,
+    'recipes-shopping-cart (post)': 5,
+    'recipes-shopping-cart (delete)': 6,
+    'recipes-favorite-many (post)': 5,
+    'recipes-favorite-many (delete)': 6,
+    'recipes-shopping-cart-many (post)': 6,
+    'recipes-shopping-cart-many (delete)': 8,
+    'recipes-download-shopping-cart': 1,
+    'recipes-feed': 5,
+    'recipes-by-ingredients': 6,
+    'users-subscriptions': 3,
+    'users-subscribe (post)': 5,
+    'users-subscribe (delete)': 7,
+    'ingredients-list': 2,
+    'ingredients-detail': 1,
+    'tags-list': 1,
+    'catalog (not modified)': 0,
+    'tags-detail': 1,
+}
+
+
+class QueryBudgetTestCase(APITestCase):
+    """Проверка числа SQL-запросов на эндпоинтах API."""
+
+    authors_count = 60
+
+    @classmethod
+    def create_relations(cls):
+        cls.small_cart_user = User.objects.create_user(
+            email='small@foodgram.ru', username='small',
+            first_name='Покупатель', last_name='Покупатель',
+            password='pass')
+        Favorite.objects.bulk_create(
+            Favorite(user=cls.reader, recipe=recipe)
+            for recipe in cls.recipes[::2]
+        )
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=cls.reader, recipe=recipe)
+            for recipe in cls.recipes[:50]
+        )
+        ShoppingCart.objects.create(
+            user=cls.small_cart_user, recipe=cls.recipes[0])
+        Subscription.objects.bulk_create(
+            Subscription(user=cls.reader, author=author)
+            for author in cls.authors
+        )
+
+    def setUp(self):
+        super().setUp()
+        # Справочники в памяти прогреваются заранее: бюджеты считаются
+        # для установившегося режима работы процесса.
+        for registry in (tag_registry, ingredient_registry):
+            registry.get_data()
+
+    def request(self, endpoint, client, method, url, data=None):
+        """Выполнить запрос и проверить, что он уложился в бюджет."""
+        budget = QUERY_BUDGETS[endpoint]
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(client, method)(url, data, format='json')
+            content = (b''.join(response.streaming_content)
+                       if response.streaming else response.content)
+        self.assertLess(
+            response.status_code, 400,
+            f'{endpoint}: {method.upper()} {url} -> '
+            f'{response.status_code} {content[:500]!r}')
+        queries = [query['sql'] for query in context.captured_queries]
+        if len(queries) > budget:
+            self.fail(
+                f'{endpoint}: {method.upper()} {url} выполнил '
+                f'{len(queries)} SQL-запросов при бюджете {budget}:\n'
+                + '\n'.join(f'{number}. {sql}' for number, sql
+                            in enumerate(queries, start=1)))
+        return len(queries)
+
+    def assert_constant(self, endpoint, client, url):
+        """Число запросов не должно зависеть от размера страницы."""
+        separator = '&' if '?' in url else '?'
+        counts = {
+            size: self.request(endpoint, client, 'get',
+                               f'{url}{separator}limit={size}')
+            for size in PAGE_SIZES
+        }
+        self.assertLessEqual(
+            counts[max(PAGE_SIZES)], counts[min(PAGE_SIZES)],
+            f'{endpoint}: {url} число запросов растет с размером '
+            f'страницы: {counts}')
+
+    def test_recipes_list(self):
+        for query in ('', '?is_favorited=1', '?is_in_shopping_cart=1',
+                      '?tags=tag-0&tags=tag-1',
+                      f'?author={self.authors[0].pk}'):
+            with self.subTest(query=query):
+                self.assert_constant('recipes-list (authenticated)',
+                                     self.client, f'/api/recipes/{query}')
+        self.assert_constant('recipes-list (anonymous)',
+                             self.anonymous_client, '/api/recipes/')
+        for query in ('?cursor=', '?cursor=&is_favorited=1',
+                      '?cursor=&is_in_shopping_cart=1'):
+            with self.subTest(query=query):
+                self.assert_constant('recipes-list (cursor)',
+                                     self.client, f'/api/recipes/{query}')
+        self.assert_constant('recipes-list (search)', self.client,
+                             '/api/recipes/?search=рецепт')
+
+    def test_recipes_detail(self):
+        url = f'/api/recipes/{self.recipes[0].pk}/'
+        self.request('recipes-detail (authenticated)',
+                     self.client, 'get', url)
+        self.request('recipes-detail (anonymous)',
+                     self.anonymous_client, 'get', url)
+
+    def test_anonymous_cache(self):
+        list_url = '/api/recipes/'
+        detail_url = f'/api/recipes/{self.recipes[0].pk}/'
+        self.anonymous_client.get(list_url)
+        self.anonymous_client.get(detail_url)
+        self.request('recipes-list (anonymous, cached)',
+                     self.anonymous_client, 'get', list_url)
+        self.request('recipes-detail (anonymous, cached)',
+                     self.anonymous_client, 'get', detail_url)
+
+    def test_by_ingredients(self):
+        query = '&'.join(f'ingredients={ingredient.pk}'
+                         for ingredient in self.ingredients[:3])
+        self.assert_constant('recipes-by-ingredients', self.client,
+                             f'/api/recipes/by_ingredients/?{query}')
+
+    def test_recipes_create_and_update(self):
+        author_client = self.get_client(self.authors[0])
+        self.request('recipes-create', author_client, 'post',
+                     '/api/recipes/', self.recipe_payload())
+        self.request('recipes-partial-update', author_client, 'patch',
+                     f'/api/recipes/{self.recipes[0].pk}/',
+                     self.recipe_payload())
+
+    def test_recipes_update_constant(self):
+        """Число запросов при правке не зависит от числа
+        ингредиентов."""
+        author_client = self.get_client(self.authors[0])
+        url = f'/api/recipes/{self.recipes[0].pk}/'
+        counts = []
+        for count in (self.ingredients_per_recipe, self.ingredients_count):
+            payload = self.recipe_payload(count)
+            author_client.patch(url, payload, format='json')
+            payload['ingredients'][0]['amount'] += 1
+            payload['ingredients'][-1]['amount'] += 1
+            counts.append(self.request(
+                'recipes-partial-update', author_client, 'patch', url,
+                payload))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_recipes_detail_with_variants(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.get_client(self.authors[0]).post(
+                '/api/recipes/', self.recipe_payload(), format='json')
+        self.request('recipes-detail (authenticated)', self.client, 'get',
+                     f'/api/recipes/{response.data["id"]}/')
+
+    def test_favorite(self):
+        url = f'/api/recipes/{self.recipes[1].pk}/favorite/'
+        self.request('recipes-favorite (post)', self.client, 'post', url)
+        self.request('recipes-favorite (delete)', self.client, 'delete', url)
+
+    def test_shopping_cart(self):
+        url = f'/api/recipes/{self.recipes[-1].pk}/shopping_cart/'
+        self.request('recipes-shopping-cart (post)',
+                     self.client, 'post', url)
+        self.request('recipes-shopping-cart (delete)',
+                     self.client, 'delete', url)
+
+    def test_batch_changes(self):
+        recipe_ids = [recipe.pk for recipe in self.recipes[:30]] + [10 ** 9]
+        for action, endpoint in (('favorite', 'recipes-favorite-many'),
+                                 ('shopping_cart',
+                                  'recipes-shopping-cart-many')):
+            with self.subTest(action=action):
+                for method in ('post', 'delete', 'post'):
+                    self.request(f'{endpoint} ({method})', self.client,
+                                 method, f'/api/recipes/{action}/',
+                                 {'recipes': recipe_ids})
+
+    def test_download_shopping_cart(self):
+        for file_format in ('txt', 'csv', 'json'):
+            url = ('/api/recipes/download_shopping_cart/'
+                   f'?file_format={file_format}')
+            small = self.request('recipes-download-shopping-cart',
+                                 self.get_client(self.small_cart_user),
+                                 'get', url)
+            large = self.request('recipes-download-shopping-cart',
+                                 self.client, 'get', url)
+            self.assertEqual(small, large)
+
+    def test_feed(self):
+        self.assert_constant('recipes-feed', self.client, '/api/recipes/feed/')
+
+    def test_subscriptions(self):
+        self.assert_constant('users-subscriptions', self.client,
+                             '/api/users/subscriptions/?recipes_limit=1')
+
+    def test_subscribe(self):
+        url = f'/api/users/{self.small_cart_user.pk}/subscribe/'
+        self.request('users-subscribe (post)', self.client, 'post', url)
+        self.request('users-subscribe (delete)', self.client, 'delete', url)
+
+    def test_ingredients(self):
+        for name in ('Ингр', 'дИент 1', 'ё'):
+            self.request('ingredients-list', self.anonymous_client, 'get',
+                         f'/api/ingredients/?name={name}')
+        self.request('ingredients-list', self.anonymous_client, 'get',
+                     '/api/ingredients/')
+        self.request('ingredients-detail', self.anonymous_client, 'get',
+                     f'/api/ingredients/{self.ingredients[0].pk}/')
+
+    def test_tags(self):
+        self.request('tags-list', self.anonymous_client, 'get', '/api/tags/')
+        etag = self.anonymous_client.get('/api/tags/')['ETag']
+        self.anonymous_client.credentials(HTTP_IF_NONE_MATCH=etag)
+        self.request('catalog (not modified)', self.anonymous_client,
+                     'get', '/api/tags/')
+        self.request('tags-detail', self.anonymous_client, 'get',
+                     f'/api/tags/{self.tags[0].pk}/')
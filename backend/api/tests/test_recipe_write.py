@@ -0,0 +1,49 @@
+from api.tests.base import APITestCase
+from recipes.models import RecipeIngredient, ShoppingCart, ShoppingListItem
+
+
+class RecipeWriteTestCase(APITestCase):
+    """Создание и правка рецептов."""
+
+    @classmethod
+    def create_relations(cls):
+        ShoppingCart.objects.create(user=cls.reader, recipe=cls.recipes[0])
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = self.recipes[0]
+        self.url = f'/api/recipes/{self.recipe.pk}/'
+        self.author_client = self.get_client(self.authors[0])
+
+    def test_ingredients_diff(self):
+        """Правка меняет только отличающиеся строки, а список покупок
+        остается согласованным."""
+        self.author_client.patch(
+            self.url, self.recipe_payload(self.ingredients_count),
+            format='json')
+        payload = self.recipe_payload(3)
+        payload['ingredients'][0]['amount'] = 7
+        payload['ingredients'].append(
+            {'id': self.ingredients[-1].pk, 'amount': 2})
+        row_ids = dict(RecipeIngredient.objects.filter(
+            recipe=self.recipe).values_list('ingredient_id', 'pk'))
+        self.author_client.patch(self.url, payload, format='json')
+        rows = RecipeIngredient.objects.filter(recipe=self.recipe)
+        self.assertEqual(
+            {row.ingredient_id: row.amount for row in rows},
+            {item['id']: item['amount'] for item in payload['ingredients']})
+        for row in rows:
+            self.assertEqual(row.pk, row_ids[row.ingredient_id])
+        self.assertEqual(ShoppingListItem.objects.find_drift(), {})
+
+    def test_unknown_ingredients(self):
+        payload = self.recipe_payload()
+        payload['ingredients'] += [{'id': 10**9, 'amount': 1},
+                                   {'id': 10**9 + 1, 'amount': 1}]
+        response = self.author_client.patch(self.url, payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(f'{10**9}, {10**9 + 1}',
+                      response.json()['ingredients'][0])
+        self.assertEqual(
+            RecipeIngredient.objects.filter(recipe=self.recipe).count(),
+            self.ingredients_per_recipe)
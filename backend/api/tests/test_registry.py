@@ -0,0 +1,68 @@
+from api.filters import RecipeFilter
+from api.tests.base import APITestCase
+from recipes.models import Ingredient, Recipe, Tag
+from recipes.registry import ingredient_registry, tag_registry
+
+
+class CatalogRegistryTestCase(APITestCase):
+    """Справочники в памяти и записи, добавленные в обход сигналов."""
+
+    def setUp(self):
+        super().setUp()
+        for registry in (tag_registry, ingredient_registry):
+            registry.get_data()
+
+    def create_recipe(self, payload):
+        response = self.get_client(self.authors[0]).post(
+            '/api/recipes/', payload, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        detail = self.anonymous_client.get(
+            f'/api/recipes/{response.data["id"]}/')
+        self.assertEqual(detail.status_code, 200)
+        self.assertEqual(
+            self.anonymous_client.get('/api/recipes/').status_code, 200)
+        return detail.json()
+
+    def test_ingredient_created_without_signals(self):
+        # bulk_create не отправляет сигналы, как и load_ingredients.
+        Ingredient.objects.bulk_create(
+            [Ingredient(name='Новый ингредиент', measurement_unit='кг')])
+        ingredient = Ingredient.objects.get(name='Новый ингредиент')
+        payload = self.recipe_payload(2)
+        payload['ingredients'].append({'id': ingredient.pk, 'amount': 3})
+        self.assertIn(
+            {'name': 'Новый ингредиент', 'measurement_unit': 'кг'},
+            [{'name': item['name'],
+              'measurement_unit': item['measurement_unit']}
+             for item in self.create_recipe(payload)['ingredients']])
+
+    def test_tag_created_without_signals(self):
+        Tag.objects.bulk_create(
+            [Tag(name='Новый тег', color='#123456', slug='new-tag')])
+        payload = self.recipe_payload(2)
+        payload['tags'] = [Tag.objects.get(slug='new-tag').pk]
+        self.assertEqual(self.create_recipe(payload)['tags'][0]['slug'],
+                         'new-tag')
+
+    def test_unknown_ingredient(self):
+        payload = self.recipe_payload(1)
+        payload['ingredients'].append({'id': 10 ** 9, 'amount': 1})
+        response = self.get_client(self.authors[0]).post(
+            '/api/recipes/', payload, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_tag_slug_without_signals(self):
+        Tag.objects.bulk_create(
+            [Tag(name='Новый тег', color='#123456', slug='new-tag')])
+        self.assertEqual(tag_registry.get_by_slug('new-tag').name,
+                         'Новый тег')
+        self.assertIsNone(tag_registry.get_by_slug('missing-tag'))
+
+    def test_filter_by_deleted_tag(self):
+        """Тег, удаленный после проверки параметра, не дает ошибку."""
+        recipes = RecipeFilter().filter_by_tags(
+            Recipe.objects.all(), 'tags', ['missing-tag'])
+        self.assertEqual(list(recipes), [])
+        recipes = RecipeFilter().filter_by_tags(
+            Recipe.objects.all(), 'tags', ['missing-tag', self.tags[0].slug])
+        self.assertTrue(recipes.exists())
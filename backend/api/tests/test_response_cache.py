@@ -0,0 +1,63 @@
+from api.tests.base import APITestCase
+from recipes.models import RecipeIngredient
+
+
+class AnonymousResponseCacheTestCase(APITestCase):
+    """Кэш ответов для анонимных пользователей."""
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = self.recipes[0]
+        self.author = self.authors[0]
+        self.list_url = f'/api/recipes/?author={self.author.pk}'
+        self.detail_url = f'/api/recipes/{self.recipe.pk}/'
+
+    def get_recipe(self):
+        detail = self.anonymous_client.get(self.detail_url).json()
+        page = self.anonymous_client.get(self.list_url).json()
+        self.assertIn(detail, page['results'])
+        return detail
+
+    def test_changes_are_visible(self):
+        """Изменения рецепта, тега, ингредиента и автора видны сразу."""
+        self.get_recipe()
+        tag = self.tags[0]
+        ingredient = RecipeIngredient.objects.filter(
+            recipe=self.recipe).first().ingredient
+        changes = (
+            (self.recipe, 'name', 'Новое название',
+             lambda data: data['name']),
+            (tag, 'name', 'Новый тег',
+             lambda data: data['tags'][0]['name']),
+            (ingredient, 'name', 'Новый ингредиент',
+             lambda data: data['ingredients'][0]['name']),
+            (self.author, 'first_name', 'Новое имя',
+             lambda data: data['author']['first_name']),
+        )
+        for instance, field, value, extract in changes:
+            with self.subTest(model=type(instance).__name__):
+                setattr(instance, field, value)
+                with self.captureOnCommitCallbacks(execute=True):
+                    instance.save()
+                self.assertEqual(extract(self.get_recipe()), value)
+
+    def test_deleted_recipe(self):
+        self.get_recipe()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.get_client(self.author).delete(self.detail_url)
+        self.assertEqual(
+            self.anonymous_client.get(self.detail_url).status_code, 404)
+        self.assertNotIn(self.recipe.pk, [
+            item['id'] for item in
+            self.anonymous_client.get(self.list_url).json()['results']])
+
+    def test_non_canonical_pk(self):
+        url = f'/api/recipes/0{self.recipe.pk}/'
+        self.anonymous_client.get(url)
+        self.recipe.name = 'Новое название'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.save()
+        self.assertEqual(
+            self.anonymous_client.get(url).json()['name'], 'Новое название')
+        self.assertEqual(
+            self.anonymous_client.get('/api/recipes/abc/').status_code, 404)
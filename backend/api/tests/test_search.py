@@ -0,0 +1,80 @@
+from unittest import mock
+
+from django.db.backends.postgresql.base import DatabaseWrapper
+
+from api.tests.base import APITestCase
+from recipes.models import FeedItem, Recipe
+from recipes.search import get_recipe_search_text, search_recipes
+
+
+class RecipeSearchTestCase(APITestCase):
+    """Полнотекстовый поиск по рецептам."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        names = ('Тёплый салат с грибами', 'Салаты на зиму',
+                 'Грибной суп')
+        for recipe, name in zip(cls.recipes, names):
+            recipe.name = name
+            recipe.save(update_fields=('name',))
+
+    def search(self, query, params=''):
+        response = self.client.get(f'/api/recipes/?search={query}{params}')
+        return {item['id'] for item in response.json()['results']}
+
+    def test_word_forms(self):
+        """Поиск учитывает формы слов, регистр и ё."""
+        self.get_client(self.authors[1]).patch(
+            f'/api/recipes/{self.recipes[3].pk}/',
+            {'text': 'Подавать с салатом.'}, format='json')
+        recipe_ids = [recipe.pk for recipe in self.recipes]
+        self.assertEqual(self.search('салат'),
+                         {recipe_ids[0], recipe_ids[1], recipe_ids[3]})
+        self.assertEqual(self.search('ТЕПЛЫЙ салаты'), {recipe_ids[0]})
+        self.assertEqual(self.search('несуществующее'), set())
+
+    def test_filters_and_pagination(self):
+        recipe_ids = [recipe.pk for recipe in self.recipes]
+        self.assertEqual(
+            self.search('салат', f'&author={self.authors[0].pk}'),
+            {recipe_ids[0], recipe_ids[1]})
+        self.assertEqual(self.search('салат', '&tags=tag-2'), set())
+        response = self.client.get('/api/recipes/?search=салат&limit=1')
+        self.assertEqual(response.json()['count'], 2)
+        self.assertEqual(len(response.json()['results']), 1)
+
+    def test_writes_without_save(self):
+        """Индекс поиска следит за записями в обход save()."""
+        recipe = self.recipes[2]
+        Recipe.objects.filter(pk=recipe.pk).update(
+            search_text=get_recipe_search_text('Борщ', ''))
+        self.assertEqual(self.search('борщ'), {recipe.pk})
+        self.assertEqual(self.search('грибной'), set())
+        Recipe.objects.filter(pk=recipe.pk).delete()
+        self.assertEqual(self.search('борщ'), set())
+
+    def test_postgresql_sql(self):
+        """На PostgreSQL столбец search_vector берется с псевдонимом
+        таблицы и в подзапросе ленты."""
+        postgresql = DatabaseWrapper({
+            'NAME': 'foodgram', 'USER': '', 'PASSWORD': '', 'HOST': '',
+            'PORT': '', 'OPTIONS': {}, 'TIME_ZONE': None,
+            'CONN_MAX_AGE': 0, 'AUTOCOMMIT': True, 'ATOMIC_REQUESTS': False,
+        })
+        with mock.patch('recipes.search.connection', postgresql):
+            recipes = search_recipes(
+                Recipe.objects.filter(author=self.authors[0]), 'салат')
+        feed = FeedItem.objects.filter(
+            user=self.reader, recipe__in=recipes.values('pk'))
+
+        def compile(queryset):
+            sql, _ = queryset.query.get_compiler(
+                connection=postgresql).as_sql()
+            return sql
+
+        self.assertIn('"recipes_recipe"."search_vector" @@',
+                      compile(recipes))
+        sql = compile(feed)
+        self.assertIn('U0."search_vector" @@', sql)
+        self.assertNotRegex(sql, r'recipes_recipe"?\.')
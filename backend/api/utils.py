@@ -1,17 +1,108 @@
-from recipes.models import RecipeIngredient
-
-
-def process_shopping_cart_items(shopping_cart_items):
-    buy_list = {}
-    for item in shopping_cart_items:
-        ingredients = RecipeIngredient.objects.filter(recipe=item.recipe)
-        for ingredient in ingredients:
-            key = (
-                f'{ingredient.ingredient.name} '
-                f'({ingredient.ingredient.measurement_unit})'
-            )
-            if key in buy_list:
-                buy_list[key] += ingredient.amount
-            else:
-                buy_list[key] = ingredient.amount
-    return buy_list
+import csv
+import json
+from collections import defaultdict
+
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from recipes.models import Recipe, ShoppingListItem
+
+
+def get_shopping_list(user):
+    """Суммарное количество ингредиентов из списка покупок пользователя.
+
+    Суммы поддерживаются в таблице ShoppingListItem при изменении
+    списка покупок, поэтому здесь не нужно обходить рецепты.
+    Строки отсортированы по названию ингредиента.
+    """
+    return ShoppingListItem.objects.filter(user=user).values(
+        'ingredient__name', 'ingredient__measurement_unit', 'total_amount'
+    ).order_by('ingredient__name', 'ingredient__measurement_unit')
+
+
+class Echo:
+    """Псевдобуфер для csv.writer, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def shopping_list_to_txt(items):
+    yield 'Shopping Cart:\n\n'
+    for item in items:
+        yield (f'- {item["ingredient__name"]} '
+               f'({item["ingredient__measurement_unit"]}): '
+               f'{item["total_amount"]}\n')
+
+
+def shopping_list_to_csv(items):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for item in items:
+        yield writer.writerow((item['ingredient__name'],
+                               item['ingredient__measurement_unit'],
+                               item['total_amount']))
+
+
+def shopping_list_to_json(items):
+    yield '['
+    separator = ''
+    for item in items:
+        yield separator + json.dumps({
+            'name': item['ingredient__name'],
+            'measurement_unit': item['ingredient__measurement_unit'],
+            'amount': item['total_amount'],
+        }, ensure_ascii=False)
+        separator = ', '
+    yield ']'
+
+
+SHOPPING_LIST_FORMATS = {
+    'txt': (shopping_list_to_txt, 'text/plain; charset=utf-8'),
+    'csv': (shopping_list_to_csv, 'text/csv; charset=utf-8'),
+    'json': (shopping_list_to_json, 'application/json; charset=utf-8'),
+}
+
+
+def attach_recipes(authors, recipes_limit=None):
+    """Загрузить последние рецепты авторов одним запросом.
+
+    Рецепты нумеруются внутри каждого автора оконной функцией
+    ROW_NUMBER, поэтому ограничение recipes_limit применяется в SQL.
+    Результат сохраняется в атрибут limited_recipes каждого автора.
+    """
+    if not authors:
+        return authors
+    recipes = Recipe.objects.filter(author__in=authors).annotate(
+        recipe_rank=Window(
+            expression=RowNumber(),
+            partition_by=[F('author_id')],
+            order_by=[F('date_created').desc(), F('id').desc()],
+        )
+    ).only('id', 'name', 'image', 'image_variants', 'cooking_time',
+           'author_id')
+    if recipes_limit is not None:
+        sql, params = recipes.order_by().query.sql_with_params()
+        recipes = Recipe.objects.raw(
+            f'SELECT * FROM ({sql}) ranked '
+            'WHERE ranked.recipe_rank <= %s '
+            'ORDER BY ranked.author_id, ranked.recipe_rank',
+            (*params, recipes_limit)
+        )
+    else:
+        recipes = recipes.order_by('author_id', 'recipe_rank')
+
+    recipes_by_author = defaultdict(list)
+    for recipe in recipes:
+        recipes_by_author[recipe.author_id].append(recipe)
+    for author in authors:
+        author.limited_recipes = recipes_by_author[author.pk]
+    return authors
+
+
+def get_recipes_limit(request):
+    """Значение параметра recipes_limit или None, если он не задан."""
+    recipes_limit = request.query_params.get('recipes_limit')
+    if recipes_limit and recipes_limit.isdigit():
+        return int(recipes_limit)
+    return None
@@ -1,4 +1,5 @@
-from django.http import HttpResponse
+from django.db.models import BooleanField, Exists, F, OuterRef, Value
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status
@@ -11,6 +12,7 @@ from rest_framework.viewsets import (GenericViewSet, ModelViewSet,
 
 from api.constants import (ALREADY_SUBSCRIBED_ERROR,
                            INCORRECT_CURRENT_PASSWORD_ERROR,
+                           INVALID_FILE_FORMAT_ERROR,
                            METHOD_NOT_ALLOWED_ERROR, PASSWORD_CHANGE_SUCCESS,
                            RECIPE_ADDED_TO_FAVORITES,
                            RECIPE_ADDED_TO_SHOPPING_LIST,
@@ -20,23 +22,32 @@ from api.constants import (ALREADY_SUBSCRIBED_ERROR,
                            RECIPE_NOT_IN_SHOPPING_LIST,
                            RECIPE_REMOVED_FROM_FAVORITES,
                            RECIPE_REMOVED_FROM_SHOPPING_LIST,
+                           RECIPE_STATUS_ADDED, RECIPE_STATUS_ALREADY_ADDED,
+                           RECIPE_STATUS_NOT_ADDED, RECIPE_STATUS_NOT_FOUND,
+                           RECIPE_STATUS_REMOVED,
                            SELF_SUBSCRIBE_UNSUBSCRIBE_ERROR,
                            SUBSCRIPTION_NOT_FOUND_ERROR, UNAUTHORIZED_USER,
                            USER_UNAUTHORIZED_ERROR)
 from api.filters import IngredientFilter, RecipeFilter
-from api.pagination import CustomPagination
-from api.permissions import (IsAuthorOrAdminOrReadOnly,
-                             IsRecipeOwnerOrAuthenticated)
+from api.mixins import AnonymousCacheMixin, CatalogCacheMixin
+from api.pagination import (CustomPagination, FeedCursorPagination,
+                            RankedListPagination, RecipePagination)
+from api.permissions import IsAuthorOrAdminOrReadOnly
 from api.serializers import (CreateUpdateRecipeSerializer,
                              CustomUserCreateSerializer, CustomUserSerializer,
-                             IngredientSerializer, RecipeSerializer,
-                             SubscriptionSerializer, TagSerializer)
-from api.utils import process_shopping_cart_items
+                             IngredientSerializer, IngredientSetSerializer,
+                             RecipeCoverageSerializer, RecipeIdsSerializer,
+                             RecipeSerializer, SubscriptionSerializer,
+                             TagSerializer)
+from api.utils import (SHOPPING_LIST_FORMATS, attach_recipes,
+                       get_recipes_limit, get_shopping_list)
 from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from recipes.search import rank_by_ingredients
 from users.models import Subscription, User
 
 
-class IngredientViewSet(ReadOnlyModelViewSet):
+class IngredientViewSet(CatalogCacheMixin, ReadOnlyModelViewSet):
+    catalog_name = 'ingredients'
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
@@ -45,19 +56,20 @@ class IngredientViewSet(ReadOnlyModelViewSet):
     filterset_class = IngredientFilter
 
 
-class TagViewSet(ReadOnlyModelViewSet):
+class TagViewSet(CatalogCacheMixin, ReadOnlyModelViewSet):
+    catalog_name = 'tags'
     queryset = Tag.objects.all()
     pagination_class = None
     serializer_class = TagSerializer
     permission_classes = (IsAuthorOrAdminOrReadOnly,)
 
 
-class RecipeViewSet(ModelViewSet):
+class RecipeViewSet(AnonymousCacheMixin, ModelViewSet):
     queryset = Recipe.objects.all()
     permission_classes = (IsAuthorOrAdminOrReadOnly,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
-    pagination_class = CustomPagination
+    pagination_class = RecipePagination
 
     def get_serializer_class(self):
         if self.action in ('create', 'partial_update'):
@@ -67,85 +79,161 @@ class RecipeViewSet(ModelViewSet):
     def perform_create(self, serializer):
         serializer.save()
 
-    @action(detail=True, methods=['post', 'delete'],
-            permission_classes=[IsRecipeOwnerOrAuthenticated])
-    def favorite(self, request, pk=None):
-        recipe = self.get_object()
-
+    def change_user_list(self, request, pk, model, messages):
+        """Добавить рецепт в избранное или список покупок либо удалить
+        его оттуда одним запросом. Существование рецепта проверяется
+        только при неудаче, чтобы отличить 404 от повторного действия.
+        """
+        try:
+            recipe_id = int(pk)
+        except ValueError:
+            raise Http404
         if request.method == 'POST':
-            if not Favorite.objects.filter(
-                    user=request.user, recipe=recipe).exists():
-                Favorite.objects.create(user=request.user, recipe=recipe)
-                return Response({'message': RECIPE_ADDED_TO_FAVORITES},
-                                status=status.HTTP_200_OK)
-            return Response({'message': RECIPE_ALREADY_IN_FAVORITES},
-                            status=status.HTTP_400_BAD_REQUEST)
-
-        if request.method == 'DELETE':
-            if Favorite.objects.filter(
-                    user=request.user, recipe=recipe).exists():
-                Favorite.objects.filter(
-                    user=request.user, recipe=recipe).delete()
-                return Response({'message': RECIPE_REMOVED_FROM_FAVORITES},
-                                status=status.HTTP_200_OK)
-            return Response({'message': RECIPE_NOT_IN_FAVORITES},
-                            status=status.HTTP_400_BAD_REQUEST)
+            changed = model.objects.add(request.user, recipe_id)
+        else:
+            changed = model.objects.remove(request.user, recipe_id)
+
+        success, failure = messages[request.method]
+        if changed:
+            return Response({'message': success}, status=status.HTTP_200_OK)
+        if not Recipe.objects.filter(pk=recipe_id).exists():
+            raise Http404
+        return Response({'message': failure},
+                        status=status.HTTP_400_BAD_REQUEST)
 
-        return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
+    @action(detail=True, methods=['post', 'delete'],
+            permission_classes=[IsAuthenticated])
+    def favorite(self, request, pk=None):
+        return self.change_user_list(request, pk, Favorite, {
+            'POST': (RECIPE_ADDED_TO_FAVORITES, RECIPE_ALREADY_IN_FAVORITES),
+            'DELETE': (RECIPE_REMOVED_FROM_FAVORITES,
+                       RECIPE_NOT_IN_FAVORITES),
+        })
 
     @action(detail=True, methods=['post', 'delete'],
             permission_classes=[IsAuthenticated])
     def shopping_cart(self, request, pk=None):
-        recipe = self.get_object()
+        return self.change_user_list(request, pk, ShoppingCart, {
+            'POST': (RECIPE_ADDED_TO_SHOPPING_LIST,
+                     RECIPE_ALREADY_IN_SHOPPING_LIST),
+            'DELETE': (RECIPE_REMOVED_FROM_SHOPPING_LIST,
+                       RECIPE_NOT_IN_SHOPPING_LIST),
+        })
+
+    def change_user_list_many(self, request, model):
+        """Пакетно добавить рецепты в список пользователя или удалить их
+        оттуда; результат возвращается для каждого id отдельно."""
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = list(dict.fromkeys(serializer.validated_data['recipes']))
 
         if request.method == 'POST':
-            if not ShoppingCart.objects.filter(
-                    user=request.user, recipe=recipe).exists():
-                ShoppingCart.objects.create(user=request.user, recipe=recipe)
-                return Response(
-                    {'message': RECIPE_ADDED_TO_SHOPPING_LIST},
-                    status=status.HTTP_200_OK
-                )
-            return Response(
-                {'message': RECIPE_ALREADY_IN_SHOPPING_LIST},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+            added, existing = model.objects.add_many(request.user, recipe_ids)
+            statuses = {
+                **{pk: RECIPE_STATUS_ADDED for pk in added},
+                **{pk: RECIPE_STATUS_ALREADY_ADDED for pk in existing},
+            }
+        else:
+            removed = model.objects.remove_many(request.user, recipe_ids)
+            statuses = {pk: RECIPE_STATUS_REMOVED for pk in removed}
+            missing = set(recipe_ids) - removed
+            if missing:
+                found = set(Recipe.objects.filter(
+                    pk__in=missing).values_list('pk', flat=True))
+                statuses.update(
+                    {pk: RECIPE_STATUS_NOT_ADDED for pk in found})
+
+        return Response({'results': [
+            {'id': pk, 'status': statuses.get(pk, RECIPE_STATUS_NOT_FOUND)}
+            for pk in recipe_ids
+        ]}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post', 'delete'],
+            url_path='favorite', url_name='favorite-many',
+            permission_classes=[IsAuthenticated])
+    def favorite_many(self, request):
+        return self.change_user_list_many(request, Favorite)
 
-        if request.method == 'DELETE':
-            if ShoppingCart.objects.filter(
-                    user=request.user, recipe=recipe).exists():
-                ShoppingCart.objects.filter(
-                    user=request.user, recipe=recipe).delete()
-                return Response(
-                    {'message': RECIPE_REMOVED_FROM_SHOPPING_LIST},
-                    status=status.HTTP_200_OK
-                )
-            return Response(
-                {'message': RECIPE_NOT_IN_SHOPPING_LIST},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+    @action(detail=False, methods=['post', 'delete'],
+            url_path='shopping_cart', url_name='shopping-cart-many',
+            permission_classes=[IsAuthenticated])
+    def shopping_cart_many(self, request):
+        return self.change_user_list_many(request, ShoppingCart)
+
+    @action(detail=False, methods=['get'],
+            permission_classes=[IsAuthenticated],
+            pagination_class=FeedCursorPagination)
+    def feed(self, request):
+        """Рецепты авторов, на которых подписан пользователь, с
+        постраничной выдачей по курсору."""
+        page = self.paginate_queryset(
+            self.filter_queryset(self.get_queryset()))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
-        return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
+    @action(detail=False, methods=['get'],
+            pagination_class=RankedListPagination)
+    def by_ingredients(self, request):
+        """Что приготовить из имеющихся продуктов: рецепты с переданными
+        ингредиентами, упорядоченные по числу недостающих."""
+        serializer = IngredientSetSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        ranked = rank_by_ingredients(
+            set(serializer.validated_data['ingredients']),
+            serializer.validated_data.get('max_missing'))
+        page = self.paginate_queryset(ranked)
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _, _ in page])
+        results = []
+        for recipe_id, matched, missing in page:
+            recipe = recipes.get(recipe_id)
+            if recipe is not None:
+                recipe.matched_count = matched
+                recipe.missing_count = missing
+                results.append(recipe)
+        serializer = RecipeCoverageSerializer(
+            results, many=True, context=self.get_serializer_context())
+        return self.get_paginated_response(serializer.data)
 
     @action(detail=False, methods=['get'],
             permission_classes=[IsAuthenticated])
     def download_shopping_cart(self, request):
-        shopping_cart_items = ShoppingCart.objects.filter(user=request.user)
-
-        buy_list = process_shopping_cart_items(shopping_cart_items)
-
-        content = 'Shopping Cart:\n\n'
-        for ingredient, amount in buy_list.items():
-            content += f'- {ingredient}: {amount}\n'
+        file_format = request.query_params.get('file_format', 'txt')
+        if file_format not in SHOPPING_LIST_FORMATS:
+            raise ValidationError(
+                {'file_format': [INVALID_FILE_FORMAT_ERROR]})
+        renderer, content_type = SHOPPING_LIST_FORMATS[file_format]
 
-        response = HttpResponse(content, content_type='text/plain')
-        response[
-            'Content-Disposition'] = 'attachment; filename="shopping_cart.txt"'
+        items = get_shopping_list(request.user).iterator()
+        response = StreamingHttpResponse(
+            renderer(items), content_type=content_type)
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_cart.{file_format}"')
 
         return response
 
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = Recipe.objects.select_related('author').prefetch_related(
+            'recipetag_set', 'recipeingredient_set').defer('search_text')
+
+        user = self.request.user
+        if user.is_authenticated:
+            queryset = queryset.annotate(
+                is_favorited=Exists(Favorite.objects.filter(
+                    user=user, recipe=OuterRef('pk'))),
+                is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                    user=user, recipe=OuterRef('pk'))),
+                author_is_subscribed=Exists(Subscription.objects.filter(
+                    user=user, author=OuterRef('author'))),
+            )
+        else:
+            queryset = queryset.annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(
+                    False, output_field=BooleanField()),
+                author_is_subscribed=Value(
+                    False, output_field=BooleanField()),
+            )
 
         author_id = self.request.query_params.get('author')
         if author_id:
@@ -172,11 +260,17 @@ class CustomUserViewSet(GenericViewSet):
         permission_classes=(IsAuthenticated, )
     )
     def subscriptions(self, request):
-        user_subscriptions = Subscription.objects.filter(user=request.user)
-        author_ids = user_subscriptions.values_list('author_id', flat=True)
-        queryset = User.objects.filter(pk__in=author_ids)
-        paginated_queryset = self.paginate_queryset(queryset)
-        serializer = self.get_serializer(paginated_queryset, many=True)
+        queryset = User.objects.filter(
+            subscribed_by__user=request.user
+        ).annotate(
+            subscribed_at=F('subscribed_by__created_at'),
+        ).order_by('-subscribed_at', '-pk')
+        authors = attach_recipes(
+            self.paginate_queryset(queryset), get_recipes_limit(request))
+        context = self.get_serializer_context()
+        context['is_subscribed'] = True
+        serializer = self.get_serializer(
+            authors, many=True, context=context)
         return self.get_paginated_response(serializer.data)
 
     def retrieve(self, request, *args, **kwargs):
@@ -219,7 +313,7 @@ class CustomUserViewSet(GenericViewSet):
 
             Subscription.objects.create(user=request.user, author=author)
             serializer = SubscriptionSerializer(
-                author, context={'request': request})
+                author, context={'request': request, 'is_subscribed': True})
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         elif request.method == 'DELETE':
@@ -249,7 +343,7 @@ class CustomUserViewSet(GenericViewSet):
                 {'current_password': [INCORRECT_CURRENT_PASSWORD_ERROR]})
 
         request.user.set_password(new_password)
-        request.user.save()
+        request.user.save(update_fields=('password',))
 
         return Response({'detail': PASSWORD_CHANGE_SUCCESS},
                         status=status.HTTP_200_OK)
@@ -0,0 +1,59 @@
+from django.contrib import admin
+from django.db.models import Q
+
+
+class InputFilter(admin.SimpleListFilter):
+    """Фильтр с полем ввода вместо списка всех возможных значений.
+
+    Подходит для внешних ключей на большие таблицы: боковая панель
+    не загружает и не выводит все строки связанной таблицы.
+    """
+
+    template = 'admin/input_filter.html'
+    field_name = None
+    lookup_fields = ()
+
+    def lookups(self, request, model_admin):
+        return ((None, None),)
+
+    def choices(self, changelist):
+        all_choice = next(super().choices(changelist))
+        all_choice['query_parts'] = (
+            (key, value)
+            for key, value in changelist.get_filters_params().items()
+            if key != self.parameter_name
+        )
+        yield all_choice
+
+    def queryset(self, request, queryset):
+        value = (self.value() or '').strip()
+        if not value:
+            return queryset
+        if value.isdigit():
+            return queryset.filter(**{f'{self.field_name}_id': value})
+        condition = Q()
+        for lookup in self.lookup_fields:
+            condition |= Q(**{f'{self.field_name}__{lookup}': value})
+        return queryset.filter(condition)
+
+
+def input_filter(field_name, title, lookup_fields):
+    """Создать InputFilter для внешнего ключа field_name."""
+    return type(f'{field_name.title()}InputFilter', (InputFilter,), {
+        'title': title,
+        'parameter_name': field_name,
+        'field_name': field_name,
+        'lookup_fields': lookup_fields,
+    })
+
+
+USER_LOOKUPS = ('email__iexact', 'username__iexact')
+
+UserInputFilter = input_filter(
+    'user', 'пользователю (id, email или логин)', USER_LOOKUPS)
+AuthorInputFilter = input_filter(
+    'author', 'автору (id, email или логин)', USER_LOOKUPS)
+RecipeInputFilter = input_filter(
+    'recipe', 'рецепту (id или название)', ('name__iexact',))
+IngredientInputFilter = input_filter(
+    'ingredient', 'ингредиенту (id или название)', ('name__iexact',))
@@ -15,6 +15,7 @@ ALLOWED_HOSTS = os.getenv(
     'ALLOWED_HOSTS', default='127.0.0.1').split(',')
 
 INSTALLED_APPS = [
+    'core.apps.CoreConfig',
     'users.apps.UsersConfig',
     'api.apps.ApiConfig',
     'recipes.apps.RecipesConfig',
@@ -64,7 +65,7 @@ WSGI_APPLICATION = 'foodgram.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': os.getenv('DB_ENGINE', 'django.db.backends.postgresql'),
         'NAME': os.getenv('POSTGRES_DB', 'django'),
         'USER': os.getenv('POSTGRES_USER', 'django'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
@@ -73,6 +74,19 @@ DATABASES = {
     }
 }
 
+# Версии справочников, кэши ответов и токенов должны быть общими для
+# всех воркеров и management-команд, поэтому по умолчанию используется
+# memcached. С локальным кэшем процесса (LocMemCache) изменения,
+# сделанные другим процессом, видны только после CATALOG_CACHE_TIMEOUT.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.memcached.PyMemcacheCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'memcached:11211'),
+    }
+}
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -118,12 +132,33 @@ REST_FRAMEWORK = {
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 6
 }
 
+CATALOG_CACHE_TIMEOUT = int(os.getenv('CATALOG_CACHE_TIMEOUT', 3600))
+
+PAGINATION_COUNT_CACHE_TIMEOUT = int(
+    os.getenv('PAGINATION_COUNT_CACHE_TIMEOUT', 30))
+PAGINATION_ESTIMATE_THRESHOLD = int(
+    os.getenv('PAGINATION_ESTIMATE_THRESHOLD', 100000))
+
+ANONYMOUS_RESPONSE_CACHE_TIMEOUT = int(
+    os.getenv('ANONYMOUS_RESPONSE_CACHE_TIMEOUT', 600))
+
+BACKGROUND_TASKS_WORKERS = int(os.getenv('BACKGROUND_TASKS_WORKERS', 2))
+BACKGROUND_TASKS_SYNC = (
+    os.getenv('BACKGROUND_TASKS_SYNC', 'False').lower() == 'true')
+
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', 10000))
+FEED_BATCH_SIZE = int(os.getenv('FEED_BATCH_SIZE', 1000))
+
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.getenv('AUTH_TOKEN_CACHE_TIMEOUT', 300))
+AUTH_TOKEN_LOCAL_TIMEOUT = int(os.getenv('AUTH_TOKEN_LOCAL_TIMEOUT', 5))
+AUTH_TOKEN_LOCAL_SIZE = int(os.getenv('AUTH_TOKEN_LOCAL_SIZE', 1024))
+
 
 DJOSER = {
     'USER_AUTHENTICATION_RULE': 'djoser.auth.TokenAuthentication',
@@ -1,13 +1,53 @@
-from django.contrib import admin
+from collections import Counter, defaultdict
+from contextlib import contextmanager
 
-from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingCart, Tag)
+from django.contrib import admin
+from django.db import transaction
+from django.db.models import Prefetch
+
+from core.admin_filters import (AuthorInputFilter, IngredientInputFilter,
+                                RecipeInputFilter, UserInputFilter)
+from recipes.models import (Favorite, Ingredient, IngredientIndex, Recipe,
+                            RecipeIngredient, ShoppingCart, ShoppingListItem,
+                            Tag)
+from users.models import User
+
+
+def get_recipe_amounts(recipe_ids):
+    """Количества ингредиентов рецептов: {recipe_id: Counter}."""
+    amounts = defaultdict(Counter)
+    for recipe_id, ingredient_id, amount in RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids).values_list(
+            'recipe_id', 'ingredient_id', 'amount'):
+        amounts[recipe_id][ingredient_id] += amount
+    return amounts
+
+
+@contextmanager
+def sync_recipe_ingredients(*recipe_ids):
+    """Учесть правку ингредиентов рецептов в списках покупок и в
+    индексе по ингредиентам.
+
+    Админка меняет строки через ORM в обход сериализатора API, поэтому
+    разница между составом до и после правки применяется здесь теми же
+    методами ShoppingListItem и IngredientIndex, что и в API.
+    """
+    recipe_ids = {pk for pk in recipe_ids if pk is not None}
+    old_amounts = get_recipe_amounts(recipe_ids)
+    yield
+    new_amounts = get_recipe_amounts(recipe_ids)
+    for recipe_id in recipe_ids:
+        ShoppingListItem.objects.update_recipe(
+            recipe_id, old_amounts[recipe_id], new_amounts[recipe_id])
+        IngredientIndex.objects.update_recipe(
+            recipe_id, old_amounts[recipe_id], new_amounts[recipe_id])
 
 
 class RecipeInline(admin.TabularInline):
     model = Recipe.ingredients.through
     extra = 1
     min_num = 1
+    autocomplete_fields = ('ingredient',)
 
 
 class RecipeTagsInLine(admin.TabularInline):
@@ -19,7 +59,9 @@ class RecipeTagsInLine(admin.TabularInline):
 @admin.register(Ingredient)
 class IngredientAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'measurement_unit')
-    list_filter = ('name',)
+    list_filter = ('measurement_unit',)
+    search_fields = ('^name',)
+    show_full_result_count = False
 
 
 @admin.register(Tag)
@@ -33,13 +75,26 @@ class RecipeAdmin(admin.ModelAdmin):
     inlines = (RecipeInline, RecipeTagsInLine, )
     list_display = ('id', 'name', 'author', 'display_ingredients',
                     'cooking_time', 'display_favorite_count')
-    list_filter = ('name', 'author', 'tags__name')
+    list_filter = (AuthorInputFilter, 'tags__name')
+    list_select_related = ('author',)
     search_fields = ('name', 'author__username', 'author__email')
     readonly_fields = ('display_favorite_count',)
+    autocomplete_fields = ('author',)
+    show_full_result_count = False
 
-    @admin.display(description='Число добавлений в избранное')
+    def save_related(self, request, form, formsets, change):
+        with sync_recipe_ingredients(form.instance.pk):
+            super().save_related(request, form, formsets, change)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related(
+            Prefetch('ingredients',
+                     queryset=Ingredient.objects.only('id', 'name')))
+
+    @admin.display(description='Число добавлений в избранное',
+                   ordering='favorites_count')
     def display_favorite_count(self, obj):
-        return obj.favorites.count()
+        return obj.favorites_count
 
     @admin.display(description='Ингредиенты')
     def display_ingredients(self, obj):
@@ -51,16 +106,83 @@ class RecipeAdmin(admin.ModelAdmin):
 @admin.register(RecipeIngredient)
 class RecipeIngredientAdmin(admin.ModelAdmin):
     list_display = ('id', 'recipe', 'ingredient', 'amount')
-    list_filter = ('recipe', 'ingredient')
+    list_filter = (RecipeInputFilter, IngredientInputFilter)
+    list_select_related = ('recipe', 'ingredient')
+    autocomplete_fields = ('recipe', 'ingredient')
+    show_full_result_count = False
+
+    def save_model(self, request, obj, form, change):
+        old_recipe_id = RecipeIngredient.objects.filter(
+            pk=obj.pk).values_list('recipe_id', flat=True).first()
+        with sync_recipe_ingredients(old_recipe_id, obj.recipe_id):
+            super().save_model(request, obj, form, change)
+
+    def delete_model(self, request, obj):
+        with sync_recipe_ingredients(obj.recipe_id):
+            super().delete_model(request, obj)
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        with sync_recipe_ingredients(*queryset.values_list(
+                'recipe_id', flat=True).distinct()):
+            super().delete_queryset(request, queryset)
 
 
 @admin.register(Favorite)
 class FavoriteAdmin(admin.ModelAdmin):
+    """Рецепты в избранном.
+
+    Счетчик favorites_count рецепта поддерживается сигналами при
+    добавлении и удалении записи. Пользователь и рецепт существующей
+    записи не меняются: ее можно только удалить и добавить заново.
+    """
     list_display = ('id', 'user', 'recipe')
-    list_filter = ('user', 'recipe')
+    list_filter = (UserInputFilter, RecipeInputFilter)
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
+    show_full_result_count = False
+
+    def get_readonly_fields(self, request, obj=None):
+        if obj is not None:
+            return ('user', 'recipe')
+        return super().get_readonly_fields(request, obj)
 
 
 @admin.register(ShoppingCart)
 class ShoppingListAdmin(admin.ModelAdmin):
+    """Рецепты в списках покупок.
+
+    Суммы ингредиентов в списке пользователя пересчитываются теми же
+    методами менеджера, что и в API. Пользователь и рецепт существующей
+    записи не меняются: ее можно только удалить и добавить заново.
+    """
     list_display = ('id', 'user', 'recipe')
-    list_filter = ('user', 'recipe')
+    list_filter = (UserInputFilter, RecipeInputFilter)
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
+    show_full_result_count = False
+
+    def get_readonly_fields(self, request, obj=None):
+        if obj is not None:
+            return ('user', 'recipe')
+        return super().get_readonly_fields(request, obj)
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if not change:
+            ShoppingCart.objects.recipes_added(obj.user, [obj.recipe_id])
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        ShoppingCart.objects.recipes_removed(obj.user, [obj.recipe_id])
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        recipes_by_user = defaultdict(list)
+        for user_id, recipe_id in queryset.values_list(
+                'user_id', 'recipe_id'):
+            recipes_by_user[user_id].append(recipe_id)
+        super().delete_queryset(request, queryset)
+        for user in User.objects.filter(pk__in=recipes_by_user):
+            ShoppingCart.objects.recipes_removed(
+                user, recipes_by_user[user.pk])
@@ -0,0 +1,44 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+CATALOG_VERSION_KEY = 'catalog_version:{}'
+
+
+def get_catalog_version(name):
+    """Текущая версия набора данных, общая для всех процессов.
+
+    Версия живет не дольше CATALOG_CACHE_TIMEOUT: после истечения срока
+    создается новая, поэтому даже процесс с локальным кэшем не отдает
+    устаревшие данные бесконечно.
+    """
+    key = CATALOG_VERSION_KEY.format(name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), settings.CATALOG_CACHE_TIMEOUT)
+        version = cache.get(key)
+    return version
+
+
+def bump_catalog_version(name):
+    """Сменить версию набора данных после его изменения."""
+    key = CATALOG_VERSION_KEY.format(name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), settings.CATALOG_CACHE_TIMEOUT)
+
+
+def invalidate_recipes(*recipe_ids):
+    """Сбросить закэшированные ответы API со списками рецептов и
+    страницы перечисленных рецептов. Версии меняются после фиксации
+    транзакции, иначе параллельный запрос успел бы закэшировать
+    старые данные под новой версией."""
+    def bump():
+        bump_catalog_version('recipe_list')
+        for recipe_id in recipe_ids:
+            bump_catalog_version(f'recipe:{recipe_id}')
+
+    transaction.on_commit(bump)
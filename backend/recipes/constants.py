@@ -2,3 +2,37 @@ MAX_FIELD_LENGTH = 200
 MAX_AMOUNT = 1000
 MIN_VALUE = 1
 MAX_COOKING_TIME = 360
+REGISTRY_VERSION_CHECK_INTERVAL = 1
+IMAGE_VARIANT_WIDTHS = (320, 640, 1280)
+IMAGE_VARIANT_FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 75, 'method': 6},
+    'jpeg': {'format': 'JPEG', 'quality': 80, 'optimize': True,
+             'progressive': True},
+}
+AUTHOR_FIELDS = ('email', 'username', 'first_name', 'last_name')
+RECIPE_SEARCH_CONFIG = 'russian'
+RECIPE_SEARCH_MAX_WORDS = 10
+RECIPE_SEARCH_ENDINGS = (
+    'иями', 'ями', 'ами', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими',
+    'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ый', 'ий', 'ой', 'ей', 'ом', 'ем',
+    'ам', 'ям', 'ах', 'ях', 'ов', 'ев', 'ую', 'юю',
+    'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+)
+# Подстроки названий ингредиентов ищутся в памяти по n-граммам длиной
+# до INGREDIENT_NGRAM_SIZE символов.
+INGREDIENT_NGRAM_SIZE = 3
+# Типы элементов упакованных массивов обратного индекса ингредиентов:
+# id рецептов (int64) и число ингредиентов в рецепте (uint16).
+RECIPE_ID_TYPECODE = 'q'
+INGREDIENT_COUNT_TYPECODE = 'H'
+# Обратный индекс хранится сегментами по INGREDIENT_INDEX_SHARD_SIZE
+# рецептов подряд. Журнал изменений сливается с сегментами, когда при
+# чтении в нем больше INGREDIENT_INDEX_MAX_CHANGES строк.
+INGREDIENT_INDEX_SHARD_SIZE = 4096
+INGREDIENT_INDEX_MAX_CHANGES = 1000
+# Подбор по ингредиентам возвращает не больше стольких рецептов. Для
+# каждого ингредиента читаются только сегменты с новыми рецептами, пока
+# не наберется INGREDIENT_RANKING_MAX_POSTINGS вхождений; результат
+# кэшируется до изменения индекса.
+RECIPE_RANKING_LIMIT = 500
+INGREDIENT_RANKING_MAX_POSTINGS = 20000
@@ -0,0 +1,48 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Recipe
+from users.models import Subscription, User
+
+
+def increment(model, pk, field, delta=1):
+    """Атомарно изменить счетчик на delta, не опуская его ниже нуля."""
+    queryset = model.objects.filter(pk=pk)
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+def count_subquery(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+COUNTERS = (
+    (Recipe, {'favorites_count': (Favorite, 'recipe')}),
+    (User, {'recipes_count': (Recipe, 'author'),
+            'subscribers_count': (Subscription, 'author')}),
+)
+
+
+def recount(chunk_size=1000, stdout=None):
+    """Пересчитать все счетчики по диапазонам первичных ключей."""
+    for model, fields in COUNTERS:
+        updates = {
+            field: count_subquery(source, source_field)
+            for field, (source, source_field) in fields.items()
+        }
+        pks = model.objects.order_by('pk').values_list('pk', flat=True)
+        last_pk = 0
+        while True:
+            chunk = list(pks.filter(pk__gt=last_pk)[:chunk_size])
+            if not chunk:
+                break
+            model.objects.filter(
+                pk__gte=chunk[0], pk__lte=chunk[-1]).update(**updates)
+            last_pk = chunk[-1]
+            if stdout is not None:
+                stdout.write(f'{model._meta.verbose_name_plural}: '
+                             f'обработано до id {last_pk}')
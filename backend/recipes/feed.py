@@ -0,0 +1,159 @@
+from heapq import merge
+from itertools import groupby, islice
+
+from django.conf import settings
+from django.db.models import Q
+
+from recipes.models import FeedItem, Recipe
+from users.models import Subscription, User
+
+
+def is_fanned_out(subscribers_count):
+    """Рецепты авторов с большим числом подписчиков не раскладываются
+    по лентам, а подмешиваются при чтении (fan-out on read)."""
+    return subscribers_count <= settings.FEED_FANOUT_LIMIT
+
+
+def insert_items(items):
+    FeedItem.objects.bulk_create(
+        items, batch_size=settings.FEED_BATCH_SIZE, ignore_conflicts=True)
+
+
+def iter_subscribers(author_id):
+    """id подписчиков автора пакетами по FEED_BATCH_SIZE."""
+    subscribers = Subscription.objects.filter(
+        author_id=author_id).order_by('pk')
+    last_pk = 0
+    while True:
+        batch = list(subscribers.filter(pk__gt=last_pk).values_list(
+            'pk', 'user_id')[:settings.FEED_BATCH_SIZE])
+        if not batch:
+            break
+        yield [user_id for _, user_id in batch]
+        last_pk = batch[-1][0]
+
+
+def fan_out_recipe(recipe_id):
+    """Добавить новый рецепт в ленты подписчиков автора пакетами."""
+    recipe = Recipe.objects.filter(pk=recipe_id).values(
+        'author_id', 'date_created', 'author__subscribers_count').first()
+    if recipe is None or not is_fanned_out(
+            recipe['author__subscribers_count']):
+        return
+    for user_ids in iter_subscribers(recipe['author_id']):
+        insert_items(
+            FeedItem(user_id=user_id, recipe_id=recipe_id,
+                     author_id=recipe['author_id'],
+                     date_created=recipe['date_created'])
+            for user_id in user_ids)
+
+
+def fan_out_author(author_id):
+    """Разложить по лентам подписчиков все рецепты автора, у которого
+    стало не больше FEED_FANOUT_LIMIT подписчиков: пока он был
+    популярным, его рецепты подмешивались при чтении и в ленты не
+    попадали."""
+    author = User.objects.filter(pk=author_id).values(
+        'subscribers_count').first()
+    if author is None or not is_fanned_out(author['subscribers_count']):
+        return
+    recipes = list(Recipe.objects.filter(author_id=author_id).values_list(
+        'pk', 'date_created'))
+    if not recipes:
+        return
+    for user_ids in iter_subscribers(author_id):
+        insert_items(
+            FeedItem(user_id=user_id, recipe_id=recipe_id,
+                     author_id=author_id, date_created=date_created)
+            for user_id in user_ids
+            for recipe_id, date_created in recipes)
+
+
+def backfill_feed(user_id, author_id):
+    """Добавить в ленту пользователя рецепты автора после подписки."""
+    author = User.objects.filter(pk=author_id).values(
+        'subscribers_count').first()
+    if (author is None or not is_fanned_out(author['subscribers_count'])
+            or not Subscription.objects.filter(
+                user_id=user_id, author_id=author_id).exists()):
+        return
+    insert_items(
+        FeedItem(user_id=user_id, recipe_id=recipe_id, author_id=author_id,
+                 date_created=date_created)
+        for recipe_id, date_created in Recipe.objects.filter(
+            author_id=author_id).values_list(
+            'pk', 'date_created').iterator())
+
+
+def prune_feed(user_id, author_id):
+    FeedItem.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def after_position(position, date_field, id_field, reverse=False):
+    """Условие на ключи (дата, id) за позицией в порядке выдачи."""
+    date_created, pk = position
+    lookup = 'gt' if reverse else 'lt'
+    return Q(**{f'{date_field}__{lookup}': date_created}) | Q(**{
+        date_field: date_created, f'{id_field}__{lookup}': pk})
+
+
+def get_feed_keys(user, recipes, limit, position=None, reverse=False):
+    """Ключи (date_created, recipe_id) не более limit рецептов ленты
+    после position, от новых к старым (при reverse - в обратную
+    сторону).
+
+    Записи ленты читаются по индексу (user, -date_created, -recipe), а
+    рецепты популярных авторов - отдельным запросом по индексу рецептов;
+    обе выборки ограничены limit и сливаются в памяти. Условия фильтров
+    из recipes накладываются на записи ленты, только если они есть.
+    """
+    items = FeedItem.objects.filter(user=user)
+    if recipes.query.where:
+        items = items.filter(recipe__in=recipes.values('pk'))
+    popular = recipes.filter(author__in=Subscription.objects.filter(
+        user=user,
+        author__subscribers_count__gt=settings.FEED_FANOUT_LIMIT,
+    ).values('author_id'))
+    if position is not None:
+        items = items.filter(
+            after_position(position, 'date_created', 'recipe_id', reverse))
+        popular = popular.filter(
+            after_position(position, 'date_created', 'id', reverse))
+    prefix = '' if reverse else '-'
+    items = items.order_by(
+        f'{prefix}date_created', f'{prefix}recipe_id').values_list(
+        'date_created', 'recipe_id')[:limit]
+    popular = popular.order_by(
+        f'{prefix}date_created', f'{prefix}id').values_list(
+        'date_created', 'id')[:limit]
+    # Рецепт автора, ставшего популярным, может быть в обеих выборках.
+    keys = (key for key, _ in groupby(
+        merge(items, popular, reverse=not reverse)))
+    return list(islice(keys, limit))
+
+
+def rebuild_feeds(batch_size=1000, stdout=None):
+    """Пересобрать ленты всех пользователей по подпискам."""
+    FeedItem.objects.all().delete()
+    subscriptions = Subscription.objects.filter(
+        author__subscribers_count__lte=settings.FEED_FANOUT_LIMIT
+    ).order_by('pk')
+    last_pk = 0
+    while True:
+        batch = list(subscriptions.filter(pk__gt=last_pk).values_list(
+            'pk', 'user_id', 'author_id')[:batch_size])
+        if not batch:
+            break
+        followers = {}
+        for _, user_id, author_id in batch:
+            followers.setdefault(author_id, []).append(user_id)
+        insert_items(
+            FeedItem(user_id=user_id, recipe_id=recipe_id,
+                     author_id=author_id, date_created=date_created)
+            for recipe_id, author_id, date_created in Recipe.objects.filter(
+                author_id__in=followers).values_list(
+                'pk', 'author_id', 'date_created').iterator()
+            for user_id in followers[author_id])
+        last_pk = batch[-1][0]
+        if stdout is not None:
+            stdout.write(f'Подписки: обработано до id {last_pk}')
@@ -0,0 +1,73 @@
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, features
+
+from recipes.catalog import invalidate_recipes
+from recipes.constants import IMAGE_VARIANT_FORMATS, IMAGE_VARIANT_WIDTHS
+from recipes.models import Recipe
+
+VARIANTS_DIR = 'recipes/images/variants'
+
+
+def get_formats():
+    """Форматы копий, которые поддерживает установленный Pillow."""
+    return {
+        name: options for name, options in IMAGE_VARIANT_FORMATS.items()
+        if name != 'webp' or features.check('webp')
+    }
+
+
+def is_actual(recipe):
+    """Копии построены по текущему изображению рецепта."""
+    return bool(recipe.image) and (
+        recipe.image_variants.get('source') == recipe.image.name)
+
+
+def render_variants(image_name):
+    """Сохранить уменьшенные копии изображения и вернуть их имена
+    в хранилище в виде {'source': ..., формат: {ширина: имя}}."""
+    storage = Recipe._meta.get_field('image').storage
+    with storage.open(image_name) as file:
+        image = ImageOps.exif_transpose(Image.open(file))
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+
+    variants = {'source': image_name}
+    for width in IMAGE_VARIANT_WIDTHS:
+        if width > image.width and width != IMAGE_VARIANT_WIDTHS[0]:
+            break
+        resized = image.copy()
+        resized.thumbnail((width, image.height), Image.Resampling.LANCZOS)
+        for extension, options in get_formats().items():
+            frame = resized
+            if options['format'] == 'JPEG' and frame.mode != 'RGB':
+                frame = frame.convert('RGB')
+            buffer = BytesIO()
+            frame.save(buffer, **options)
+            name = storage.save(
+                f'{VARIANTS_DIR}/{width}.{extension}',
+                ContentFile(buffer.getvalue()))
+            variants.setdefault(extension, {})[str(width)] = name
+    return variants
+
+
+def generate_image_variants(recipe_id, force=False):
+    """Построить копии изображения рецепта, если они устарели."""
+    recipe = Recipe.objects.filter(pk=recipe_id).only(
+        'image', 'image_variants').first()
+    if (recipe is None or not recipe.image
+            or is_actual(recipe) and not force):
+        return
+    variants = render_variants(recipe.image.name)
+    # Изображение могло смениться, пока строились копии: тогда
+    # результат не сохраняется, копии построит следующая задача.
+    # Файлы копий общие для одинаковых изображений, поэтому они не
+    # удаляются здесь, а убираются командой dedupe_media --prune.
+    # update() не вызывает сигналы, поэтому кэш ответов API
+    # сбрасывается явно.
+    if Recipe.objects.filter(
+        pk=recipe_id, image=recipe.image.name
+    ).update(image_variants=variants):
+        invalidate_recipes(recipe_id)
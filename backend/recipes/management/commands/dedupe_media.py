@@ -0,0 +1,141 @@
+import os
+import posixpath
+import re
+import shutil
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.catalog import invalidate_recipes
+from recipes.images import VARIANTS_DIR
+from recipes.models import Recipe
+from recipes.storage import get_content_hash, get_hashed_name
+
+IMAGES_DIR = posixpath.dirname(VARIANTS_DIR)
+HASHED_NAME_RE = re.compile(r'/([0-9a-f]{2})/(\1[0-9a-f]{62})(\.\w+)?$')
+
+
+class Command(BaseCommand):
+    help = ('Переименование изображений рецептов по хэшу содержимого '
+            'с объединением одинаковых файлов и удалением ненужных')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--prune', action='store_true',
+            help='Удалить файлы, на которые не ссылается ни один рецепт')
+        parser.add_argument(
+            '--min-age', type=int, default=3600,
+            help='Не удалять файлы моложе указанного числа секунд')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что будет сделано')
+
+    def rehash(self, name):
+        """Новое имя файла по его содержимому; файл копируется под новым
+        именем, а старый удаляется только после обновления ссылок."""
+        if name in self.renamed:
+            return self.renamed[name]
+        new_name = name
+        path = self.storage.path(name)
+        if HASHED_NAME_RE.search(name):
+            pass
+        elif not os.path.exists(path):
+            self.missing.add(name)
+        else:
+            with open(path, 'rb') as file:
+                new_name = get_hashed_name(name, get_content_hash(file))
+            new_path = self.storage.path(new_name)
+            if os.path.exists(new_path):
+                self.saved_bytes += os.path.getsize(path)
+            elif not self.dry_run:
+                os.makedirs(os.path.dirname(new_path), exist_ok=True)
+                with tempfile.NamedTemporaryFile(
+                        dir=os.path.dirname(new_path), prefix='.upload-',
+                        delete=False) as temp:
+                    with open(path, 'rb') as source:
+                        shutil.copyfileobj(source, temp)
+                os.replace(temp.name, new_path)
+            self.obsolete.add(path)
+        self.renamed[name] = new_name
+        return new_name
+
+    def rehash_variants(self, variants):
+        return {
+            key: (self.rehash(value) if key == 'source' else {
+                width: self.rehash(name) for width, name in value.items()
+            })
+            for key, value in variants.items()
+        }
+
+    def update_recipes(self, batch_size):
+        changed = []
+        recipes = Recipe.objects.exclude(image='').exclude(
+            image__isnull=True).only('id', 'image', 'image_variants')
+        for recipe in recipes.iterator():
+            image = self.rehash(recipe.image.name)
+            variants = self.rehash_variants(recipe.image_variants)
+            if (image, variants) != (recipe.image.name,
+                                     recipe.image_variants):
+                recipe.image, recipe.image_variants = image, variants
+                changed.append(recipe)
+        if not self.dry_run:
+            with transaction.atomic():
+                Recipe.objects.bulk_update(
+                    changed, ('image', 'image_variants'),
+                    batch_size=batch_size)
+                invalidate_recipes(*(recipe.pk for recipe in changed))
+        return len(changed)
+
+    def get_referenced(self):
+        referenced = set()
+        for image, variants in Recipe.objects.values_list(
+                'image', 'image_variants').iterator():
+            if image:
+                referenced.add(self.storage.path(image))
+            for key, value in variants.items():
+                if key != 'source':
+                    referenced.update(
+                        self.storage.path(name) for name in value.values())
+        return referenced
+
+    def prune(self, min_age):
+        referenced = self.get_referenced()
+        deadline = time.time() - min_age
+        pruned = 0
+        for directory, _, files in os.walk(self.storage.path(IMAGES_DIR)):
+            for file_name in files:
+                path = os.path.join(directory, file_name)
+                if path in referenced or os.path.getmtime(path) > deadline:
+                    continue
+                self.saved_bytes += os.path.getsize(path)
+                pruned += 1
+                if not self.dry_run:
+                    os.remove(path)
+        return pruned
+
+    def handle(self, *args, **options):
+        self.storage = Recipe._meta.get_field('image').storage
+        self.dry_run = options['dry_run']
+        self.renamed = {}
+        self.obsolete = set()
+        self.missing = set()
+        self.saved_bytes = 0
+
+        changed = self.update_recipes(options['batch_size'])
+        if not self.dry_run:
+            for path in self.obsolete:
+                os.remove(path)
+        pruned = self.prune(options['min_age']) if options['prune'] else 0
+
+        for name in sorted(self.missing):
+            self.stderr.write(f'Файл не найден: {name}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Рецептов обновлено: {changed}, '
+            f'файлов переименовано: {len(self.obsolete)}, '
+            f'удалено ненужных: {pruned}, '
+            f'освобождено: {self.saved_bytes // 1024} КБ'
+            + (' (пробный запуск)' if self.dry_run else '') + '.'))
@@ -0,0 +1,275 @@
+import heapq
+import math
+import random
+from collections import Counter
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate, islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from recipes.catalog import bump_catalog_version, invalidate_recipes
+from recipes.constants import MAX_AMOUNT, MAX_COOKING_TIME
+from recipes.counters import recount
+from recipes.feed import rebuild_feeds
+from recipes.models import (Favorite, Ingredient, IngredientIndex, Recipe,
+                            RecipeIngredient, RecipeTag, ShoppingCart,
+                            ShoppingListItem, Tag)
+from recipes.search import get_recipe_search_text
+from users.models import Subscription, User
+
+DEFAULT_TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+    ('Десерт', '#F5A623', 'dessert'),
+    ('Выпечка', '#B8860B', 'bakery'),
+    ('Вегетарианское', '#2E8B57', 'vegetarian'),
+)
+TAG_WEIGHTS = (30, 35, 30, 10, 8, 12)
+# Вес тегов, добавленных сверх стандартных.
+EXTRA_TAG_WEIGHT = 5
+DISHES = ('Суп', 'Салат', 'Рагу', 'Пирог', 'Запеканка', 'Каша', 'Омлет',
+          'Паста', 'Плов', 'Котлеты', 'Блины', 'Соус', 'Рулет', 'Торт')
+ADJECTIVES = ('домашний', 'быстрый', 'летний', 'пряный', 'нежный',
+              'бабушкин', 'праздничный', 'острый', 'легкий', 'сытный')
+RECIPE_TEXT = 'Синтетический рецепт для нагрузочного тестирования.'
+RECIPE_PERIOD_DAYS = 730
+# Доля объектов, которую может выбрать один пользователь: иначе самые
+# активные пользователи по Ципфу упираются в число объектов.
+MAX_USER_SHARE = 0.5
+
+
+@contextmanager
+def manual_dates(model, field_name):
+    """Разрешить явно задавать значение поля с auto_now_add."""
+    field = model._meta.get_field(field_name)
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+class ZipfSampler:
+    """Выбор элементов с вероятностью, убывающей по закону Ципфа."""
+
+    def __init__(self, items, exponent, rng):
+        self.items = list(items)
+        rng.shuffle(self.items)
+        self.weights = [
+            1 / rank ** exponent for rank in range(1, len(self.items) + 1)]
+        self.cum_weights = list(accumulate(self.weights))
+        self.rng = rng
+
+    def sample(self, k):
+        return self.rng.choices(self.items, cum_weights=self.cum_weights, k=k)
+
+    def distinct(self, k, exclude=None):
+        """k разных элементов: выборка по весам без возвращения."""
+        size = len(self.items) - (exclude in self.items)
+        k = min(k, size)
+        if 2 * k <= size:
+            # Повторный выбор уже взятого элемента равносилен выбору из
+            # оставшихся; пока взято не больше половины, повторов мало.
+            result = set()
+            while len(result) < k:
+                result.update(
+                    item for item in self.sample(k - len(result))
+                    if item != exclude)
+            return result
+        # Иначе - ключи log(u) / w, k наибольших за один проход
+        # (Efraimidis-Spirakis).
+        return {item for _, item in heapq.nlargest(k, (
+            (math.log(1 - self.rng.random()) / weight, item)
+            for item, weight in zip(self.items, self.weights)
+            if item != exclude))}
+
+    def split(self, count, limit):
+        """Разбить count между элементами по Ципфу, не больше limit на
+        элемент; излишек достается следующим по популярности."""
+        per_item = Counter()
+        for item in self.sample(count):
+            if per_item[item] < limit:
+                per_item[item] += 1
+        remaining = count - sum(per_item.values())
+        for item in self.items:
+            if not remaining:
+                break
+            extra = min(limit - per_item[item], remaining)
+            if extra > 0:
+                per_item[item] += extra
+                remaining -= extra
+        return per_item
+
+
+class Command(BaseCommand):
+    help = ('Генерация синтетических данных: пользователи, рецепты, '
+            'избранное, списки покупок и подписки. При одинаковом '
+            '--seed результат детерминирован.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--favorites', type=int, default=50000)
+        parser.add_argument('--carts', type=int, default=10000)
+        parser.add_argument('--subscriptions', type=int, default=20000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument(
+            '--zipf', type=float, default=1.1,
+            help='Показатель распределения Ципфа для популярности')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def next_pk(self, model):
+        return (model.objects.aggregate(Max('pk'))['pk__max'] or 0) + 1
+
+    def insert(self, model, objects):
+        """Вставить объекты пакетами, не держа их все в памяти."""
+        objects = iter(objects)
+        total = 0
+        while True:
+            batch = list(islice(objects, self.batch_size))
+            if not batch:
+                break
+            model.objects.bulk_create(batch, batch_size=self.batch_size)
+            total += len(batch)
+        self.stdout.write(
+            f'{model._meta.verbose_name_plural}: добавлено {total}')
+        return total
+
+    def get_tags(self):
+        tags = list(Tag.objects.order_by('pk'))
+        if not tags:
+            tags = [Tag.objects.create(name=name, color=color, slug=slug)
+                    for name, color, slug in DEFAULT_TAGS]
+        return tags
+
+    def create_users(self, count):
+        start = self.next_pk(User)
+        self.insert(User, (
+            User(pk=pk, email=f'user{pk}@example.com',
+                 username=f'user{pk}', first_name='Пользователь',
+                 last_name=str(pk), password='!')
+            for pk in range(start, start + count)
+        ))
+        return range(start, start + count)
+
+    def build_recipe(self, pk, author_id, now, period):
+        # bulk_create не вызывает save(), поэтому текст для поиска
+        # заполняется здесь.
+        name = (f'{self.rng.choice(DISHES)} '
+                f'{self.rng.choice(ADJECTIVES)} №{pk}')
+        return Recipe(
+            pk=pk,
+            author_id=author_id,
+            name=name,
+            text=RECIPE_TEXT,
+            search_text=get_recipe_search_text(name, RECIPE_TEXT),
+            cooking_time=self.rng.randint(5, MAX_COOKING_TIME // 2),
+            date_created=now - timedelta(
+                seconds=self.rng.randrange(period)),
+        )
+
+    def create_recipes(self, count, author_ids):
+        start = self.next_pk(Recipe)
+        authors = ZipfSampler(author_ids, self.zipf, self.rng)
+        now = timezone.now()
+        period = RECIPE_PERIOD_DAYS * 24 * 3600
+        with manual_dates(Recipe, 'date_created'):
+            self.insert(Recipe, (
+                self.build_recipe(pk, author_id, now, period)
+                for pk, author_id in zip(range(start, start + count),
+                                         authors.sample(count))
+            ))
+        return range(start, start + count)
+
+    def create_recipe_relations(self, recipe_ids, ingredient_ids, tag_ids):
+        ingredients = ZipfSampler(ingredient_ids, self.zipf, self.rng)
+        tag_weights = (TAG_WEIGHTS + (EXTRA_TAG_WEIGHT,) * len(tag_ids))[
+            :len(tag_ids)]
+        self.insert(RecipeIngredient, (
+            RecipeIngredient(
+                recipe_id=recipe_id, ingredient_id=ingredient_id,
+                amount=self.rng.randint(1, MAX_AMOUNT // 2))
+            for recipe_id in recipe_ids
+            for ingredient_id in ingredients.distinct(
+                self.rng.randint(3, 12))
+        ))
+        self.insert(RecipeTag, (
+            RecipeTag(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in recipe_ids
+            for tag_id in set(self.rng.choices(
+                tag_ids, weights=tag_weights, k=self.rng.randint(1, 3)))
+        ))
+
+    def create_pairs(self, model, count, user_ids, target_ids, target_field):
+        """Связи пользователь -> объект: активность пользователей и
+        популярность объектов распределены по Ципфу."""
+        if not count:
+            return
+        exclude_self = target_field == 'author_id'
+        limit = max(1, int(
+            (len(target_ids) - exclude_self) * MAX_USER_SHARE))
+        if count > limit * len(user_ids):
+            raise CommandError(
+                f'{model._meta.verbose_name_plural}: нельзя создать '
+                f'{count} связей, не больше {limit} на каждого из '
+                f'{len(user_ids)} пользователей.')
+        users = ZipfSampler(user_ids, self.zipf, self.rng)
+        targets = ZipfSampler(target_ids, self.zipf, self.rng)
+        self.insert(model, (
+            model(user_id=user_id, **{target_field: target_id})
+            for user_id, user_count in sorted(
+                users.split(count, limit).items())
+            for target_id in sorted(targets.distinct(
+                user_count, exclude=user_id if exclude_self else None))
+        ))
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.zipf = options['zipf']
+        self.batch_size = options['batch_size']
+
+        ingredient_ids = list(
+            Ingredient.objects.order_by('pk').values_list('pk', flat=True))
+        if not ingredient_ids:
+            raise CommandError(
+                'Справочник ингредиентов пуст, сначала выполните '
+                'load_ingredients.')
+        if options['users'] < 2 and options['subscriptions']:
+            raise CommandError('Для подписок нужно хотя бы два пользователя.')
+
+        with transaction.atomic():
+            tag_ids = [tag.pk for tag in self.get_tags()]
+            user_ids = self.create_users(options['users'])
+            recipe_ids = self.create_recipes(options['recipes'], user_ids)
+            self.create_recipe_relations(recipe_ids, ingredient_ids, tag_ids)
+            self.create_pairs(Favorite, options['favorites'], user_ids,
+                              recipe_ids, 'recipe_id')
+            self.create_pairs(ShoppingCart, options['carts'], user_ids,
+                              recipe_ids, 'recipe_id')
+            self.create_pairs(Subscription, options['subscriptions'],
+                              user_ids, user_ids, 'author_id')
+
+            with connection.cursor() as cursor:
+                for sql in connection.ops.sequence_reset_sql(
+                        no_style(), [User, Recipe]):
+                    cursor.execute(sql)
+
+            self.stdout.write(
+                'Пересчет счетчиков, списков покупок, лент подписок '
+                'и индекса ингредиентов...')
+            recount(self.batch_size)
+            ShoppingListItem.objects.rebuild(
+                User.objects.filter(pk__in=user_ids),
+                batch_size=self.batch_size)
+            rebuild_feeds(self.batch_size)
+            IngredientIndex.objects.rebuild(self.batch_size)
+        bump_catalog_version('recipes')
+        invalidate_recipes()
+
+        self.stdout.write(self.style.SUCCESS('Данные сгенерированы.'))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import generate_image_variants
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Построение уменьшенных копий изображений рецептов, '
+            'для которых они отсутствуют или устарели')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Перестроить копии для всех рецептов')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='').exclude(
+            image__isnull=True).order_by('pk')
+        processed = failed = 0
+        for recipe_id in recipes.values_list('pk', flat=True).iterator():
+            try:
+                generate_image_variants(recipe_id, options['force'])
+            except Exception as error:
+                failed += 1
+                self.stderr.write(f'Рецепт {recipe_id}: {error}')
+                continue
+            processed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано рецептов: {processed}, ошибок: {failed}.'))
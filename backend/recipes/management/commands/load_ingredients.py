@@ -1,24 +1,221 @@
 import csv
+import io
+import json
+from itertools import islice
+from pathlib import Path
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 
+from recipes.catalog import bump_catalog_version
+from recipes.constants import MAX_FIELD_LENGTH
 from recipes.models import Ingredient
+from recipes.search import normalize_name
+
+JSON_CHUNK_SIZE = 64 * 1024
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        yield row
+
+
+def read_json(file):
+    """Потоково разобрать JSON-массив объектов, не загружая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    started = False
+    while True:
+        chunk = file.read(JSON_CHUNK_SIZE)
+        buffer = buffer[position:] + chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if not started:
+                if position == len(buffer):
+                    break
+                if buffer[position] != '[':
+                    raise CommandError('JSON-файл должен содержать массив.')
+                started = True
+                position += 1
+                continue
+            if position < len(buffer) and buffer[position] == ']':
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise CommandError('Некорректный JSON-файл.')
+                break
+            if isinstance(item, dict):
+                yield [item.get('name'), item.get('measurement_unit')]
+            else:
+                yield item
+        if not chunk:
+            return
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+}
+
+
+class CsvStream(io.TextIOBase):
+    """Файловый объект для COPY ... FROM STDIN: строки CSV формируются
+    по мере чтения, в памяти - не больше одного запрошенного блока."""
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.writer = csv.writer(self)
+        self.buffer = ''
+        self.count = 0
+
+    def readable(self):
+        return True
+
+    def write(self, text):
+        # Вызывается csv.writer для каждой строки.
+        self.buffer += text
+        return len(text)
+
+    def read(self, size=-1):
+        while size is None or size < 0 or len(self.buffer) < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            self.writer.writerow(row)
+            self.count += 1
+        if size is None or size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
 
 
 class Command(BaseCommand):
-    help = 'Загрузка ингредиентов из CSV файла в базу данных'
+    help = ('Загрузка ингредиентов из CSV или JSON файла в базу данных. '
+            'Повторная загрузка не создает дубликатов.')
 
     def add_arguments(self, parser):
-        parser.add_argument('csv_file', type=str, help='Путь к CSV файлу')
+        parser.add_argument(
+            'path', type=str, help='Путь к CSV или JSON файлу')
+        parser.add_argument(
+            '--format', choices=READERS, default=None,
+            help='Формат файла, по умолчанию определяется по расширению')
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Число строк в одной пакетной вставке')
+        parser.add_argument(
+            '--copy', action='store_true',
+            help='Загрузить через COPY во временную таблицу (PostgreSQL)')
+
+    def iter_rows(self, path, file_format):
+        """Уникальные корректные строки файла; счетчик пропусков
+        хранится в self.skipped."""
+        seen = set()
+        with open(path, encoding='utf-8') as file:
+            for row in READERS[file_format](file):
+                if (not isinstance(row, (list, tuple)) or len(row) != 2
+                        or not all(isinstance(value, str) for value in row)):
+                    self.skipped += 1
+                    continue
+                name, measurement_unit = (value.strip() for value in row)
+                key = (name, measurement_unit)
+                if (not name or not measurement_unit
+                        or len(name) > MAX_FIELD_LENGTH
+                        or len(measurement_unit) > MAX_FIELD_LENGTH
+                        or key in seen):
+                    self.skipped += 1
+                    continue
+                seen.add(key)
+                yield name, measurement_unit, normalize_name(name)
+
+    def load_bulk(self, rows, batch_size):
+        inserted = updated = existing = 0
+        rows = iter(rows)
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            stored = {
+                (ingredient.name, ingredient.measurement_unit): ingredient
+                for ingredient in Ingredient.objects.filter(
+                    name__in={name for name, _, _ in batch}
+                ).only('id', 'name', 'measurement_unit', 'search_name')
+            }
+            to_create, to_update = [], []
+            for name, measurement_unit, search_name in batch:
+                ingredient = stored.get((name, measurement_unit))
+                if ingredient is None:
+                    to_create.append(Ingredient(
+                        name=name, measurement_unit=measurement_unit,
+                        search_name=search_name))
+                elif ingredient.search_name != search_name:
+                    ingredient.search_name = search_name
+                    to_update.append(ingredient)
+                else:
+                    existing += 1
+            Ingredient.objects.bulk_create(to_create, ignore_conflicts=True)
+            Ingredient.objects.bulk_update(to_update, ('search_name',))
+            inserted += len(to_create)
+            updated += len(to_update)
+            if self.verbosity > 1:
+                self.stdout.write(
+                    f'Обработано строк: {inserted + updated + existing}')
+        return inserted, updated, existing
+
+    def load_copy(self, rows):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Режим --copy доступен только для PostgreSQL.')
+        data = CsvStream(rows)
+        table = Ingredient._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMP TABLE ingredient_staging '
+                '(name text, measurement_unit text, search_name text) '
+                'ON COMMIT DROP')
+            cursor.copy_expert(
+                'COPY ingredient_staging (name, measurement_unit, '
+                'search_name) FROM STDIN WITH (FORMAT csv)', data)
+            cursor.execute(
+                f'UPDATE {table} AS ingredient '
+                'SET search_name = staging.search_name '
+                'FROM ingredient_staging AS staging '
+                'WHERE ingredient.name = staging.name '
+                'AND ingredient.measurement_unit = staging.measurement_unit '
+                'AND ingredient.search_name <> staging.search_name')
+            updated = cursor.rowcount
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit, search_name) '
+                'SELECT name, measurement_unit, search_name '
+                'FROM ingredient_staging '
+                'ON CONFLICT (name, measurement_unit) DO NOTHING')
+            inserted = cursor.rowcount
+        return inserted, updated, data.count - inserted - updated
 
     def handle(self, *args, **options):
-        csv_file = options['csv_file']
-
-        with open(csv_file, 'r') as file:
-            csv_reader = csv.reader(file)
-            for row in csv_reader:
-                name, measurement_unit = row
-                Ingredient.objects.create(
-                    name=name, measurement_unit=measurement_unit)
-                self.stdout.write(self.style.SUCCESS(
-                    f'Ингредиент успешно загружен: {name}'))
+        path = Path(options['path'])
+        if not path.exists():
+            raise CommandError(f'Файл {path} не найден.')
+        file_format = options['format'] or path.suffix.lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError(
+                'Не удалось определить формат файла, укажите --format.')
+
+        self.verbosity = options['verbosity']
+        self.skipped = 0
+        rows = self.iter_rows(path, file_format)
+        with transaction.atomic():
+            if options['copy']:
+                inserted, updated, existing = self.load_copy(rows)
+            else:
+                inserted, updated, existing = self.load_bulk(
+                    rows, options['batch_size'])
+        bump_catalog_version('ingredients')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Ингредиенты загружены. Добавлено: {inserted}, '
+            f'обновлено: {updated}, пропущено: {existing + self.skipped} '
+            f'(уже в базе: {existing}, дубликаты и ошибки: {self.skipped}).'))
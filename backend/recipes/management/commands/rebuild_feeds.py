@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.feed import rebuild_feeds
+from recipes.models import FeedItem
+
+
+class Command(BaseCommand):
+    help = 'Пересборка лент подписок всех пользователей'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Число подписок, обрабатываемых за один проход')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rebuild_feeds(options['batch_size'], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f'Ленты пересобраны, записей: {FeedItem.objects.count()}.'))
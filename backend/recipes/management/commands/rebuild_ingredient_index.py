@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import IngredientIndex
+
+
+class Command(BaseCommand):
+    help = 'Пересборка обратного индекса рецептов по ингредиентам'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Размер пакета при чтении и вставке строк')
+        parser.add_argument(
+            '--compact', action='store_true',
+            help='Только слить журнал изменений с сегментами индекса')
+
+    def handle(self, *args, **options):
+        if options['compact']:
+            IngredientIndex.objects.compact(
+                batch_size=options['batch_size'])
+        else:
+            with transaction.atomic():
+                IngredientIndex.objects.rebuild(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            'Индекс готов, сегментов: '
+            f'{IngredientIndex.objects.count()}.'))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = ('Пересборка материализованных списков покупок '
+            'или проверка их расхождения с рецептами')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только проверить расхождения, не изменяя данные')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Размер пакета при вставке строк')
+
+    def handle(self, *args, **options):
+        if options['check']:
+            drift = ShoppingListItem.objects.find_drift()
+            for (user_id, ingredient_id), (actual, expected) in sorted(
+                    drift.items()):
+                self.stdout.write(
+                    f'Пользователь {user_id}, ингредиент {ingredient_id}: '
+                    f'в таблице {actual}, ожидается {expected}')
+            if drift:
+                raise CommandError(
+                    f'Найдено расхождений: {len(drift)}. '
+                    'Запустите команду без --check для пересборки.')
+            self.stdout.write(self.style.SUCCESS('Расхождений не найдено.'))
+            return
+
+        with transaction.atomic():
+            ShoppingListItem.objects.rebuild(
+                batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            'Списки покупок пересобраны, строк: '
+            f'{ShoppingListItem.objects.count()}.'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from recipes.counters import recount
+
+
+class Command(BaseCommand):
+    help = ('Пересчет счетчиков избранного, рецептов и подписчиков '
+            'по данным таблиц')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Число строк, обновляемых одним запросом')
+
+    def handle(self, *args, **options):
+        recount(options['chunk_size'], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS('Счетчики пересчитаны.'))
@@ -0,0 +1,60 @@
+# flake8: noqa
+# Generated by Django 3.2.20 on 2026-10-18 05:40
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def fill_search_name(apps, schema_editor):
+    from recipes.search import normalize_name
+
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    batch = []
+    for ingredient in Ingredient.objects.only('id', 'name').iterator(
+            chunk_size=BATCH_SIZE):
+        ingredient.search_name = normalize_name(ingredient.name)
+        batch.append(ingredient)
+        if len(batch) == BATCH_SIZE:
+            Ingredient.objects.bulk_update(batch, ('search_name',))
+            batch = []
+    Ingredient.objects.bulk_update(batch, ('search_name',))
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS recipes_ingredient_search_prefix_idx '
+        'ON recipes_ingredient (search_name varchar_pattern_ops)')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS recipes_ingredient_search_trgm_idx '
+        'ON recipes_ingredient USING gin (search_name gin_trgm_ops)')
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'DROP INDEX IF EXISTS recipes_ingredient_search_prefix_idx')
+    schema_editor.execute(
+        'DROP INDEX IF EXISTS recipes_ingredient_search_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_shoppinglistitem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='search_name',
+            field=models.CharField(default='', editable=False, max_length=200, verbose_name='Название для поиска'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_search_name, migrations.RunPython.noop),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
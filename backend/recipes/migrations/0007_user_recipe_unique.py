@@ -0,0 +1,73 @@
+# flake8: noqa
+# Generated by Django 3.2.20 on 2026-10-18 05:42
+
+from django.db import migrations, models
+from django.db.models import Count, F, Min
+
+
+def find_duplicates(model):
+    """Лишние строки (user, recipe), кроме первой добавленной."""
+    groups = model.objects.values('user_id', 'recipe_id').annotate(
+        first_id=Min('id'), total=Count('id')).filter(total__gt=1)
+    duplicates = []
+    for group in groups:
+        duplicates += model.objects.filter(
+            user_id=group['user_id'], recipe_id=group['recipe_id']
+        ).exclude(id=group['first_id'])
+    return duplicates
+
+
+def remove_duplicates(apps, schema_editor):
+    Favorite = apps.get_model('recipes', 'Favorite')
+    ShoppingCart = apps.get_model('recipes', 'ShoppingCart')
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+
+    for favorite in find_duplicates(Favorite):
+        favorite.delete()
+        Recipe.objects.filter(
+            id=favorite.recipe_id, favorites_count__gt=0
+        ).update(favorites_count=F('favorites_count') - 1)
+
+    for cart in find_duplicates(ShoppingCart):
+        cart.delete()
+        for ingredient_id, amount in RecipeIngredient.objects.filter(
+                recipe_id=cart.recipe_id
+        ).values_list('ingredient_id', 'amount'):
+            item = ShoppingListItem.objects.filter(
+                user_id=cart.user_id, ingredient_id=ingredient_id).first()
+            if item is None:
+                continue
+            item.total_amount -= amount
+            if item.total_amount > 0:
+                item.save(update_fields=('total_amount',))
+            else:
+                item.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_counters'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='favorite',
+            options={'ordering': ('-added_at',), 'verbose_name': 'Избранное', 'verbose_name_plural': 'Избранное'},
+        ),
+        migrations.AlterModelOptions(
+            name='shoppingcart',
+            options={'ordering': ('-added_at',), 'verbose_name': 'Список покупок', 'verbose_name_plural': 'Список покупок'},
+        ),
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='favorite',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_favorite_user_recipe'),
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcart',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_shoppingcart_user_recipe'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# flake8: noqa
+# Generated by Django 3.2.20 on 2026-10-18 05:58
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def fill_search_text(apps, schema_editor):
+    from recipes.search import get_recipe_search_text
+
+    Recipe = apps.get_model('recipes', 'Recipe')
+    batch = []
+    for recipe in Recipe.objects.only('id', 'name', 'text').iterator(
+            chunk_size=BATCH_SIZE):
+        recipe.search_text = get_recipe_search_text(recipe.name, recipe.text)
+        batch.append(recipe)
+        if len(batch) == BATCH_SIZE:
+            Recipe.objects.bulk_update(batch, ('search_text',))
+            batch = []
+    Recipe.objects.bulk_update(batch, ('search_text',))
+
+
+def create_search_vector(apps, schema_editor):
+    # Вычисляемый столбец обновляется самой базой при любой записи,
+    # в том числе при bulk_create и update().
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'ALTER TABLE recipes_recipe ADD COLUMN IF NOT EXISTS search_vector '
+        'tsvector GENERATED ALWAYS AS ('
+        "setweight(to_tsvector('russian'::regconfig, "
+        "coalesce(name, '')), 'A') || "
+        "setweight(to_tsvector('russian'::regconfig, "
+        "coalesce(text, '')), 'B')) STORED")
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS recipes_recipe_search_vector_idx '
+        'ON recipes_recipe USING gin (search_vector)')
+
+
+def drop_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'DROP INDEX IF EXISTS recipes_recipe_search_vector_idx')
+    schema_editor.execute(
+        'ALTER TABLE recipes_recipe DROP COLUMN IF EXISTS search_vector')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_recipe_image_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_text',
+            field=models.TextField(default='', editable=False, verbose_name='Текст для поиска'),
+        ),
+        migrations.RunPython(fill_search_text, migrations.RunPython.noop),
+        migrations.RunPython(create_search_vector, drop_search_vector),
+    ]
@@ -0,0 +1,29 @@
+# flake8: noqa
+# Generated by Django 3.2.20 on 2026-10-18 06:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Индекс заполняется в 0013_ingredientindex_shards.
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_recipe_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngredientIndex',
+            fields=[
+                ('ingredient', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='recipes.ingredient', verbose_name='Ингредиент')),
+                ('recipe_ids', models.BinaryField(default=bytes, verbose_name='Рецепты с ингредиентом')),
+                ('ingredient_counts', models.BinaryField(default=bytes, verbose_name='Число ингредиентов в рецептах')),
+            ],
+            options={
+                'verbose_name': 'Индекс рецептов по ингредиенту',
+                'verbose_name_plural': 'Индекс рецептов по ингредиентам',
+            },
+        ),
+    ]
@@ -0,0 +1,68 @@
+# flake8: noqa
+# Generated by Django 3.2.20 on 2026-10-18 07:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+SHARD_SIZE = 4096
+
+
+def fill_ingredient_index(apps, schema_editor):
+    from recipes.search import build_ingredient_index
+
+    IngredientIndex = apps.get_model('recipes', 'IngredientIndex')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    rows = RecipeIngredient.objects.order_by(
+        'recipe_id', 'ingredient_id').values_list(
+        'recipe_id', 'ingredient_id').iterator(chunk_size=1000)
+    IngredientIndex.objects.bulk_create(
+        (IngredientIndex(ingredient_id=ingredient_id, shard=shard,
+                         recipe_ids=recipe_ids, ingredient_counts=counts)
+         for ingredient_id, shard, recipe_ids, counts
+         in build_ingredient_index(rows, SHARD_SIZE)),
+        batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_ingredientindex'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='IngredientIndex',
+        ),
+        migrations.CreateModel(
+            name='IngredientIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveIntegerField(verbose_name='Диапазон id рецептов')),
+                ('recipe_ids', models.BinaryField(default=bytes, verbose_name='Рецепты с ингредиентом')),
+                ('ingredient_counts', models.BinaryField(default=bytes, verbose_name='Число ингредиентов в рецептах')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='recipes.ingredient', verbose_name='Ингредиент')),
+            ],
+            options={
+                'verbose_name': 'Сегмент индекса рецептов по ингредиенту',
+                'verbose_name_plural': 'Индекс рецептов по ингредиентам',
+            },
+        ),
+        migrations.CreateModel(
+            name='IngredientIndexChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipe_id', models.BigIntegerField(verbose_name='Рецепт')),
+                ('ingredients_count', models.PositiveSmallIntegerField(verbose_name='Число ингредиентов в рецепте (0 - удален)')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='recipes.ingredient', verbose_name='Ингредиент')),
+            ],
+            options={
+                'verbose_name': 'Изменение индекса рецептов по ингредиентам',
+                'verbose_name_plural': 'Изменения индекса рецептов по ингредиентам',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='ingredientindex',
+            constraint=models.UniqueConstraint(fields=('ingredient', 'shard'), name='unique_ingredient_index_shard'),
+        ),
+        migrations.RunPython(fill_ingredient_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# flake8: noqa
+# Generated by Django 3.2.20 on 2026-10-18 08:02
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.utils.timezone
+
+
+def fill_date_created(apps, schema_editor):
+    FeedItem = apps.get_model('recipes', 'FeedItem')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    FeedItem.objects.update(date_created=Subquery(
+        Recipe.objects.filter(pk=OuterRef('recipe_id')).values(
+            'date_created')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_ingredientindex_shards'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='feeditem',
+            name='date_created',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата создания рецепта'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_date_created, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='feeditem',
+            index=models.Index(fields=['user', '-date_created', '-recipe'], name='feed_user_date_created_idx'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# flake8: noqa
+# Generated by Django 3.2.20 on 2026-10-18 08:40
+
+from django.db import migrations
+
+
+def create_search_fts(apps, schema_editor):
+    # Внешняя FTS5-таблица по search_text: хранит только индекс слов,
+    # триггеры поддерживают ее при любой записи, в том числе при
+    # bulk_create и update().
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        'CREATE VIRTUAL TABLE IF NOT EXISTS recipes_recipe_search '
+        "USING fts5(search_text, content='recipes_recipe', "
+        "content_rowid='id', tokenize='unicode61')")
+    schema_editor.execute(
+        'CREATE TRIGGER IF NOT EXISTS recipes_recipe_search_insert '
+        'AFTER INSERT ON recipes_recipe BEGIN '
+        'INSERT INTO recipes_recipe_search (rowid, search_text) '
+        'VALUES (new.id, new.search_text); END')
+    schema_editor.execute(
+        'CREATE TRIGGER IF NOT EXISTS recipes_recipe_search_delete '
+        'AFTER DELETE ON recipes_recipe BEGIN '
+        'INSERT INTO recipes_recipe_search '
+        '(recipes_recipe_search, rowid, search_text) '
+        "VALUES ('delete', old.id, old.search_text); END")
+    schema_editor.execute(
+        'CREATE TRIGGER IF NOT EXISTS recipes_recipe_search_update '
+        'AFTER UPDATE OF search_text ON recipes_recipe BEGIN '
+        'INSERT INTO recipes_recipe_search '
+        '(recipes_recipe_search, rowid, search_text) '
+        "VALUES ('delete', old.id, old.search_text); "
+        'INSERT INTO recipes_recipe_search (rowid, search_text) '
+        'VALUES (new.id, new.search_text); END')
+    schema_editor.execute(
+        'INSERT INTO recipes_recipe_search (recipes_recipe_search) '
+        "VALUES ('rebuild')")
+
+
+def drop_search_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for trigger in ('insert', 'delete', 'update'):
+        schema_editor.execute(
+            f'DROP TRIGGER IF EXISTS recipes_recipe_search_{trigger}')
+    schema_editor.execute('DROP TABLE IF EXISTS recipes_recipe_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_feeditem_date_created'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_fts, drop_search_fts),
+    ]
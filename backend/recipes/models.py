@@ -1,9 +1,20 @@
+from array import array
+from collections import Counter, defaultdict
+
 from colorfield.fields import ColorField
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models import Sum
+from django.utils import timezone
 
-from recipes.constants import (MAX_AMOUNT, MAX_COOKING_TIME, MAX_FIELD_LENGTH,
-                               MIN_VALUE)
+from recipes.catalog import bump_catalog_version
+from recipes.constants import (INGREDIENT_COUNT_TYPECODE,
+                               INGREDIENT_INDEX_SHARD_SIZE, MAX_AMOUNT,
+                               MAX_COOKING_TIME, MAX_FIELD_LENGTH, MIN_VALUE,
+                               RECIPE_ID_TYPECODE)
+from recipes.search import (build_ingredient_index, get_recipe_search_text,
+                            normalize_name, pack_array, unpack_array)
+from recipes.storage import content_addressed_storage
 from users.models import User
 
 
@@ -16,6 +27,11 @@ class Ingredient(models.Model):
         max_length=MAX_FIELD_LENGTH,
         verbose_name='Единица измерения',
     )
+    search_name = models.CharField(
+        max_length=MAX_FIELD_LENGTH,
+        editable=False,
+        verbose_name='Название для поиска',
+    )
 
     class Meta:
         verbose_name = 'Ингредиент'
@@ -29,6 +45,10 @@ class Ingredient(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        self.search_name = normalize_name(self.name)
+        super().save(*args, **kwargs)
+
 
 class Tag(models.Model):
     name = models.CharField(
@@ -67,6 +87,7 @@ class Recipe(models.Model):
     )
     image = models.ImageField(
         upload_to='recipes/images/',
+        storage=content_addressed_storage,
         null=True,
         default=None,
         verbose_name='Изображение',
@@ -97,15 +118,45 @@ class Recipe(models.Model):
         auto_now_add=True,
         verbose_name='Дата создания'
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Число добавлений в избранное',
+    )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Уменьшенные копии изображения',
+    )
+    search_text = models.TextField(
+        default='',
+        editable=False,
+        verbose_name='Текст для поиска',
+    )
 
     class Meta:
-        ordering = ('-date_created', )
+        ordering = ('-date_created', '-id')
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = (
+            models.Index(
+                fields=('-date_created', '-id'),
+                name='recipe_date_created_id_idx'
+            ),
+        )
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        self.search_text = get_recipe_search_text(self.name, self.text)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and (
+                {'name', 'text'} & set(update_fields)):
+            kwargs['update_fields'] = {*update_fields, 'search_text'}
+        super().save(*args, **kwargs)
+
 
 class RecipeIngredient(models.Model):
     recipe = models.ForeignKey(
@@ -152,6 +203,169 @@ class RecipeTag(models.Model):
         return f'Рецепт {self.recipe} имеет тег {self.tag}'
 
 
+class UserRecipeManager(models.Manager):
+    """Добавление и удаление рецептов в списке пользователя с минимумом
+    SQL-запросов.
+
+    Сырые запросы и bulk_create не вызывают сигналы моделей, поэтому
+    связанные данные (версии кэша, счетчики, список покупок) обновляются
+    явно в recipes_added и recipes_removed.
+    """
+
+    def add(self, user, recipe_id):
+        """Добавить рецепт одним запросом INSERT ... SELECT.
+
+        Вернуть False, если рецепт уже в списке или не существует.
+        """
+        connection = connections[self.db]
+        with transaction.atomic(using=self.db):
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'INSERT INTO {self.model._meta.db_table} '
+                    '(user_id, recipe_id, added_at) '
+                    f'SELECT %s, id, %s FROM {Recipe._meta.db_table} '
+                    'WHERE id = %s '
+                    'ON CONFLICT (user_id, recipe_id) DO NOTHING',
+                    [user.pk,
+                     connection.ops.adapt_datetimefield_value(
+                         timezone.now()),
+                     recipe_id])
+                added = cursor.rowcount == 1
+            if added:
+                self.recipes_added(user, [recipe_id])
+        return added
+
+    def remove(self, user, recipe_id):
+        """Удалить рецепт одним запросом DELETE.
+
+        Вернуть False, если рецепта нет в списке.
+        """
+        with transaction.atomic(using=self.db):
+            with connections[self.db].cursor() as cursor:
+                cursor.execute(
+                    f'DELETE FROM {self.model._meta.db_table} '
+                    'WHERE user_id = %s AND recipe_id = %s',
+                    [user.pk, recipe_id])
+                removed = cursor.rowcount > 0
+            if removed:
+                self.recipes_removed(user, [recipe_id])
+        return removed
+
+    def can_return_rows(self):
+        """Поддерживает ли СУБД RETURNING в INSERT и DELETE."""
+        connection = connections[self.db]
+        return connection.vendor == 'postgresql' or (
+            connection.vendor == 'sqlite'
+            and connection.Database.sqlite_version_info >= (3, 35))
+
+    def add_many(self, user, recipe_ids):
+        """Добавить несколько рецептов одним запросом INSERT ... SELECT
+        ... ON CONFLICT DO NOTHING RETURNING; без RETURNING рецепты
+        добавляются по одному.
+
+        Связанные данные обновляются только для действительно
+        вставленных строк, поэтому параллельное добавление того же
+        рецепта не учитывается дважды. Вернуть пару множеств:
+        добавленные и уже бывшие в списке id; несуществующие рецепты
+        в них не попадают.
+        """
+        recipe_ids = list(recipe_ids)
+        if not recipe_ids:
+            return set(), set()
+        connection = connections[self.db]
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        sql = (
+            f'INSERT INTO {self.model._meta.db_table} '
+            '(user_id, recipe_id, added_at) '
+            f'SELECT %s, id, %s FROM {Recipe._meta.db_table} '
+            'WHERE id IN ({}) '
+            'ON CONFLICT (user_id, recipe_id) DO NOTHING')
+        with transaction.atomic(using=self.db):
+            with connection.cursor() as cursor:
+                if self.can_return_rows():
+                    cursor.execute(
+                        sql.format(', '.join(['%s'] * len(recipe_ids)))
+                        + ' RETURNING recipe_id',
+                        [user.pk, now, *recipe_ids])
+                    added = {row[0] for row in cursor.fetchall()}
+                else:
+                    added = set()
+                    for recipe_id in recipe_ids:
+                        cursor.execute(sql.format('%s'),
+                                       [user.pk, now, recipe_id])
+                        if cursor.rowcount == 1:
+                            added.add(recipe_id)
+            existing = set(self.filter(
+                user=user, recipe_id__in=recipe_ids
+            ).values_list('recipe_id', flat=True)) - added
+            if added:
+                self.recipes_added(user, added)
+        return added, existing
+
+    def remove_many(self, user, recipe_ids):
+        """Удалить несколько рецептов одним запросом DELETE ... RETURNING,
+        без поддержки RETURNING - с предварительным SELECT.
+
+        Вернуть множество id, которые были в списке.
+        """
+        recipe_ids = list(recipe_ids)
+        connection = connections[self.db]
+        with transaction.atomic(using=self.db):
+            if self.can_return_rows():
+                returning = ' RETURNING recipe_id'
+            else:
+                removed = set(self.filter(
+                    user=user, recipe_id__in=recipe_ids
+                ).values_list('recipe_id', flat=True))
+                recipe_ids = list(removed)
+                returning = ''
+            if not recipe_ids:
+                return set()
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'DELETE FROM {self.model._meta.db_table} '
+                    'WHERE user_id = %s AND recipe_id IN ('
+                    + ', '.join(['%s'] * len(recipe_ids)) + ')'
+                    + returning,
+                    [user.pk, *recipe_ids])
+                if returning:
+                    removed = {row[0] for row in cursor.fetchall()}
+            if removed:
+                self.recipes_removed(user, removed)
+        return removed
+
+    def recipes_added(self, user, recipe_ids):
+        bump_catalog_version(f'user_lists:{user.pk}')
+
+    def recipes_removed(self, user, recipe_ids):
+        bump_catalog_version(f'user_lists:{user.pk}')
+
+
+class FavoriteManager(UserRecipeManager):
+
+    def recipes_added(self, user, recipe_ids):
+        super().recipes_added(user, recipe_ids)
+        Recipe.objects.filter(pk__in=recipe_ids).update(
+            favorites_count=models.F('favorites_count') + 1)
+
+    def recipes_removed(self, user, recipe_ids):
+        super().recipes_removed(user, recipe_ids)
+        Recipe.objects.filter(
+            pk__in=recipe_ids, favorites_count__gte=1
+        ).update(favorites_count=models.F('favorites_count') - 1)
+
+
+class ShoppingCartManager(UserRecipeManager):
+
+    def recipes_added(self, user, recipe_ids):
+        super().recipes_added(user, recipe_ids)
+        ShoppingListItem.objects.add_recipes(user, recipe_ids)
+
+    def recipes_removed(self, user, recipe_ids):
+        super().recipes_removed(user, recipe_ids)
+        ShoppingListItem.objects.remove_recipes(user, recipe_ids)
+
+
 class CommonFields(models.Model):
     user = models.ForeignKey(
         User,
@@ -170,13 +384,15 @@ class CommonFields(models.Model):
         verbose_name='Дата и время добавления'
     )
 
+    objects = UserRecipeManager()
+
     class Meta:
         abstract = True
         ordering = ('-added_at', )
         constraints = (
             models.UniqueConstraint(
                 fields=('user', 'recipe'),
-                name='unique_user_recipe'
+                name='unique_%(class)s_user_recipe'
             ),
         )
 
@@ -186,14 +402,459 @@ class CommonFields(models.Model):
 
 
 class Favorite(CommonFields):
+    objects = FavoriteManager()
 
-    class Meta:
+    class Meta(CommonFields.Meta):
         verbose_name = 'Избранное'
         verbose_name_plural = 'Избранное'
 
 
 class ShoppingCart(CommonFields):
+    objects = ShoppingCartManager()
 
-    class Meta:
+    class Meta(CommonFields.Meta):
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Список покупок'
+
+
+class ShoppingListItemManager(models.Manager):
+    """Поддержка материализованного списка покупок в актуальном состоянии.
+
+    Методы должны вызываться внутри транзакции, в которой меняется
+    содержимое списка покупок или ингредиенты рецепта.
+    """
+
+    @staticmethod
+    def get_recipe_amounts(recipes):
+        """Суммарные количества ингредиентов по списку рецептов."""
+        amounts = Counter()
+        for ingredient_id, amount in RecipeIngredient.objects.filter(
+                recipe__in=recipes).values_list('ingredient_id', 'amount'):
+            amounts[ingredient_id] += amount
+        return amounts
+
+    def apply_changes(self, changes):
+        """Применить изменения вида {(user_id, ingredient_id): delta}.
+
+        Прибавки записываются одним запросом INSERT ... ON CONFLICT DO
+        UPDATE: параллельные транзакции, впервые добавляющие один и тот
+        же ингредиент, не конфликтуют, а складываются. Убавки применяются
+        к заблокированным строкам, строки с нулевым остатком удаляются.
+        """
+        changes = {key: delta for key, delta in changes.items() if delta}
+        if not changes:
+            return
+        self.add_amounts([
+            (user_id, ingredient_id, delta)
+            for (user_id, ingredient_id), delta in changes.items()
+            if delta > 0
+        ])
+        decreases = {key: delta for key, delta in changes.items()
+                     if delta < 0}
+        if not decreases:
+            return
+        to_update, to_delete = [], []
+        for item in self.select_for_update().filter(
+                user_id__in={user_id for user_id, _ in decreases},
+                ingredient_id__in={
+                    ingredient_id for _, ingredient_id in decreases}):
+            delta = decreases.get((item.user_id, item.ingredient_id))
+            if delta is None:
+                continue
+            item.total_amount += delta
+            if item.total_amount > 0:
+                to_update.append(item)
+            else:
+                to_delete.append(item.pk)
+        self.bulk_update(to_update, ('total_amount',))
+        if to_delete:
+            self.filter(pk__in=to_delete).delete()
+
+    def add_amounts(self, rows):
+        """Прибавить количества [(user_id, ingredient_id, amount)],
+        создавая недостающие строки."""
+        if not rows:
+            return
+        connection = connections[self.db]
+        table = self.model._meta.db_table
+        fields = [self.model._meta.get_field(name)
+                  for name in ('user', 'ingredient', 'total_amount')]
+        batch_size = connection.ops.bulk_batch_size(fields, rows)
+        with connection.cursor() as cursor:
+            for start in range(0, len(rows), batch_size):
+                batch = rows[start:start + batch_size]
+                cursor.execute(
+                    f'INSERT INTO {table} '
+                    '(user_id, ingredient_id, total_amount) VALUES '
+                    + ', '.join(['(%s, %s, %s)'] * len(batch))
+                    + ' ON CONFLICT (user_id, ingredient_id) DO UPDATE '
+                    f'SET total_amount = {table}.total_amount '
+                    '+ EXCLUDED.total_amount',
+                    [value for row in batch for value in row])
+
+    def add_recipes(self, user, recipes):
+        self.apply_changes({
+            (user.pk, ingredient_id): amount
+            for ingredient_id, amount
+            in self.get_recipe_amounts(recipes).items()
+        })
+
+    def remove_recipes(self, user, recipes):
+        self.apply_changes({
+            (user.pk, ingredient_id): -amount
+            for ingredient_id, amount
+            in self.get_recipe_amounts(recipes).items()
+        })
+
+    def update_recipe(self, recipe, old_amounts, new_amounts):
+        """Учесть изменение ингредиентов рецепта во всех списках покупок."""
+        deltas = Counter(new_amounts)
+        deltas.subtract(old_amounts)
+        deltas = {key: delta for key, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        user_ids = ShoppingCart.objects.filter(
+            recipe=recipe).values_list('user_id', flat=True)
+        self.apply_changes({
+            (user_id, ingredient_id): delta
+            for user_id in user_ids
+            for ingredient_id, delta in deltas.items()
+        })
+
+    def calculate(self, users=None):
+        """Эталонные суммы, посчитанные по рецептам в списках покупок."""
+        queryset = ShoppingCart.objects.all()
+        if users is not None:
+            queryset = queryset.filter(user__in=users)
+        return queryset.values(
+            'user_id', 'recipe__recipeingredient__ingredient_id'
+        ).annotate(
+            total_amount=Sum('recipe__recipeingredient__amount')
+        ).filter(total_amount__isnull=False).order_by()
+
+    def find_drift(self, users=None):
+        """Вернуть строки, отличающиеся от эталонных сумм.
+
+        Результат имеет вид {(user_id, ingredient_id): (actual, expected)}.
+        """
+        expected = {
+            (row['user_id'], row['recipe__recipeingredient__ingredient_id']):
+                row['total_amount']
+            for row in self.calculate(users).iterator()
+        }
+        queryset = self.all()
+        if users is not None:
+            queryset = queryset.filter(user__in=users)
+        actual = {
+            (user_id, ingredient_id): total_amount
+            for user_id, ingredient_id, total_amount
+            in queryset.values_list(
+                'user_id', 'ingredient_id', 'total_amount').iterator()
+        }
+        return {
+            key: (actual.get(key), expected.get(key))
+            for key in actual.keys() | expected.keys()
+            if actual.get(key) != expected.get(key)
+        }
+
+    def rebuild(self, users=None, batch_size=1000):
+        """Пересобрать список покупок с нуля."""
+        queryset = self.all()
+        if users is not None:
+            queryset = queryset.filter(user__in=users)
+        queryset.delete()
+        self.bulk_create(
+            (self.model(
+                user_id=row['user_id'],
+                ingredient_id=row['recipe__recipeingredient__ingredient_id'],
+                total_amount=row['total_amount'])
+             for row in self.calculate(users).iterator()),
+            batch_size=batch_size
+        )
+
+
+class ShoppingListItem(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Ингредиент',
+    )
+    total_amount = models.PositiveIntegerField(
+        verbose_name='Общее количество',
+    )
+
+    objects = ShoppingListItemManager()
+
+    class Meta:
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Позиции списка покупок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_user_ingredient'
+            ),
+        )
+
+    def __str__(self):
+        return (f'{self.ingredient} ({self.ingredient.measurement_unit}): '
+                f'{self.total_amount}')
+
+
+class FeedItem(models.Model):
+    """Запись ленты подписок: рецепт автора, на которого подписан
+    пользователь. Заполняется при публикации рецепта (fan-out on write).
+    Дата рецепта копируется в запись, чтобы страница ленты читалась по
+    индексу (user, -date_created, -recipe) без соединения с рецептами.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Пользователь',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Рецепт',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор',
+    )
+    date_created = models.DateTimeField(
+        verbose_name='Дата создания рецепта',
+    )
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Лента подписок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_feed_user_recipe'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', 'author'),
+                name='feed_user_author_idx',
+            ),
+            models.Index(
+                fields=('user', '-date_created', '-recipe'),
+                name='feed_user_date_created_idx',
+            ),
+        )
+
+    def __str__(self):
+        return f'Рецепт {self.recipe} в ленте пользователя {self.user}'
+
+
+class IngredientIndexManager(models.Manager):
+    """Обратный индекс ингредиентов: сегменты и журнал изменений.
+
+    Правка рецепта только добавляет строки в журнал
+    IngredientIndexChange и не блокирует сегменты, поэтому параллельные
+    правки рецептов с общими ингредиентами не ждут друг друга и не
+    перезаписывают большие массивы. Журнал сливается с сегментами в
+    compact: при чтении, если изменений накопилось много, и при
+    пересборке индекса.
+    """
+
+    def update_recipe(self, recipe_id, old_ingredient_ids,
+                      new_ingredient_ids):
+        """Записать изменение состава рецепта в журнал индекса."""
+        old_ids, new_ids = set(old_ingredient_ids), set(new_ingredient_ids)
+        if old_ids == new_ids:
+            return
+        # Число ингредиентов рецепта хранится при каждом его вхождении,
+        # поэтому при изменении числа обновляются все вхождения.
+        updated_ids = (new_ids if len(new_ids) != len(old_ids)
+                       else new_ids - old_ids)
+        IngredientIndexChange.objects.bulk_create(
+            [IngredientIndexChange(
+                ingredient_id=ingredient_id, recipe_id=recipe_id,
+                ingredients_count=len(new_ids))
+             for ingredient_id in sorted(updated_ids)]
+            + [IngredientIndexChange(
+                ingredient_id=ingredient_id, recipe_id=recipe_id,
+                ingredients_count=0)
+               for ingredient_id in sorted(old_ids - new_ids)])
+        transaction.on_commit(
+            lambda: bump_catalog_version('ingredient_index'))
+
+    def compact(self, ingredient_ids=None, batch_size=1000):
+        """Слить журнал изменений с сегментами индекса.
+
+        Блокируются только затронутые сегменты, а из журнала удаляются
+        только прочитанные строки: изменения, записанные параллельно,
+        дождутся следующего слияния.
+        """
+        changes = IngredientIndexChange.objects.order_by('pk')
+        if ingredient_ids is not None:
+            changes = changes.filter(ingredient_id__in=ingredient_ids)
+        with transaction.atomic(using=self.db):
+            keys = {
+                (ingredient_id, recipe_id // INGREDIENT_INDEX_SHARD_SIZE)
+                for ingredient_id, recipe_id in changes.values_list(
+                    'ingredient_id', 'recipe_id')
+            }
+            if not keys:
+                return
+            self.bulk_create(
+                (self.model(ingredient_id=ingredient_id, shard=shard)
+                 for ingredient_id, shard in sorted(keys)),
+                batch_size=batch_size, ignore_conflicts=True)
+            segments = {
+                (row.ingredient_id, row.shard): row
+                for row in self.select_for_update().filter(
+                    ingredient_id__in={key[0] for key in keys},
+                    shard__in={key[1] for key in keys}).order_by('pk')
+            }
+            change_ids = []
+            grouped = defaultdict(dict)
+            for pk, ingredient_id, recipe_id, count in changes.filter(
+                    ingredient_id__in={key[0] for key in keys}
+            ).values_list('pk', 'ingredient_id', 'recipe_id',
+                          'ingredients_count'):
+                key = (ingredient_id,
+                       recipe_id // INGREDIENT_INDEX_SHARD_SIZE)
+                if key in keys:
+                    grouped[key][recipe_id] = count
+                    change_ids.append(pk)
+            to_update, to_delete = [], []
+            for key in keys:
+                segment = segments[key]
+                if not segment.apply_changes(grouped.get(key, {})):
+                    to_delete.append(segment.pk)
+                elif key in grouped:
+                    to_update.append(segment)
+            self.bulk_update(to_update, ('recipe_ids', 'ingredient_counts'),
+                             batch_size=batch_size)
+            for start in range(0, len(to_delete), batch_size):
+                self.filter(
+                    pk__in=to_delete[start:start + batch_size]).delete()
+            for start in range(0, len(change_ids), batch_size):
+                IngredientIndexChange.objects.filter(
+                    pk__in=change_ids[start:start + batch_size]).delete()
+
+    def rebuild(self, batch_size=1000):
+        """Пересобрать индекс по таблице ингредиентов рецептов."""
+        IngredientIndexChange.objects.all().delete()
+        self.all().delete()
+        rows = RecipeIngredient.objects.order_by(
+            'recipe_id', 'ingredient_id').values_list(
+            'recipe_id', 'ingredient_id').iterator(chunk_size=batch_size)
+        self.bulk_create(
+            (self.model(ingredient_id=ingredient_id, shard=shard,
+                        recipe_ids=recipe_ids, ingredient_counts=counts)
+             for ingredient_id, shard, recipe_ids, counts
+             in build_ingredient_index(rows, INGREDIENT_INDEX_SHARD_SIZE)),
+            batch_size=batch_size)
+        bump_catalog_version('ingredient_index')
+
+
+class IngredientIndex(models.Model):
+    """Сегмент обратного индекса: отсортированные id рецептов с
+    ингредиентом из диапазона shard и число ингредиентов каждого из
+    них, упакованные в байты.
+
+    Позволяет подобрать рецепты по имеющимся продуктам, прочитав
+    несколько строк на ингредиент, без соединений и GROUP BY по таблице
+    ингредиентов рецептов. Размер сегмента ограничен
+    INGREDIENT_INDEX_SHARD_SIZE рецептами.
+    """
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Ингредиент',
+    )
+    shard = models.PositiveIntegerField(
+        verbose_name='Диапазон id рецептов',
+    )
+    recipe_ids = models.BinaryField(
+        default=bytes,
+        verbose_name='Рецепты с ингредиентом',
+    )
+    ingredient_counts = models.BinaryField(
+        default=bytes,
+        verbose_name='Число ингредиентов в рецептах',
+    )
+
+    objects = IngredientIndexManager()
+
+    class Meta:
+        verbose_name = 'Сегмент индекса рецептов по ингредиенту'
+        verbose_name_plural = 'Индекс рецептов по ингредиентам'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('ingredient', 'shard'),
+                name='unique_ingredient_index_shard'
+            ),
+        )
+
+    def __str__(self):
+        return (f'Рецепты с ингредиентом {self.ingredient_id}, '
+                f'сегмент {self.shard}')
+
+    def get_entries(self):
+        return (unpack_array(RECIPE_ID_TYPECODE, self.recipe_ids),
+                unpack_array(INGREDIENT_COUNT_TYPECODE,
+                             self.ingredient_counts))
+
+    def set_entries(self, recipe_ids, counts):
+        self.recipe_ids = pack_array(recipe_ids)
+        self.ingredient_counts = pack_array(counts)
+
+    def apply_changes(self, changes):
+        """Применить изменения вида {recipe_id: число ингредиентов},
+        где 0 - рецепт удален; возвращает False, если сегмент опустел."""
+        recipe_ids, counts = self.get_entries()
+        if changes:
+            entries = dict(zip(recipe_ids, counts))
+            for recipe_id, count in changes.items():
+                if count:
+                    entries[recipe_id] = count
+                else:
+                    entries.pop(recipe_id, None)
+            recipe_ids = array(RECIPE_ID_TYPECODE, sorted(entries))
+            counts = array(INGREDIENT_COUNT_TYPECODE,
+                           map(entries.__getitem__, recipe_ids))
+            self.set_entries(recipe_ids, counts)
+        return bool(recipe_ids)
+
+
+class IngredientIndexChange(models.Model):
+    """Изменение обратного индекса, еще не слитое с сегментами."""
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Ингредиент',
+    )
+    # Не внешний ключ: запись об удалении рецепта должна пережить
+    # каскадное удаление.
+    recipe_id = models.BigIntegerField(
+        verbose_name='Рецепт',
+    )
+    ingredients_count = models.PositiveSmallIntegerField(
+        verbose_name='Число ингредиентов в рецепте (0 - удален)',
+    )
+
+    class Meta:
+        verbose_name = 'Изменение индекса рецептов по ингредиентам'
+        verbose_name_plural = 'Изменения индекса рецептов по ингредиентам'
+
+    def __str__(self):
+        return (f'Рецепт {self.recipe_id}, ингредиент '
+                f'{self.ingredient_id}: {self.ingredients_count}')
@@ -0,0 +1,115 @@
+import time
+from threading import Lock
+
+from recipes.catalog import get_catalog_version
+from recipes.constants import REGISTRY_VERSION_CHECK_INTERVAL
+
+
+class CatalogRegistry:
+    """Справочник, загруженный в память процесса.
+
+    Данные загружаются при первом обращении. Раз в
+    REGISTRY_VERSION_CHECK_INTERVAL секунд сверяется общая версия
+    справочника, которую сигналы меняют при сохранении и удалении
+    записей, поэтому изменения доходят до всех процессов. Записи,
+    добавленные в обход сигналов или еще не замеченные процессом,
+    при промахе догружаются из базы.
+    """
+
+    catalog_name = None
+
+    def __init__(self):
+        self._data = None
+        self._version = None
+        self._checked_at = 0
+        self._lock = Lock()
+
+    def get_queryset(self):
+        raise NotImplementedError
+
+    def load(self):
+        return self.index(self.get_queryset())
+
+    def index(self, objects):
+        return {'by_id': {obj.pk: obj for obj in objects}}
+
+    def invalidate(self):
+        self._data = None
+
+    def get_data(self):
+        now = time.monotonic()
+        data = self._data
+        if data is not None and (
+                now - self._checked_at < REGISTRY_VERSION_CHECK_INTERVAL):
+            return data
+        with self._lock:
+            version = get_catalog_version(self.catalog_name)
+            if self._data is None or self._version != version:
+                self._data = self.load()
+                self._version = version
+            self._checked_at = now
+            return self._data
+
+    def get(self, pk):
+        return self.in_bulk((pk,)).get(pk)
+
+    def in_bulk(self, pks):
+        data = self.get_data()
+        by_id = data['by_id']
+        found = {pk: by_id[pk] for pk in pks if pk in by_id}
+        missing = set(pks) - found.keys()
+        if missing:
+            fetched = self.get_queryset().in_bulk(missing)
+            self.add(data, fetched.values())
+            found.update(fetched)
+        return found
+
+    def add(self, data, objects):
+        """Дописать в справочник записи, догруженные при промахе."""
+        if not objects:
+            return
+        with self._lock:
+            for key, values in self.index(objects).items():
+                data[key].update(values)
+
+
+class TagRegistry(CatalogRegistry):
+    catalog_name = 'tags'
+
+    def get_queryset(self):
+        from recipes.models import Tag
+
+        return Tag.objects.all()
+
+    def index(self, tags):
+        tags = list(tags)
+        return {
+            'by_id': {tag.pk: tag for tag in tags},
+            'by_slug': {tag.slug: tag for tag in tags},
+        }
+
+    def get_by_slug(self, slug):
+        data = self.get_data()
+        tag = data['by_slug'].get(slug)
+        if tag is None:
+            tag = self.get_queryset().filter(slug=slug).first()
+            if tag is not None:
+                self.add(data, [tag])
+        return tag
+
+    def slug_choices(self):
+        return [(tag.slug, tag.name)
+                for tag in self.get_data()['by_slug'].values()]
+
+
+class IngredientRegistry(CatalogRegistry):
+    catalog_name = 'ingredients'
+
+    def get_queryset(self):
+        from recipes.models import Ingredient
+
+        return Ingredient.objects.only('id', 'name', 'measurement_unit')
+
+
+tag_registry = TagRegistry()
+ingredient_registry = IngredientRegistry()
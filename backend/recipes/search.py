@@ -0,0 +1,334 @@
+import hashlib
+import heapq
+import re
+import sys
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from itertools import groupby
+from operator import itemgetter
+from threading import Lock
+
+from django.conf import settings
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVectorField)
+from django.core.cache import cache
+from django.db import connection
+from django.db.models.expressions import Expression, RawSQL
+from django.db.models.functions import Length
+
+from recipes.catalog import get_catalog_version
+from recipes.constants import (INGREDIENT_COUNT_TYPECODE,
+                               INGREDIENT_INDEX_MAX_CHANGES,
+                               INGREDIENT_INDEX_SHARD_SIZE,
+                               INGREDIENT_NGRAM_SIZE,
+                               INGREDIENT_RANKING_MAX_POSTINGS,
+                               RECIPE_ID_TYPECODE, RECIPE_RANKING_LIMIT,
+                               RECIPE_SEARCH_CONFIG, RECIPE_SEARCH_ENDINGS,
+                               RECIPE_SEARCH_MAX_WORDS)
+
+WORD_RE = re.compile(r'\w+')
+RECIPE_RANKING_KEY = 'recipe_ranking:{}:{}'
+
+
+def normalize_name(value):
+    """Привести название к виду для поиска: нижний регистр, ё -> е."""
+    return value.strip().lower().replace('ё', 'е')
+
+
+def get_recipe_search_text(name, text):
+    """Текст рецепта для поиска на бэкендах без полнотекстового
+    поиска."""
+    return normalize_name(f'{name}\n{text or ""}')
+
+
+def get_stem(word):
+    """Грубая основа русского слова: без типичного окончания."""
+    for ending in RECIPE_SEARCH_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= 3:
+            return word[:-len(ending)]
+    return word
+
+
+class SearchVectorColumn(Expression):
+    """Столбец search_vector основной таблицы запроса.
+
+    Столбца нет в модели (см. миграцию 0011), поэтому он подставляется
+    при компиляции с текущим псевдонимом таблицы: псевдоним меняется,
+    когда запрос становится подзапросом (U0 и т. п.).
+    """
+
+    output_field = SearchVectorField()
+
+    def as_sql(self, compiler, connection):
+        alias = next(iter(compiler.query.alias_map))
+        return (f'{compiler.quote_name_unless_alias(alias)}.'
+                f'{connection.ops.quote_name("search_vector")}'), []
+
+
+def search_recipes(queryset, query):
+    """Отобрать рецепты, подходящие под поисковый запрос.
+
+    На PostgreSQL используется хранимый столбец search_vector с
+    GIN-индексом (см. миграцию 0011): поиск с морфологией русского
+    языка, результаты упорядочены по релевантности, совпадения в
+    названии весят больше совпадений в описании. На SQLite слова
+    запроса без окончания ищутся как начала слов search_text по
+    FTS5-таблице recipes_recipe_search (см. миграцию 0015), порядок
+    выдачи прежний. На остальных бэкендах индекса нет: каждое слово
+    ищется как подстрока search_text полным просмотром таблицы.
+    """
+    if connection.vendor == 'postgresql':
+        vector = SearchVectorColumn()
+        search_query = SearchQuery(
+            query, config=RECIPE_SEARCH_CONFIG, search_type='websearch')
+        return queryset.alias(search_vector=vector).filter(
+            search_vector=search_query
+        ).order_by(
+            SearchRank(vector, search_query).desc(),
+            *queryset.model._meta.ordering)
+
+    words = WORD_RE.findall(normalize_name(query))
+    if not words:
+        return queryset.none()
+    stems = [get_stem(word) for word in words[:RECIPE_SEARCH_MAX_WORDS]]
+    if connection.vendor == 'sqlite':
+        # Слова состоят только из букв и цифр, кавычки не нужно
+        # экранировать.
+        match = ' AND '.join(f'"{stem}"*' for stem in stems)
+        return queryset.filter(pk__in=RawSQL(
+            'SELECT rowid FROM recipes_recipe_search '
+            'WHERE recipes_recipe_search MATCH %s', [match]))
+    for stem in stems:
+        queryset = queryset.filter(search_text__contains=stem)
+    return queryset
+
+
+def get_ngrams(value, size=INGREDIENT_NGRAM_SIZE):
+    """Все подстроки value длиной от 1 до size символов."""
+    return {value[start:start + length]
+            for length in range(1, size + 1)
+            for start in range(len(value) - length + 1)}
+
+
+class IngredientPrefixIndex:
+    """Индекс названий ингредиентов в памяти процесса.
+
+    Используется для автодополнения на бэкендах без триграммного
+    индекса. Начала названий ищутся делением пополам в отсортированном
+    списке, подстроки - по n-граммам: для каждой n-граммы хранятся
+    позиции названий, в которых она встречается, и проверяются только
+    позиции самой редкой n-граммы запроса. Строится при первом
+    обращении и перестраивается, когда меняется общая версия
+    справочника ингредиентов.
+    """
+
+    def __init__(self):
+        self._data = None
+        self._version = None
+        self._lock = Lock()
+
+    def invalidate(self):
+        self._data = None
+
+    def _load(self):
+        from recipes.models import Ingredient
+
+        entries = sorted(Ingredient.objects.values_list('search_name', 'id'))
+        ngrams = defaultdict(lambda: array('I'))
+        for position, (name, _) in enumerate(entries):
+            for ngram in get_ngrams(name):
+                ngrams[ngram].append(position)
+        return entries, dict(ngrams)
+
+    def get_data(self):
+        """Пара (отсортированные (search_name, id), позиции по
+        n-граммам)."""
+        version = get_catalog_version('ingredients')
+        data = self._data
+        if data is None or self._version != version:
+            with self._lock:
+                if self._data is None or self._version != version:
+                    self._data = self._load()
+                    self._version = version
+                data = self._data
+        return data
+
+    def search(self, query, limit):
+        """Вернуть id ингредиентов: сначала совпадения по началу
+        названия, затем по вхождению подстроки."""
+        query = normalize_name(query)
+        entries, ngrams = self.get_data()
+        result = []
+        position = bisect_left(entries, (query,))
+        while (len(result) < limit and position < len(entries)
+               and entries[position][0].startswith(query)):
+            result.append(entries[position][1])
+            position += 1
+        if len(result) == limit or not query:
+            return result
+        size = INGREDIENT_NGRAM_SIZE
+        postings = [
+            ngrams.get(query[start:start + size], ())
+            for start in range(max(len(query) - size, 0) + 1)
+        ]
+        for position in min(postings, key=len):
+            name, pk = entries[position]
+            if query in name and not name.startswith(query):
+                result.append(pk)
+                if len(result) == limit:
+                    break
+        return result
+
+
+ingredient_index = IngredientPrefixIndex()
+
+
+def unpack_array(typecode, data):
+    """Массив чисел из байтов в порядке little-endian."""
+    values = array(typecode, bytes(data))
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+def pack_array(values):
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def build_ingredient_index(rows, shard_size):
+    """Сегменты обратного индекса ингредиентов из пар (recipe_id,
+    ingredient_id), упорядоченных по id рецепта: для каждого
+    ингредиента и диапазона shard - упакованные id рецептов и число
+    ингредиентов в них. Благодаря порядку входа массивы получаются
+    отсортированными, а в памяти держится только текущий диапазон.
+    """
+    def flush(shard, entries):
+        for ingredient_id, (recipe_ids, counts) in sorted(entries.items()):
+            yield (ingredient_id, shard,
+                   pack_array(recipe_ids), pack_array(counts))
+
+    shard, entries = None, {}
+    for recipe_id, group in groupby(rows, key=itemgetter(0)):
+        if recipe_id // shard_size != shard:
+            yield from flush(shard, entries)
+            shard, entries = recipe_id // shard_size, {}
+        ingredient_ids = [ingredient_id for _, ingredient_id in group]
+        for ingredient_id in ingredient_ids:
+            if ingredient_id not in entries:
+                entries[ingredient_id] = (array(RECIPE_ID_TYPECODE),
+                                          array(INGREDIENT_COUNT_TYPECODE))
+            recipe_ids, counts = entries[ingredient_id]
+            recipe_ids.append(recipe_id)
+            counts.append(len(ingredient_ids))
+    yield from flush(shard, entries)
+
+
+def select_index_segments(ingredient_ids, max_postings):
+    """id сегментов индекса, которые нужно прочитать, и для каждого
+    ингредиента, сегменты которого прочитаны не все, - наименьший
+    прочитанный диапазон.
+
+    Сегменты каждого ингредиента берутся от новых рецептов к старым,
+    пока не наберется max_postings вхождений. Читаются только размеры
+    массивов, сами массивы не загружаются.
+    """
+    from recipes.models import IngredientIndex
+
+    item_size = array(RECIPE_ID_TYPECODE).itemsize
+    segment_ids, first_shards, postings = [], {}, Counter()
+    for pk, ingredient_id, shard, size in IngredientIndex.objects.filter(
+            ingredient_id__in=ingredient_ids).order_by(
+            'ingredient_id', '-shard').values_list(
+            'pk', 'ingredient_id', 'shard', Length('recipe_ids')):
+        if postings[ingredient_id] >= max_postings:
+            first_shards.setdefault(ingredient_id, shard + 1)
+            continue
+        postings[ingredient_id] += size // item_size
+        segment_ids.append(pk)
+    return segment_ids, first_shards
+
+
+def rank_by_ingredients(ingredient_ids, max_missing=None,
+                        limit=RECIPE_RANKING_LIMIT):
+    """Не больше limit рецептов, в которых есть хотя бы один из
+    ингредиентов.
+
+    Возвращает список (recipe_id, matched, missing): сначала рецепты,
+    для которых есть все ингредиенты, затем те, где не хватает одного,
+    и так далее; при равенстве - с большим числом совпадений и более
+    новые. Результат кэшируется до следующего изменения индекса.
+    """
+    ingredient_ids = sorted(set(ingredient_ids))
+    digest = hashlib.sha1(
+        repr((ingredient_ids, max_missing, limit)).encode()).hexdigest()
+    key = RECIPE_RANKING_KEY.format(
+        get_catalog_version('ingredient_index'), digest)
+    ranking = cache.get(key)
+    if ranking is None:
+        ranking = rank_by_index(ingredient_ids, max_missing, limit)
+        cache.set(key, ranking, settings.CATALOG_CACHE_TIMEOUT)
+    return ranking
+
+
+def rank_by_index(ingredient_ids, max_missing, limit,
+                  max_postings=INGREDIENT_RANKING_MAX_POSTINGS):
+    """Подбор рецептов по сегментам индекса и журналу изменений.
+
+    Для частых ингредиентов читаются только сегменты с max_postings
+    новейшими рецептами, поэтому память и время не зависят от размера
+    каталога; у более старых рецептов такие ингредиенты не
+    засчитываются. Если журнал разросся, он сливается с сегментами в
+    фоне. Полная сортировка не нужна: отбираются только limit лучших.
+    """
+    from recipes.models import IngredientIndex, IngredientIndexChange
+    from recipes.tasks import run_in_background
+
+    # Журнал читается раньше сегментов: если его успеют слить между
+    # запросами, изменения просто применятся повторно.
+    changes = list(IngredientIndexChange.objects.filter(
+        ingredient_id__in=ingredient_ids).order_by('pk').values_list(
+        'ingredient_id', 'recipe_id', 'ingredients_count'))
+    if len(changes) > INGREDIENT_INDEX_MAX_CHANGES:
+        run_in_background(IngredientIndex.objects.compact, ingredient_ids)
+    segment_ids, first_shards = select_index_segments(
+        ingredient_ids, max_postings)
+    changed = defaultdict(dict)
+    for ingredient_id, recipe_id, count in changes:
+        if (recipe_id // INGREDIENT_INDEX_SHARD_SIZE
+                >= first_shards.get(ingredient_id, 0)):
+            changed[ingredient_id][recipe_id] = count
+
+    matched = Counter()
+    totals = {}
+    for segment in IngredientIndex.objects.filter(
+            pk__in=segment_ids).iterator():
+        recipe_ids, counts = segment.get_entries()
+        overrides = changed.get(segment.ingredient_id)
+        if overrides:
+            entries = [(recipe_id, count)
+                       for recipe_id, count in zip(recipe_ids, counts)
+                       if recipe_id not in overrides]
+            matched.update(recipe_id for recipe_id, _ in entries)
+            totals.update(entries)
+        else:
+            matched.update(recipe_ids)
+            totals.update(zip(recipe_ids, counts))
+    for overrides in changed.values():
+        for recipe_id, count in overrides.items():
+            if count:
+                matched[recipe_id] += 1
+                totals[recipe_id] = count
+
+    candidates = (
+        (recipe_id, count, totals[recipe_id] - count)
+        for recipe_id, count in matched.items()
+    )
+    if max_missing is not None:
+        candidates = (candidate for candidate in candidates
+                      if candidate[2] <= max_missing)
+    return heapq.nsmallest(
+        limit, candidates, key=lambda item: (item[2], -item[1], -item[0]))
@@ -0,0 +1,172 @@
+from django.conf import settings
+from django.db.models import Exists, OuterRef, Subquery
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from recipes.catalog import bump_catalog_version, invalidate_recipes
+from recipes.constants import AUTHOR_FIELDS
+from recipes.counters import increment
+from recipes.feed import (backfill_feed, fan_out_author, fan_out_recipe,
+                          prune_feed)
+from recipes.images import generate_image_variants, is_actual
+from recipes.models import (Favorite, FeedItem, Ingredient, IngredientIndex,
+                            Recipe, RecipeIngredient, ShoppingCart,
+                            ShoppingListItem, Tag)
+from recipes.registry import ingredient_registry, tag_registry
+from recipes.search import ingredient_index
+from recipes.tasks import run_in_background
+from users.models import Subscription, User
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_recipe_from_shopping_lists(sender, instance, **kwargs):
+    """Вычесть ингредиенты удаляемого рецепта из списков покупок."""
+    user_ids = ShoppingCart.objects.filter(
+        recipe=instance).values_list('user_id', flat=True)
+    amounts = ShoppingListItem.objects.get_recipe_amounts([instance])
+    ShoppingListItem.objects.apply_changes({
+        (user_id, ingredient_id): -amount
+        for user_id in user_ids
+        for ingredient_id, amount in amounts.items()
+    })
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_recipe_from_ingredient_index(sender, instance, **kwargs):
+    IngredientIndex.objects.update_recipe(
+        instance.pk,
+        RecipeIngredient.objects.filter(recipe=instance).values_list(
+            'ingredient_id', flat=True),
+        ())
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredients(sender, **kwargs):
+    bump_catalog_version('ingredients')
+    ingredient_index.invalidate()
+    ingredient_registry.invalidate()
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tags(sender, **kwargs):
+    bump_catalog_version('tags')
+    tag_registry.invalidate()
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe_counts(sender, created=True, **kwargs):
+    if created:
+        bump_catalog_version('recipes')
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe_responses(sender, instance, **kwargs):
+    invalidate_recipes(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_responses(sender, instance, created,
+                                update_fields=None, **kwargs):
+    """Рецепты показывают данные автора; вход в систему, меняющий
+    только last_login, кэш не сбрасывает."""
+    if created or update_fields is not None and not (
+            set(update_fields) & set(AUTHOR_FIELDS)):
+        return
+    invalidate_recipes(*instance.recipes.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Subscription)
+def invalidate_user_list_counts(sender, instance, **kwargs):
+    bump_catalog_version(f'user_lists:{instance.user_id}')
+
+
+@receiver(post_save, sender=Favorite)
+def increment_favorites_count(sender, instance, created, **kwargs):
+    if created:
+        increment(Recipe, instance.recipe_id, 'favorites_count')
+
+
+@receiver(post_delete, sender=Favorite)
+def decrement_favorites_count(sender, instance, **kwargs):
+    increment(Recipe, instance.recipe_id, 'favorites_count', -1)
+
+
+@receiver(post_save, sender=Recipe)
+def increment_recipes_count(sender, instance, created, **kwargs):
+    if created:
+        increment(User, instance.author_id, 'recipes_count')
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_recipes_count(sender, instance, **kwargs):
+    increment(User, instance.author_id, 'recipes_count', -1)
+
+
+@receiver(post_save, sender=Subscription)
+def increment_subscribers_count(sender, instance, created, **kwargs):
+    if created:
+        increment(User, instance.author_id, 'subscribers_count')
+
+
+@receiver(post_delete, sender=Subscription)
+def decrement_subscribers_count(sender, instance, **kwargs):
+    increment(User, instance.author_id, 'subscribers_count', -1)
+
+
+@receiver(post_save, sender=Recipe)
+def add_recipe_to_feeds(sender, instance, created, **kwargs):
+    if created:
+        run_in_background(fan_out_recipe, instance.pk)
+
+
+@receiver(post_save, sender=Subscription)
+def add_author_to_feed(sender, instance, created, **kwargs):
+    if created:
+        run_in_background(backfill_feed, instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Subscription)
+def remove_author_from_feed(sender, instance, **kwargs):
+    prune_feed(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Subscription)
+def add_author_recipes_to_feeds(sender, instance, **kwargs):
+    """Разложить по лентам рецепты автора, который после отписки
+    перестал быть популярным.
+
+    Как и в get_feed_keys, автор с числом подписчиков не больше
+    FEED_FANOUT_LIMIT считается разложенным по лентам. Пока он был
+    популярным, его рецепты подмешивались при чтении, поэтому их нет в
+    ленте первого оставшегося подписчика: по этому признаку, а не по
+    равенству счетчика порогу, переход не пропускается, даже если
+    счетчик или порог изменились сразу на несколько единиц.
+    """
+    author_id = instance.author_id
+    subscriptions = Subscription.objects.filter(author_id=author_id)
+    if User.objects.filter(
+        Exists(Recipe.objects.filter(author=OuterRef('pk'))),
+        Exists(subscriptions),
+        ~Exists(FeedItem.objects.filter(
+            author=OuterRef('pk'),
+            user_id=Subquery(
+                subscriptions.order_by('pk').values('user_id')[:1]))),
+        pk=author_id,
+        subscribers_count__lte=settings.FEED_FANOUT_LIMIT,
+    ).exists():
+        run_in_background(fan_out_author, author_id)
+
+
+@receiver(post_save, sender=Recipe)
+def update_image_variants(sender, instance, **kwargs):
+    if instance.image and not is_actual(instance):
+        run_in_background(generate_image_variants, instance.pk)
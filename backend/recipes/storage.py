@@ -0,0 +1,74 @@
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+def get_content_hash(file):
+    """SHA-256 содержимого файла, прочитанного по частям."""
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_hashed_name(name, content_hash):
+    """Имя файла по хэшу содержимого в том же каталоге:
+    recipes/images/ab/abcdef....jpg."""
+    directory = posixpath.dirname(name)
+    extension = posixpath.splitext(name)[1].lower()
+    return posixpath.join(
+        directory, content_hash[:2], f'{content_hash}{extension}')
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Файловое хранилище, называющее файлы по хэшу содержимого.
+
+    Одинаковые файлы хранятся в одном экземпляре и разделяются между
+    записями, поэтому удалять их при удалении записи нельзя: ненужные
+    файлы убирает команда dedupe_media --prune. Запись атомарна:
+    содержимое пишется во временный файл в целевом каталоге и
+    переименовывается через os.replace.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Итоговое имя определяется содержимым в _save, а совпадение
+        # имен означает совпадение содержимого.
+        return name
+
+    def _save(self, name, content):
+        directory = self.path(posixpath.dirname(name))
+        os.makedirs(directory, exist_ok=True)
+        digest = hashlib.sha256()
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        temp = tempfile.NamedTemporaryFile(
+            dir=directory, prefix='.upload-', delete=False)
+        try:
+            with temp:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp.write(chunk)
+            hashed_name = get_hashed_name(name, digest.hexdigest())
+            if self.exists(hashed_name):
+                os.remove(temp.name)
+                return hashed_name
+            path = self.path(hashed_name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if self.file_permissions_mode is not None:
+                os.chmod(temp.name, self.file_permissions_mode)
+            os.replace(temp.name, path)
+        except BaseException:
+            if os.path.exists(temp.name):
+                os.remove(temp.name)
+            raise
+        return hashed_name
+
+
+content_addressed_storage = ContentAddressedStorage()
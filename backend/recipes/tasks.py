@@ -0,0 +1,34 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.BACKGROUND_TASKS_WORKERS,
+    thread_name_prefix='background',
+)
+
+
+def run(func, *args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception('Ошибка фоновой задачи %s', func.__name__)
+    finally:
+        connections.close_all()
+
+
+def run_in_background(func, *args):
+    """Выполнить func(*args) в фоновом потоке после фиксации текущей
+    транзакции. При BACKGROUND_TASKS_SYNC задача выполняется сразу
+    после фиксации в текущем потоке."""
+    def submit():
+        if settings.BACKGROUND_TASKS_SYNC:
+            func(*args)
+        else:
+            executor.submit(run, func, *args)
+
+    transaction.on_commit(submit)
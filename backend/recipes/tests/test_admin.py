@@ -0,0 +1,150 @@
+import base64
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from api.tests.base import IMAGE, APITestCase
+from recipes.models import (Favorite, IngredientIndex, Recipe,
+                            RecipeIngredient, ShoppingCart, ShoppingListItem)
+from recipes.search import rank_by_ingredients
+from users.models import User
+
+
+class AdminSyncTestCase(APITestCase):
+    """Правки через админку поддерживают списки покупок и индекс по
+    ингредиентам в согласованном состоянии."""
+
+    @classmethod
+    def create_relations(cls):
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=cls.reader, recipe=recipe)
+            for recipe in cls.recipes[:2])
+
+    def setUp(self):
+        super().setUp()
+        admin = User.objects.create_superuser(
+            email='admin@foodgram.ru', username='admin', password='pass',
+            first_name='Админ', last_name='Админ')
+        self.client.force_login(admin)
+
+    def assert_consistent(self):
+        self.assertEqual(ShoppingListItem.objects.find_drift(), {})
+        ingredient_ids = {ingredient.pk for ingredient in self.ingredients}
+        ranking = rank_by_ingredients(ingredient_ids)
+        IngredientIndex.objects.rebuild()
+        self.assertEqual(ranking, rank_by_ingredients(ingredient_ids))
+
+    def post(self, url, data):
+        """Отправить форму и выполнить отложенные до фиксации
+        транзакции действия: смену версии индекса и т. п."""
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(url, data)
+
+    def post_form(self, url, changes):
+        """Отправить форму изменения с исходными данными и правками."""
+        context = self.client.get(url).context
+        data = {}
+        forms = [context['adminform'].form]
+        for inline in context['inline_admin_formsets']:
+            formset = inline.formset
+            forms += formset.forms
+            data.update({
+                formset.management_form.add_prefix(name): value
+                for name, value in
+                formset.management_form.initial.items()})
+        for form in forms:
+            for name, field in form.fields.items():
+                value = form.initial.get(name, field.initial)
+                if hasattr(value, 'pk'):
+                    value = value.pk
+                if isinstance(value, (list, tuple)):
+                    value = [getattr(item, 'pk', item) for item in value]
+                if value is not None:
+                    data[form.add_prefix(name)] = value
+        data.update(changes)
+        response = self.post(url, data)
+        self.assertEqual(response.status_code, 302,
+                         response.context and response.context['errors'])
+
+    def test_recipe_inline(self):
+        recipe = self.recipes[0]
+        rows = list(RecipeIngredient.objects.filter(
+            recipe=recipe).order_by('pk'))
+        image = SimpleUploadedFile(
+            'image.gif', base64.b64decode(IMAGE.split(',')[1]),
+            content_type='image/gif')
+        self.post_form(f'/admin/recipes/recipe/{recipe.pk}/change/', {
+            'image': image,
+            'recipeingredient_set-0-amount': 50,
+            'recipeingredient_set-1-ingredient': self.ingredients[-1].pk,
+            'recipeingredient_set-2-DELETE': 'on',
+        })
+        self.assertEqual(RecipeIngredient.objects.get(
+            pk=rows[0].pk).amount, 50)
+        self.assertFalse(RecipeIngredient.objects.filter(
+            pk=rows[2].pk).exists())
+        self.assert_consistent()
+
+    def test_recipe_ingredient(self):
+        row = RecipeIngredient.objects.filter(
+            recipe=self.recipes[0]).first()
+        self.post_form(f'/admin/recipes/recipeingredient/{row.pk}/change/', {
+            'recipe': self.recipes[1].pk,
+            'ingredient': self.ingredients[-1].pk,
+            'amount': 70,
+        })
+        self.assert_consistent()
+        self.post(
+            f'/admin/recipes/recipeingredient/{row.pk}/delete/',
+            {'post': 'yes'})
+        self.assertFalse(RecipeIngredient.objects.filter(
+            pk=row.pk).exists())
+        self.assert_consistent()
+        self.post('/admin/recipes/recipeingredient/', {
+            'action': 'delete_selected', 'post': 'yes',
+            '_selected_action': list(RecipeIngredient.objects.filter(
+                recipe=self.recipes[1]).values_list('pk', flat=True)),
+        })
+        self.assertFalse(RecipeIngredient.objects.filter(
+            recipe=self.recipes[1]).exists())
+        self.assert_consistent()
+
+    def test_shopping_cart(self):
+        self.post('/admin/recipes/shoppingcart/add/', {
+            'user': self.reader.pk, 'recipe': self.recipes[2].pk})
+        self.assertTrue(ShoppingCart.objects.filter(
+            user=self.reader, recipe=self.recipes[2]).exists())
+        self.assert_consistent()
+        cart = ShoppingCart.objects.get(
+            user=self.reader, recipe=self.recipes[0])
+        self.post(f'/admin/recipes/shoppingcart/{cart.pk}/delete/',
+                  {'post': 'yes'})
+        self.assert_consistent()
+        self.post('/admin/recipes/shoppingcart/', {
+            'action': 'delete_selected', 'post': 'yes',
+            '_selected_action': list(ShoppingCart.objects.values_list(
+                'pk', flat=True)),
+        })
+        self.assertFalse(ShoppingCart.objects.exists())
+        self.assertFalse(ShoppingListItem.objects.exists())
+
+    def get_favorites_counts(self):
+        return dict(Recipe.objects.values_list('pk', 'favorites_count'))
+
+    def test_favorite(self):
+        self.post('/admin/recipes/favorite/add/', {
+            'user': self.reader.pk, 'recipe': self.recipes[0].pk})
+        favorite = Favorite.objects.get(
+            user=self.reader, recipe=self.recipes[0])
+        counts = self.get_favorites_counts()
+        self.assertEqual(counts[self.recipes[0].pk], 1)
+        # Пользователь и рецепт существующей записи не меняются.
+        self.post(f'/admin/recipes/favorite/{favorite.pk}/change/', {
+            'user': self.reader.pk, 'recipe': self.recipes[1].pk})
+        self.assertEqual(
+            Favorite.objects.get(pk=favorite.pk).recipe_id,
+            self.recipes[0].pk)
+        self.assertEqual(self.get_favorites_counts(), counts)
+        self.post(f'/admin/recipes/favorite/{favorite.pk}/delete/',
+                  {'post': 'yes'})
+        self.assertEqual(
+            self.get_favorites_counts()[self.recipes[0].pk], 0)
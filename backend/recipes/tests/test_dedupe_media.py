@@ -0,0 +1,79 @@
+import os
+from io import StringIO
+
+from django.core.management import call_command
+
+from api.tests.base import APITestCase
+from recipes.management.commands.dedupe_media import HASHED_NAME_RE
+from recipes.models import Recipe
+
+
+class DedupeMediaTestCase(APITestCase):
+    """Перевод изображений рецептов на имена по хэшу содержимого."""
+
+    def setUp(self):
+        super().setUp()
+        self.storage = Recipe._meta.get_field('image').storage
+        # Два рецепта со старыми именами одинаковых файлов, один с
+        # отличающимся файлом и один с потерянным.
+        self.names = [
+            self.write('recipes/images/first.gif', b'same'),
+            self.write('recipes/images/second.gif', b'same'),
+            self.write('recipes/images/third.gif', b'other'),
+            'recipes/images/missing.gif',
+        ]
+        for recipe, name in zip(self.recipes, self.names):
+            Recipe.objects.filter(pk=recipe.pk).update(
+                image=name, image_variants={})
+        self.orphan = self.write('recipes/images/ab/orphan.gif', b'orphan')
+
+    def write(self, name, content):
+        path = self.storage.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(content)
+        return name
+
+    def dedupe(self, **options):
+        stdout, stderr = StringIO(), StringIO()
+        call_command('dedupe_media', stdout=stdout, stderr=stderr,
+                     **options)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def get_images(self):
+        return [Recipe.objects.get(pk=recipe.pk).image.name
+                for recipe in self.recipes]
+
+    def test_dedupe(self):
+        output, errors = self.dedupe()
+        first, second, third, missing = self.get_images()
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, third)
+        self.assertRegex(first, HASHED_NAME_RE)
+        self.assertEqual(missing, self.names[3])
+        self.assertIn('missing.gif', errors)
+        self.assertIn('Рецептов обновлено: 3', output)
+        for name in self.names[:3]:
+            self.assertFalse(self.storage.exists(name))
+        with self.storage.open(first) as file:
+            self.assertEqual(file.read(), b'same')
+        self.assertTrue(self.storage.exists(self.orphan))
+        # Повторный запуск ничего не меняет.
+        self.assertIn('Рецептов обновлено: 0', self.dedupe()[0])
+        self.assertEqual(self.get_images(), [first, second, third, missing])
+
+    def test_dry_run(self):
+        output, _ = self.dedupe(dry_run=True, prune=True, min_age=0)
+        self.assertIn('пробный запуск', output)
+        self.assertEqual(self.get_images(), self.names)
+        for name in self.names[:3] + [self.orphan]:
+            self.assertTrue(self.storage.exists(name))
+
+    def test_prune(self):
+        self.dedupe(prune=True)
+        # Свежие файлы не удаляются: их мог только что сохранить запрос.
+        self.assertTrue(self.storage.exists(self.orphan))
+        self.dedupe(prune=True, min_age=0)
+        self.assertFalse(self.storage.exists(self.orphan))
+        for name in self.get_images()[:3]:
+            self.assertTrue(self.storage.exists(name))
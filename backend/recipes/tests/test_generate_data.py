@@ -0,0 +1,55 @@
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+
+from api.tests.base import LOCAL_CACHES
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeTag,
+                            ShoppingCart, Tag)
+from users.models import Subscription
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class GenerateDataTestCase(TestCase):
+    """Генерация синтетических данных."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {i}', measurement_unit='г')
+            for i in range(20))
+
+    def generate(self, seed=1, **options):
+        options = {'users': 5, 'recipes': 30, 'favorites': 20, 'carts': 10,
+                   'subscriptions': 5, **options}
+        call_command('generate_data', seed=seed, stdout=StringIO(),
+                     **options)
+
+    def test_more_tags_than_weights(self):
+        Tag.objects.bulk_create(
+            Tag(name=f'Тег {i}', color=f'#00000{i}', slug=f'tag-{i}')
+            for i in range(8))
+        self.generate()
+        self.assertEqual(Recipe.objects.count(), 30)
+        self.assertTrue(RecipeTag.objects.filter(
+            tag__slug__in=('tag-6', 'tag-7')).exists())
+
+    def test_deterministic(self):
+        self.generate()
+        first = list(Recipe.objects.order_by('pk').values_list(
+            'name', 'cooking_time'))
+        Recipe.objects.all().delete()
+        self.generate()
+        self.assertEqual(first, list(Recipe.objects.order_by(
+            'pk').values_list('name', 'cooking_time')))
+
+    def test_requested_counts(self):
+        """Связей создается ровно столько, сколько запрошено, даже когда
+        самым активным пользователям не хватает объектов."""
+        self.generate(users=20, recipes=10, favorites=100, carts=60,
+                      subscriptions=180)
+        self.assertEqual(Favorite.objects.count(), 100)
+        self.assertEqual(ShoppingCart.objects.count(), 60)
+        self.assertEqual(Subscription.objects.count(), 180)
+        with self.assertRaises(CommandError):
+            self.generate(users=5, subscriptions=11)
@@ -0,0 +1,128 @@
+import csv
+import json
+import shutil
+import tempfile
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+
+from api.tests.base import LOCAL_CACHES
+from recipes.management.commands.load_ingredients import CsvStream
+from recipes.models import Ingredient
+
+ROWS = [
+    ['Ёжевика', 'г'],
+    ['Мука', 'г'],
+    ['Мука', 'кг'],
+    ['Соль', 'по вкусу'],
+    ['Яйца', 'шт.'],
+]
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class LoadIngredientsTestCase(TestCase):
+    """Загрузка справочника ингредиентов из CSV и JSON."""
+
+    def setUp(self):
+        self.directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def write(self, name, content):
+        path = self.directory / name
+        path.write_text(content, encoding='utf-8')
+        return str(path)
+
+    def write_csv(self, rows):
+        return self.write('ingredients.csv', ''.join(
+            f'{name},{unit}\n' for name, unit in rows))
+
+    def write_json(self, items):
+        return self.write(
+            'ingredients.json', json.dumps(items, ensure_ascii=False))
+
+    def load(self, path, **options):
+        stdout = StringIO()
+        call_command('load_ingredients', path, stdout=stdout, **options)
+        return stdout.getvalue()
+
+    def get_ingredients(self):
+        return set(Ingredient.objects.values_list(
+            'name', 'measurement_unit', 'search_name'))
+
+    def test_csv(self):
+        path = self.write_csv(ROWS + [ROWS[1], ['', 'г'], ['Сахар', '']])
+        output = self.load(path)
+        self.assertIn('Добавлено: 5', output)
+        self.assertIn('дубликаты и ошибки: 3', output)
+        self.assertEqual(self.get_ingredients(), {
+            (name, unit, name.lower().replace('ё', 'е'))
+            for name, unit in ROWS
+        })
+
+    def test_json(self):
+        items = [{'name': name, 'measurement_unit': unit}
+                 for name, unit in ROWS]
+        path = self.write_json(items + [['Сахар', 'г'], 'ошибка', {}])
+        # Маленький буфер: объекты разрезаются на границах чтения.
+        with mock.patch(
+                'recipes.management.commands.load_ingredients.'
+                'JSON_CHUNK_SIZE', 7):
+            output = self.load(path)
+        self.assertIn('Добавлено: 6', output)
+        self.assertIn('дубликаты и ошибки: 2', output)
+        self.assertEqual(Ingredient.objects.count(), len(ROWS) + 1)
+
+    def test_invalid_json(self):
+        with self.assertRaises(CommandError):
+            self.load(self.write('ingredients.json', '{"name": "Мука"}'))
+        with self.assertRaises(CommandError):
+            self.load(self.write('broken.json', '[{"name": "Мука"'))
+
+    def test_rerun(self):
+        """Повторная загрузка не создает дубликатов и исправляет
+        поисковые названия."""
+        path = self.write_csv(ROWS)
+        self.load(path)
+        Ingredient.objects.filter(name='Ёжевика').update(search_name='')
+        output = self.load(path)
+        self.assertIn('Добавлено: 0, обновлено: 1', output)
+        self.assertIn('уже в базе: 4', output)
+        self.assertEqual(Ingredient.objects.count(), len(ROWS))
+        self.assertEqual(
+            Ingredient.objects.get(name='Ёжевика').search_name, 'ежевика')
+
+    def test_batches(self):
+        """Пакеты на границах размера и вывод прогресса."""
+        self.load(self.write_csv(ROWS[:2]))
+        output = self.load(self.write_csv(ROWS), batch_size=2, verbosity=2)
+        self.assertEqual(
+            [line for line in output.splitlines()
+             if line.startswith('Обработано')],
+            ['Обработано строк: 2', 'Обработано строк: 4',
+             'Обработано строк: 5'])
+        self.assertIn('Добавлено: 3', output)
+        self.assertEqual(Ingredient.objects.count(), len(ROWS))
+
+    def test_format(self):
+        path = self.write('ingredients.txt', 'Мука,г\n')
+        with self.assertRaises(CommandError):
+            self.load(path)
+        self.load(path, format='csv')
+        self.assertTrue(Ingredient.objects.filter(name='Мука').exists())
+        with self.assertRaises(CommandError):
+            self.load(str(self.directory / 'missing.csv'))
+
+    def test_copy_stream(self):
+        """Данные для COPY формируются по мере чтения блоками."""
+        rows = ROWS * 100
+        expected = StringIO()
+        csv.writer(expected).writerows(rows)
+        stream = CsvStream(rows)
+        first = stream.read(64)
+        self.assertEqual(len(first), 64)
+        self.assertLess(stream.count, len(rows) // 10)
+        self.assertEqual(first + stream.read(), expected.getvalue())
+        self.assertEqual(stream.count, len(rows))
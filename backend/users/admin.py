@@ -1,5 +1,7 @@
 from django.contrib import admin
 
+from core.admin_filters import AuthorInputFilter, UserInputFilter
+
 from .models import Subscription, User
 
 
@@ -8,18 +10,14 @@ class UserAdmin(admin.ModelAdmin):
     list_display = ('id', 'username', 'email', 'first_name',
                     'last_name', 'recipes_count', 'subscribers_count')
     search_fields = ('username', 'email', 'first_name', 'last_name')
-    list_filter = ('first_name', 'last_name', 'email')
-
-    @admin.display(description='Кол-во рецептов')
-    def recipes_count(self, obj):
-        return obj.recipes.count()
-
-    @admin.display(description='Кол-во подписчиков')
-    def subscribers_count(self, obj):
-        return obj.subscribed_by.count()
+    list_filter = ('is_staff', 'is_active')
+    show_full_result_count = False
 
 
 @admin.register(Subscription)
 class SubscriptionAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'author')
-    list_filter = ('user', 'author')
+    list_filter = (UserInputFilter, AuthorInputFilter)
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
+    show_full_result_count = False
@@ -31,6 +31,16 @@ class User(AbstractUser):
         auto_now_add=True,
         verbose_name='Дата создания'
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Кол-во рецептов',
+    )
+    subscribers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Кол-во подписчиков',
+    )
 
     class Meta:
         ordering = ('-created_at', )